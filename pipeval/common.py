@@ -1,6 +1,62 @@
 """ Common functions for PipeVal """
+import argparse
+import io
 import os
+import sys
 from functools import wraps
+from typing import BinaryIO
+
+def positive_integer(arg):
+    """ Type and value check for positive integers """
+    try:
+        i = int(arg)
+    except ValueError as value_exception:
+        raise argparse.ArgumentTypeError("Must be an integer.") from value_exception
+
+    if i < 1:
+        raise argparse.ArgumentTypeError("Must be an integer greater than 0.")
+
+    return i
+
+class AppendReplacingDefault(argparse.Action):
+    """ Append each use of an option to a list that starts empty instead of from the default """
+    def __call__(self, parser, namespace, values, option_string=None):
+        items = getattr(namespace, self.dest)
+        items = [] if items is self.default else list(items)
+        items.append(values)
+        setattr(namespace, self.dest, items)
+
+class _PrefixedReader(io.RawIOBase):
+    """ Raw reader returning `prefix` followed by the rest of `stream` """
+    def __init__(self, prefix:bytes, stream:BinaryIO):
+        """ Constructor """
+        super().__init__()
+        self._prefix = memoryview(prefix)
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            bytes_read = min(len(buffer), len(self._prefix))
+            buffer[:bytes_read] = self._prefix[:bytes_read]
+            self._prefix = self._prefix[bytes_read:]
+            return bytes_read
+
+        return self._stream.readinto(buffer)
+
+def _available_cpus():
+    """ Number of CPUs this process is allowed to run on """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def _is_validation_skipped(name:str):
+    """ Check whether validation `name` is disabled through the environment """
+    value = os.environ.get(f"PIPEVAL_SKIP_{name.upper()}")
+    return value is not None and value.lower() == 'true'
 
 # pylint: disable=C0103,W0613
 def skippedValidation(name):
@@ -16,14 +72,11 @@ def skippedValidation(name):
     def print_skip_message(func):
         @wraps(func)
         def skip_message(*args, **kwargs):
-            print(f'PID:{os.getpid()} - Skipping validation {name.upper()}')
+            print(f'PID:{os.getpid()} - Skipping validation {name.upper()}', file=sys.stderr)
 
         return skip_message
 
-    value = os.environ.get(f"PIPEVAL_SKIP_{name.upper()}")
-    should_skip_validate = value is not None and value.lower() == 'true'
-
-    if not should_skip_validate:
+    if not _is_validation_skipped(name):
         return decorator
 
     return print_skip_message
@@ -1,6 +1,12 @@
 ''' Console script main entrance '''
 import argparse
-from pipeval.generate_checksum.checksum import generate_checksum
+from pipeval.generate_checksum.checksum import (
+    generate_checksum,
+    CHECKSUM_TYPES,
+    DEFAULT_CHECKSUM_TYPE,
+    HASH_BUFFER_SIZE
+)
+from pipeval.common import positive_integer, AppendReplacingDefault
 
 def add_subparser_generate_checksum(subparsers:argparse._SubParsersAction):
     """ Parse arguments """
@@ -11,8 +17,15 @@ def add_subparser_generate_checksum(subparsers:argparse._SubParsersAction):
         formatter_class = argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument('path', help='one or more paths of files to validate', type=str, nargs='+')
-    parser.add_argument('-t', '--type', help='Checksum type',
-        choices=['md5', 'sha512'],
-        default='sha512')
+    parser.add_argument('-t', '--type', help='Checksum type. Repeat to generate multiple ' \
+        'types from a single read, e.g. `-t md5 -t sha512`',
+        choices=CHECKSUM_TYPES, action=AppendReplacingDefault,
+        default=[DEFAULT_CHECKSUM_TYPE])
+    parser.add_argument('-p', '--processes', type=positive_integer, default=1, \
+        help='Number of files to generate checksums for in parallel')
+    parser.add_argument('-b', '--buffer-size', type=positive_integer, default=HASH_BUFFER_SIZE, \
+        help='Size in bytes of each read when hashing')
+    parser.add_argument('--mmap', action='store_true', \
+        help='Memory-map files when hashing. Recommended for local files only')
 
     parser.set_defaults(func=generate_checksum)
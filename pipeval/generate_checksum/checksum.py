@@ -1,93 +1,255 @@
 ''' Checksum generation and validation functions '''
 import hashlib
+import io
+import mmap
 import sys
+import time
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 from collections import namedtuple
-from typing import Dict, Union
+from functools import partial
+from typing import BinaryIO, Dict, Iterable, List, Optional, Union
 from pathlib import Path
 
 from pipeval.common import skippedValidation
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+CHECKSUM_TYPES = ['md5', 'sha512', 'blake2b', 'xxh64']
+DEFAULT_CHECKSUM_TYPE = 'sha512'
+HASH_BUFFER_SIZE = 8 * 1024 * 1024 # 8 MB chunks
+
 ChecksumArgs = namedtuple(
     'args',
-    'path, type'
+    'path, type, processes, buffer_size, mmap',
+    defaults=[1, HASH_BUFFER_SIZE, False]
 )
 
+def _new_hasher(hash_type:str):
+    ''' Create a hasher for the given checksum type '''
+    if hash_type == 'xxh64':
+        # xxHash is not cryptographic but hashes far faster than storage can read
+        if xxhash is None:
+            raise IOError('xxh64 checksums require the `xxhash` package. '
+                'Install it through `pip install pipeval[xxhash]`.')
+        return xxhash.xxh64()
+
+    return hashlib.new(hash_type)
+
+class HashingReader(io.RawIOBase):
+    ''' Raw file reader that feeds every block read to a set of hashers
+
+        Lets several consumers (checksums, decompression, content validation)
+        share a single read of the file. The file is read unbuffered, straight
+        into the caller's buffer, so no intermediate bytes objects are created.
+    '''
+    # pylint: disable=R0913
+    def __init__(self, path:Union[Path,int], hash_types:Iterable[str],
+        buffer_size:int=HASH_BUFFER_SIZE, use_mmap:bool=False, tee:Optional[BinaryIO]=None):
+        '''Constructor
+
+            `path` may also be an open file descriptor, such as stdin, which
+            is left open. Every block read is also written to `tee` if given.
+        '''
+        super().__init__()
+        self._file = None
+        self._hashers = {hash_type: _new_hasher(hash_type) for hash_type in hash_types}
+        # pylint: disable=R1732
+        self._file = open(path, 'rb', buffering=0, closefd=not isinstance(path, int))
+        self._buffer_size = buffer_size
+        self._use_mmap = use_mmap
+        self._tee = tee
+        self._start_time = time.perf_counter()
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        bytes_read = self._file.readinto(buffer)
+        if bytes_read:
+            self._update(memoryview(buffer)[:bytes_read])
+        return bytes_read
+
+    def _update(self, block:memoryview):
+        ''' Feed a block of the file to every hasher '''
+        for hasher in self._hashers.values():
+            hasher.update(block)
+        if self._tee is not None:
+            self._tee.write(block)
+        self.bytes_read += len(block)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        super().close()
+
+    def drain(self):
+        ''' Read the rest of the file so every hasher has seen all bytes '''
+        if self._use_mmap and self._drain_mmap():
+            return
+
+        buffer = memoryview(bytearray(self._buffer_size))
+        while self.readinto(buffer):
+            pass
+
+    def _drain_mmap(self):
+        ''' Hash the rest of the file through a memory map
+
+            Returns False if the file cannot be memory-mapped
+        '''
+        try:
+            mapped_file = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files and special files cannot be memory-mapped
+            return False
+
+        with mapped_file:
+            mapped_view = memoryview(mapped_file)
+            position = self._file.tell()
+            for block_start in range(position, len(mapped_view), self._buffer_size):
+                self._update(mapped_view[block_start:block_start + self._buffer_size])
+            mapped_view.release()
+            self._file.seek(0, io.SEEK_END)
+
+        return True
+
+    def throughput(self):
+        ''' Read rate in MB/s since the reader was opened '''
+        elapsed = time.perf_counter() - self._start_time
+        return self.bytes_read / 1000000 / elapsed if elapsed > 0 else 0.0
+
+    def hexdigests(self):
+        ''' Digests of all bytes read so far, keyed by hash type '''
+        return {hash_type: hasher.hexdigest() for hash_type, hasher in self._hashers.items()}
+
+def _find_checksum_files(path:Path):
+    ''' Find existing checksum files for path, keyed by hash type '''
+    checksum_files = {}
+    for hash_type in CHECKSUM_TYPES:
+        hash_path = path.with_suffix(path.suffix + '.' + hash_type)
+        if hash_path.exists():
+            checksum_files[hash_type] = hash_path
+
+    return checksum_files
+
 @skippedValidation('CHECKSUM')
-def _validate_checksums(path:Path):
-    ''' Validate MD5 and/or SHA512 checksums '''
-    # Checksum validation
-    md5_file_path = path.with_suffix(path.suffix + '.md5')
-    if md5_file_path.exists():
-        if not _compare_hash('md5', path, md5_file_path):
-            raise IOError('File is corrupted, md5 checksum failed.')
-
-    sha512_file_path = path.with_suffix(path.suffix + '.sha512')
-    if sha512_file_path.exists():
-        if not _compare_hash('sha512', path, sha512_file_path):
-            raise IOError('File is corrupted, sha512 checksum failed.')
+def _validate_checksums(path:Path, computed_hashes:Optional[Dict[str, str]]=None,
+    checksum_files:Optional[Dict[str, Path]]=None):
+    ''' Validate MD5, SHA512, BLAKE2b and/or xxh64 checksums
+
+        `computed_hashes` may hold hashes already computed during a shared
+        read of the file; any missing type is generated from `path`.
+        `checksum_files` may hold the checksum files already found for `path`.
+    '''
+    if checksum_files is None:
+        checksum_files = _find_checksum_files(path)
+
+    for hash_type, hash_path in checksum_files.items():
+        if computed_hashes is not None and hash_type in computed_hashes:
+            checksum_matches = _read_existing_hash(hash_path) == computed_hashes[hash_type]
+        else:
+            checksum_matches = _compare_hash(hash_type, path, hash_path)
+
+        if not checksum_matches:
+            raise IOError(f'File is corrupted, {hash_type} checksum failed.')
+
+def _read_existing_hash(hash_path:Path):
+    ''' Read the hash from a checksum file '''
+    # Read only the hash and not the filename for comparison
+    return hash_path.read_text().split()[0].strip()
 
 def _compare_hash(hash_type:str, path:Path, hash_path:Path):
     ''' Compares existing hash to generated hash '''
-    # Read only the hash and not the filename for comparison
-    existing_hash = hash_path.read_text().split()[0].strip()
+    existing_hash = _read_existing_hash(hash_path)
 
     if hash_type == 'md5':
         return existing_hash == _generate_md5(path)
     if hash_type == 'sha512':
         return existing_hash == _generate_sha512(path)
+    if hash_type in CHECKSUM_TYPES:
+        checksums, _ = _generate_checksums(path, [hash_type])
+        return existing_hash == checksums[hash_type]
     raise IOError('Incorrect hash parameters')
 
 def _generate_md5(path:Path):
     ''' Generates md5 hash '''
-    md5_hash = hashlib.md5()
-
-    with open(path, "rb") as file:
-        for byte_block in iter(lambda: file.read(4096), b""):
-            md5_hash.update(byte_block)
-
-    return md5_hash.hexdigest() # returns string
+    checksums, _ = _generate_checksums(path, ['md5'])
+    return checksums['md5'] # returns string
 
 def _generate_sha512(path:Path):
-    ''' Generates sah512 hash '''
-    sha512_hash = hashlib.sha512()
+    ''' Generates sha512 hash '''
+    checksums, _ = _generate_checksums(path, ['sha512'])
+    return checksums['sha512'] # returns string
 
-    with open(path, "rb") as file:
-        for byte_block in iter(lambda: file.read(4096), b""):
-            sha512_hash.update(byte_block)
+def _generate_checksums(path:Path, hash_types:Iterable[str],
+    buffer_size:int=HASH_BUFFER_SIZE, use_mmap:bool=False):
+    ''' Generates hashes of every given type from a single read of the file
 
-    return sha512_hash.hexdigest() # returns string
+        Returns the hashes keyed by type along with the read rate in MB/s
+    '''
+    with HashingReader(path, hash_types, buffer_size, use_mmap) as reader:
+        reader.drain()
+
+    return reader.hexdigests(), reader.throughput()
 
 def _write_checksum_file(path:Path, hash_type:str, computed_hash:str):
     ''' Write checksum to file '''
     with open(str(path) + '.' + hash_type, 'w', encoding="utf-8") as checksum_file:
         checksum_file.write(computed_hash + '  ' + str(path) + '\n')
 
-    print(f'{hash_type} checksum generated for {str(path)}')
+def _checksum_worker(path:Path, hash_types:List[str], buffer_size:int, use_mmap:bool):
+    ''' Worker function to generate and write the checksums of a single file
+
+        Returns whether the checksums were written, the messages to print and
+        the read rate achieved
+    '''
+    try:
+        invalid_types = [hash_type for hash_type in hash_types if hash_type not in CHECKSUM_TYPES]
+        if invalid_types:
+            raise KeyError(', '.join(invalid_types))
+
+        checksums, throughput = _generate_checksums(path, hash_types, buffer_size, use_mmap)
+        for hash_type in hash_types:
+            _write_checksum_file(path, hash_type, checksums[hash_type])
+    except KeyError as key_err:
+        return False, [f'Invalid checksum type. {str(key_err)}'], None
+    except (IOError, PermissionError, OSError, FileNotFoundError) as err:
+        return False, [f'Failed to write checksum for {str(path)}: {str(err)}'], None
+
+    return True, \
+        [f'{hash_type} checksum generated for {str(path)}' for hash_type in hash_types], \
+        f'Read {str(path)} at {throughput:.1f} MB/s'
 
 def generate_checksum(args:Union[ChecksumArgs,Dict[str, Union[str,list]]]):
     ''' Function to generate checksum(s)
         `args` must contain the following:
         `path` is a required argument with a value of list of files
-        `type` is a required argument with a value of string indicating type of checksum
+        `type` is a required argument with a value of string or list of strings indicating
+            type(s) of checksum
+        `processes` is a required argument with the number of files to hash in parallel
+        `buffer_size` is a required argument with the size in bytes of each read
+        `mmap` is a required argument of boolean variable to memory-map files when hashing
     '''
-
-    checksum_gen_functions = {
-        'md5': _generate_md5,
-        'sha512': _generate_sha512
-    }
+    num_parallel = min(args.processes, multiprocessing.cpu_count())
+    paths = [Path(pathname) for pathname in args.path]
+    hash_types = [args.type] if isinstance(args.type, str) else list(dict.fromkeys(args.type))
+    worker = partial(_checksum_worker, hash_types=hash_types,
+        buffer_size=args.buffer_size, use_mmap=args.mmap)
 
     all_checksums_generated = True
 
-    for path in [Path(pathname) for pathname in args.path]:
-        try:
-            checksum = checksum_gen_functions[args.type](path)
-            _write_checksum_file(path, args.type, checksum)
-        except KeyError as key_err:
-            all_checksums_generated = False
-            print(f'Invalid checksum type. {str(key_err)}')
-        except (IOError, PermissionError, OSError, FileNotFoundError) as err:
-            all_checksums_generated = False
-            print(f'Failed to write checksum for {str(path)}: {str(err)}')
+    # hashlib releases the GIL while hashing, so threads hash files concurrently
+    with ThreadPool(num_parallel) as parallel_pool:
+        # imap keeps messages in the same order as the serial path
+        for checksums_generated, messages, throughput_message in parallel_pool.imap(worker, paths):
+            print('\n'.join(messages))
+            if throughput_message is not None:
+                print(throughput_message, file=sys.stderr)
+            all_checksums_generated = all_checksums_generated and checksums_generated
 
     if not all_checksums_generated:
         sys.exit(1)
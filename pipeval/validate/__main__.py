@@ -1,18 +1,20 @@
 ''' Console script main entrance '''
 import argparse
-from pipeval.validate.validate import run_validate
+from pipeval.validate.validate_types import (
+    FILE_TYPES_DICT,
+    VCF_ENGINE_NAMES,
+    DEFAULT_VCF_ENGINE,
+    DEFAULT_CACHE_MAX_ENTRIES
+)
+from pipeval.validate.report import REPORT_FORMATS
+from pipeval.generate_checksum.checksum import CHECKSUM_TYPES
+from pipeval.common import positive_integer
 
-def positive_integer(arg):
-    """ Type and value check for positive integers """
-    try:
-        i = int(arg)
-    except ValueError as value_exception:
-        raise argparse.ArgumentTypeError("Must be an integer.") from value_exception
-
-    if i < 1:
-        raise argparse.ArgumentTypeError("Must be an integer greater than 0.")
-
-    return i
+def _run_validate(args:argparse.Namespace):
+    ''' Run validation, importing the validation stack only once the command is chosen '''
+    # pylint: disable=C0415
+    from pipeval.validate.validate import run_validate
+    run_validate(args)
 
 def add_subparser_validate(subparsers:argparse._SubParsersAction):
     """ Parse arguments """
@@ -23,14 +25,84 @@ def add_subparser_validate(subparsers:argparse._SubParsersAction):
         formatter_class = argparse.ArgumentDefaultsHelpFormatter
     )
 
-    parser.add_argument('path', help='One or more paths of files to validate', type=str, nargs='+')
+    parser.add_argument('path', help='One or more paths of files to validate', type=str, nargs='*')
     parser.add_argument('-r', '--cram-reference', default=None, \
         help='Path to reference file for CRAM')
     parser.add_argument('-u', '--unmapped-bam', action='store_true',
         help='Input is unmmapped BAM.')
     parser.add_argument('-p', '--processes', type=positive_integer, default=1, \
         help='Number of processes to run in parallel when validating multiple files')
+    parser.add_argument('--threads', type=positive_integer, default=None, \
+        help='Total number of threads to use, split between files validated in parallel and ' \
+            'threads within each file. Overrides --processes')
     parser.add_argument('-t', '--test-integrity', action='store_true', \
         help='Whether to perform a full integrity test on compressed files')
+    parser.add_argument('--vcf-engine', default=DEFAULT_VCF_ENGINE, choices=VCF_ENGINE_NAMES, \
+        help='Engine to validate VCF files with: the VCFtools `vcf-validator` script, or ' \
+            'in-process through htslib with `pysam`')
+    parser.add_argument('--scan-bgzf', action='store_true', \
+        help='Walk the block headers of BGZF files (BAM, .vcf.gz, ...) to detect truncated or ' \
+            'missing blocks without decompressing them')
+    parser.add_argument('--type', default=None, choices=list(FILE_TYPES_DICT), \
+        help='File type of inputs streamed through stdin (`-`) or a named pipe. ' \
+            'Detected from the extension of named pipes if not given')
+    parser.add_argument('--tee', default=None, \
+        help='Path to copy a streamed input to while validating it')
+    parser.add_argument('--checksum-type', default=None, nargs='+', choices=CHECKSUM_TYPES, \
+        help='Checksum type(s) to compute over a streamed input. Checksum files are ' \
+            'written for the --tee output, or the checksums are printed otherwise')
+    parser.add_argument('-q', '--quick', action='store_true', \
+        help='Validate FASTQ files from a sample of their records instead of in full: the first ' \
+            'records, the records before the end of the file and records at random offsets. ' \
+            'Only uncompressed and BGZF files can be sampled. Checksums of sampled files are ' \
+            'not verified')
+    parser.add_argument('--quick-records', type=positive_integer, default=10000, \
+        help='Number of records to validate from the start of each file with --quick')
+    parser.add_argument('--quick-samples', type=positive_integer, default=16, \
+        help='Number of random offsets to validate records from with --quick')
+    parser.add_argument('--deep', action='store_true', \
+        help='Validate every record of BAM files, checking their sort order against the ' \
+            '@HD SO tag and their read count against the index')
+
+    parser.add_argument('--report', default=None, choices=REPORT_FORMATS, \
+        help='Write a report of each file to standard output: its type, verdict, error, bytes ' \
+            'read, wall and CPU time of each validation stage, worker PID and peak RSS. ' \
+            '`jsonl` writes one line per file as it finishes, `json` one document at the end')
+
+    parser.add_argument('--profile', default=None, metavar='DIR', \
+        help='Profile the validation of each input with cProfile, writing a stats file per ' \
+            'input named by worker PID and path to DIR along with a merged summary of the ' \
+            'hottest functions. Defaults to the PIPEVAL_PROFILE environment variable')
+
+    parser.add_argument('--fail-fast', action='store_true', \
+        help='Stop at the first invalid input, terminating the validation of the others ' \
+            'and reporting the inputs left unvalidated')
+
+    parser.add_argument('--cache-dir', default=None, metavar='DIR', \
+        help='Cache the inputs found valid in a SQLite database in DIR, and skip inputs whose ' \
+            'device, inode, size, modification time, checksum files, validation options and ' \
+            'PipeVal version are unchanged since. Use a local directory. Defaults to the ' \
+            'PIPEVAL_CACHE_DIR environment variable')
+    parser.add_argument('--cache-refresh', action='store_true', \
+        help='Validate inputs even if their valid verdict is cached, and cache them again')
+    parser.add_argument('--cache-max-entries', type=positive_integer, \
+        default=DEFAULT_CACHE_MAX_ENTRIES, metavar='N', \
+        help='Evict the least recently used cache entries beyond N after validation')
+    parser.add_argument('--cache-max-age', type=float, default=None, metavar='DAYS', \
+        help='Evict cache entries unused for more than DAYS days after validation')
+
+    parser.add_argument('--paired-fastq', default=None, nargs=2, action='append', \
+        metavar=('R1', 'R2'), help='Paths of a pair of mate FASTQ files to validate together, ' \
+            'checking record counts and read-name pairing. May be given multiple times')
+
+    parser.set_defaults(func=_run_validate)
 
-    parser.set_defaults(func=run_validate)
+    # argparse cannot require either a positional or an option, so it is checked once parsed.
+    # The check stays on the parser, as the parsed arguments are sent to the worker processes
+    parse_known_args = parser.parse_known_args
+    def _parse_known_args(args=None, namespace=None):
+        namespace, extras = parse_known_args(args, namespace)
+        if not namespace.path and not namespace.paired_fastq:
+            parser.error('the following arguments are required: path or --paired-fastq')
+        return namespace, extras
+    parser.parse_known_args = _parse_known_args
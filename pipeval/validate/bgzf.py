@@ -0,0 +1,233 @@
+''' BGZF block parsing and integrity functions '''
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Tuple, Union
+import gzip
+import struct
+import zlib
+
+from pipeval.common import _available_cpus, _PrefixedReader
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+BGZF_HEADER = struct.Struct('<4sI2BH') # magic, MTIME, XFL, OS, XLEN
+BGZF_SUBFIELD = struct.Struct('<2sH') # SI1 SI2, SLEN
+BGZF_FOOTER = struct.Struct('<2I') # CRC32, ISIZE
+BGZF_READ_SIZE = 4 * 1024 * 1024 # 4 MB chunks
+BGZF_MAX_BLOCK_SIZE = 65536
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+def _bgzf_block_size(data:Union[bytes,memoryview], offset:int=0):
+    ''' Total size of the BGZF block starting at `offset` in `data`
+
+        Returns 0 if `data` holds too little of the block header to tell,
+        and None if the block at `offset` is not a BGZF block.
+    '''
+    header_end = offset + BGZF_HEADER.size
+    if len(data) < header_end:
+        return 0
+
+    magic, _, _, _, extra_length = BGZF_HEADER.unpack_from(data, offset)
+    if magic != BGZF_MAGIC:
+        return None
+
+    if len(data) < header_end + extra_length:
+        return 0
+
+    subfield_offset = header_end
+    while subfield_offset + BGZF_SUBFIELD.size <= header_end + extra_length:
+        identifier, subfield_length = BGZF_SUBFIELD.unpack_from(data, subfield_offset)
+        if identifier == b'BC' and subfield_length == 2:
+            return int.from_bytes(
+                data[subfield_offset + BGZF_SUBFIELD.size:subfield_offset + BGZF_SUBFIELD.size + 2],
+                'little'
+            ) + 1
+        subfield_offset += BGZF_SUBFIELD.size + subfield_length
+
+    return None
+
+def _split_bgzf_blocks(data:bytes, data_offset:int):
+    ''' Split the complete BGZF blocks off the start of `data`
+
+        Returns the (file offset, block) pairs found, the number of bytes
+        they span and whether parsing stopped at a block that is not BGZF.
+    '''
+    view = memoryview(data)
+    blocks = []
+    position = 0
+    while True:
+        block_size = _bgzf_block_size(view, position)
+        if block_size is None:
+            return blocks, position, True
+        if block_size == 0 or position + block_size > len(data):
+            return blocks, position, False
+
+        blocks.append((data_offset + position, view[position:position + block_size]))
+        position += block_size
+
+def _inflate_bgzf_block(block_offset:int, block:Union[bytes,memoryview]):
+    ''' Inflate a BGZF block, checking its CRC32 and uncompressed size '''
+    header_size = BGZF_HEADER.size + BGZF_HEADER.unpack_from(block)[4]
+    expected_crc, expected_size = BGZF_FOOTER.unpack_from(block, len(block) - BGZF_FOOTER.size)
+    inflated = zlib.decompress(block[header_size:len(block) - BGZF_FOOTER.size], -zlib.MAX_WBITS)
+
+    if len(inflated) != expected_size:
+        raise gzip.BadGzipFile(f'Incorrect length of data produced by BGZF block at '
+            f'offset {block_offset}')
+    if zlib.crc32(inflated) != expected_crc:
+        raise gzip.BadGzipFile(f'CRC check failed for BGZF block at offset {block_offset}')
+
+    return inflated
+
+def _inflate_bgzf_blocks(blocks:List[Tuple[int, memoryview]]):
+    ''' Inflate BGZF blocks and check their CRC32 and uncompressed size '''
+    for block_offset, block in blocks:
+        _inflate_bgzf_block(block_offset, block)
+
+def _find_bgzf_block(file_reader:BinaryIO, offset:int, file_size:int):
+    ''' Offset of the first BGZF block starting at or after `offset`, or None if there is none
+
+        A candidate block is only accepted if it is followed by another BGZF
+        block header or ends exactly at the end of the file.
+    '''
+    file_reader.seek(offset)
+    window = file_reader.read(2 * BGZF_MAX_BLOCK_SIZE + BGZF_HEADER.size + 64)
+    position = window.find(BGZF_MAGIC)
+
+    while position != -1:
+        block_size = _bgzf_block_size(window, position)
+        if block_size:
+            block_end = position + block_size
+            if offset + block_end == file_size or _bgzf_block_size(window, block_end):
+                return offset + position
+        position = window.find(BGZF_MAGIC, position + 1)
+
+    return None
+
+def _inflate_bgzf_from(file_reader:BinaryIO, offset:int, min_size:Optional[int]=None):
+    ''' Inflate consecutive BGZF blocks starting at `offset`
+
+        Stops once at least `min_size` bytes are inflated, or at the end of
+        the file if `min_size` is not given.
+    '''
+    file_reader.seek(offset)
+    inflated = []
+    inflated_size = 0
+
+    while min_size is None or inflated_size < min_size:
+        block_offset = file_reader.tell()
+        header = file_reader.read(BGZF_HEADER.size)
+        if header == b'':
+            break
+        if len(header) == BGZF_HEADER.size:
+            header += file_reader.read(BGZF_HEADER.unpack_from(header)[4])
+
+        block_size = _bgzf_block_size(header)
+        if block_size is None:
+            raise gzip.BadGzipFile(f'Invalid BGZF block header at offset {block_offset}')
+
+        block = header + file_reader.read(max(block_size - len(header), 0))
+        if not block_size or len(block) < block_size:
+            raise EOFError(f'BGZF block at offset {block_offset} is truncated')
+
+        block_data = _inflate_bgzf_block(block_offset, block)
+        inflated.append(block_data)
+        inflated_size += len(block_data)
+
+    return b''.join(inflated)
+
+def _check_bgzf_integrity(path:Union[Path,BinaryIO], threads:Optional[int]=None,
+    check_eof:bool=False):
+    ''' Verify integrity of a BGZF file, inflating and CRC-checking blocks on a thread pool
+
+        `path` may also be an open binary stream of the file. Any gzip member
+        that is not a BGZF block, and everything after it, is decompressed
+        sequentially through `gzip` instead. With `check_eof`, the file must
+        also be a chain of BGZF blocks ending with the EOF marker, as checked
+        by `_scan_bgzf_blocks`.
+    '''
+    num_threads = threads if threads else _available_cpus()
+
+    with (open(path, 'rb') if isinstance(path, (str, Path)) else nullcontext(path)) as stream, \
+        ThreadPoolExecutor(max_workers=num_threads) as executor:
+        pending_batches = deque()
+        unparsed = b''
+        unparsed_offset = 0
+        found_other_member = False
+        last_block = b''
+
+        for chunk in iter(lambda: stream.read(BGZF_READ_SIZE), b''):
+            unparsed += chunk
+            blocks, parsed_length, found_other_member = _split_bgzf_blocks(unparsed,
+                unparsed_offset)
+            if blocks:
+                pending_batches.append(executor.submit(_inflate_bgzf_blocks, blocks))
+                last_block = bytes(blocks[-1][1])
+
+            unparsed = unparsed[parsed_length:]
+            unparsed_offset += parsed_length
+
+            # Bound the memory held by blocks waiting to be inflated
+            while len(pending_batches) > 2 * num_threads:
+                pending_batches.popleft().result()
+
+            if found_other_member:
+                break
+
+        while pending_batches:
+            pending_batches.popleft().result()
+
+        if check_eof and found_other_member:
+            raise gzip.BadGzipFile(f'Invalid BGZF block header at offset {unparsed_offset}')
+        if found_other_member:
+            with gzip.open(_PrefixedReader(unparsed, stream), 'rb') as file_reader:
+                while file_reader.read(BGZF_READ_SIZE) != b'':
+                    pass
+        elif unparsed:
+            raise EOFError(f'BGZF block at offset {unparsed_offset} is truncated')
+        elif check_eof and last_block != BGZF_EOF:
+            raise EOFError('BGZF EOF marker is missing. The file may be truncated')
+
+def _scan_bgzf_blocks(path:Union[Path,BinaryIO]):
+    ''' Walk the chain of BGZF block headers from start to end without inflating any block
+
+        Checks that the blocks are contiguous, that the uncompressed size of
+        each block is plausible and that the file ends with the BGZF EOF
+        marker. `path` may also be an open binary stream of the file.
+    '''
+    opened_file = (open(path, 'rb') # pylint: disable=R1732
+        if isinstance(path, (str, Path)) else nullcontext(path))
+
+    with opened_file as stream:
+        unparsed = b''
+        unparsed_offset = 0
+        last_block = b''
+
+        for chunk in iter(lambda: stream.read(BGZF_READ_SIZE), b''):
+            unparsed += chunk
+            blocks, parsed_length, found_other_member = _split_bgzf_blocks(unparsed,
+                unparsed_offset)
+
+            for block_offset, block in blocks:
+                if len(block) < BGZF_HEADER.size + BGZF_FOOTER.size:
+                    raise gzip.BadGzipFile(f'Implausible size {len(block)} of BGZF block at '
+                        f'offset {block_offset}')
+                _, uncompressed_size = BGZF_FOOTER.unpack_from(block, len(block) - BGZF_FOOTER.size)
+                if uncompressed_size > BGZF_MAX_BLOCK_SIZE:
+                    raise gzip.BadGzipFile(f'Implausible uncompressed size {uncompressed_size} '
+                        f'of BGZF block at offset {block_offset}')
+
+            if found_other_member:
+                raise gzip.BadGzipFile(f'Invalid BGZF block header at offset '
+                    f'{unparsed_offset + parsed_length}')
+            if blocks:
+                last_block = bytes(blocks[-1][1])
+
+            unparsed = unparsed[parsed_length:]
+            unparsed_offset += parsed_length
+
+    if unparsed:
+        raise EOFError(f'BGZF block at offset {unparsed_offset} is truncated')
+    if last_block != BGZF_EOF:
+        raise EOFError('BGZF EOF marker is missing. The file may be truncated')
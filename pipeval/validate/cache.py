@@ -0,0 +1,191 @@
+''' Persistent cache of validation verdicts, to skip unchanged inputs on re-runs '''
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from pipeval import __version__
+from pipeval.generate_checksum.checksum import _find_checksum_files
+from pipeval.validate.validate_types import CACHE_DIR_VARIABLE, ValidateArgs
+
+CACHE_FILE_NAME = 'verdicts.sqlite'
+CACHE_TIMEOUT = 60 # seconds to wait for other processes writing to the cache
+SECONDS_PER_DAY = 24 * 60 * 60
+# Options that can change the verdict of an input
+CACHE_KEY_OPTIONS = [
+    'unmapped_bam',
+    'test_integrity',
+    'quick',
+    'quick_records',
+    'quick_samples',
+    'deep',
+    'scan_bgzf',
+    'vcf_engine'
+]
+SKIP_VARIABLE_PREFIX = 'PIPEVAL_SKIP_'
+# Index files read when validating each type, named after the file or in place of its extension
+INDEX_EXTENSIONS = {
+    '.bam': ['.bai', '.csi'],
+    '.cram': ['.crai'],
+    '.vcf.gz': ['.tbi', '.csi']
+}
+CRAM_EXTENSION = '.cram'
+# Files htslib reads alongside a reference FASTA
+REFERENCE_INDEX_EXTENSIONS = ['.fai', '.gzi']
+
+def _cache_directory(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Directory of the verdict cache, from `--cache-dir` or PIPEVAL_CACHE_DIR, or None '''
+    directory = args.cache_dir or os.environ.get(CACHE_DIR_VARIABLE)
+    return Path(directory) if directory else None
+
+def _file_identity(path:Path):
+    ''' Device, inode, size and modification time of a file '''
+    stat = os.stat(path)
+    return [stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns]
+
+def _optional_file_identity(path:Path):
+    ''' Identity of a file that may not exist, or None if it does not '''
+    try:
+        return _file_identity(path)
+    except FileNotFoundError:
+        return None
+
+def _index_paths(path:Path):
+    ''' Index files that validating `path` may read, whether they exist or not '''
+    for extension, index_extensions in INDEX_EXTENSIONS.items():
+        if path.name.lower().endswith(extension):
+            stem = path.name[:-len(extension)]
+            return [path.with_name(name) for index_extension in index_extensions \
+                for name in (f'{path.name}{index_extension}', f'{stem}{index_extension}')]
+
+    return []
+
+def _reference_identity(reference:Optional[str]):
+    ''' Path and identity of a CRAM reference and of its indexes, or None without a reference '''
+    if not reference:
+        return None
+
+    return [str(reference), _file_identity(Path(reference))] + [
+        _optional_file_identity(Path(f'{reference}{extension}')) \
+            for extension in REFERENCE_INDEX_EXTENSIONS]
+
+def _print_cache_warning(cache_path:Path, err:Exception):
+    ''' Warn that the cache could not be used, without failing validation '''
+    print(f'Warning: verdict cache `{cache_path}` cannot be used: {err}', file=sys.stderr)
+
+class VerdictCache:
+    ''' SQLite cache of the inputs found valid, keyed by their identity on disk
+
+        A key covers the device, inode, size and modification time of every
+        path of the input and of the index files and CRAM reference its
+        validation reads, the contents of their checksum files, the options
+        and PIPEVAL_SKIP_* settings that can change the verdict, and the
+        PipeVal version, so any change to them invalidates the entry. Only
+        valid verdicts are stored: invalid inputs and transient failures are
+        always validated again. Errors using the cache are reported as
+        warnings and treated as cache misses.
+    '''
+    def __init__(self, directory:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+        ''' Constructor '''
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / CACHE_FILE_NAME
+        self._connection = sqlite3.connect(str(self.path), timeout=CACHE_TIMEOUT)
+        with self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS verdicts ('
+                'key TEXT PRIMARY KEY, paths TEXT NOT NULL, verdict TEXT NOT NULL, '
+                'created REAL NOT NULL, last_used REAL NOT NULL)')
+        self._options = self._options_identity(args)
+        self._cram_reference = getattr(args, 'cram_reference', None)
+
+    @staticmethod
+    def _options_identity(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+        ''' Everything besides the input itself that its verdict depends on '''
+        options = {option: getattr(args, option, None) for option in CACHE_KEY_OPTIONS}
+        return {
+            'version': __version__,
+            'options': options,
+            'skipped': {name: value for name, value in os.environ.items() \
+                if name.startswith(SKIP_VARIABLE_PREFIX)}
+        }
+
+    def key(self, paths:Tuple[Path, ...]):
+        ''' Cache key of an input made of `paths`, or None if they cannot be read '''
+        try:
+            identities = [{
+                'path': str(path),
+                'identity': _file_identity(path),
+                'indexes': [_optional_file_identity(index_path) \
+                    for index_path in _index_paths(path)],
+                'reference': _reference_identity(self._cram_reference) \
+                    if path.name.lower().endswith(CRAM_EXTENSION) else None,
+                'checksums': {hash_type: hash_path.read_text() \
+                    for hash_type, hash_path in _find_checksum_files(path).items()}
+            } for path in paths]
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        key_material = json.dumps([identities, self._options], sort_keys=True)
+        return hashlib.sha256(key_material.encode()).hexdigest()
+
+    def is_valid(self, key:str):
+        ''' Whether the input with `key` was found valid, marking its entry as used '''
+        try:
+            with self._connection:
+                updated = self._connection.execute('UPDATE verdicts SET last_used = ? '
+                    'WHERE key = ? AND verdict = ?', (time.time(), key, 'valid'))
+        except sqlite3.Error as err:
+            _print_cache_warning(self.path, err)
+            return False
+
+        return updated.rowcount > 0
+
+    def store_valid(self, key:str, paths:Tuple[Path, ...]):
+        ''' Record that the input with `key` is valid, unless it changed since the key was taken '''
+        if self.key(paths) != key:
+            return
+
+        now = time.time()
+        try:
+            with self._connection:
+                self._connection.execute('INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?)',
+                    (key, json.dumps([str(path) for path in paths]), 'valid', now, now))
+        except sqlite3.Error as err:
+            _print_cache_warning(self.path, err)
+
+    def evict(self, max_entries:Optional[int]=None, max_age_days:Optional[float]=None):
+        ''' Remove entries unused for `max_age_days`, then the least recently used ones
+
+            At most `max_entries` entries are kept.
+        '''
+        try:
+            with self._connection:
+                if max_age_days is not None:
+                    self._connection.execute('DELETE FROM verdicts WHERE last_used < ?',
+                        (time.time() - max_age_days * SECONDS_PER_DAY,))
+                if max_entries is not None:
+                    self._connection.execute('DELETE FROM verdicts WHERE key NOT IN '
+                        '(SELECT key FROM verdicts ORDER BY last_used DESC LIMIT ?)',
+                        (max_entries,))
+        except sqlite3.Error as err:
+            _print_cache_warning(self.path, err)
+
+    def close(self):
+        ''' Close the cache '''
+        self._connection.close()
+
+def _open_verdict_cache(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Verdict cache of the run, or None if it is disabled or cannot be opened '''
+    directory = _cache_directory(args)
+    if directory is None:
+        return None
+
+    try:
+        return VerdictCache(directory, args)
+    except (OSError, sqlite3.Error) as err:
+        _print_cache_warning(directory / CACHE_FILE_NAME, err)
+        return None
@@ -1,11 +1,14 @@
 ''' File checking functions '''
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Union
+from typing import BinaryIO, Optional, Union
 import warnings
 import zlib
 import gzip
 import bz2
-import magic
+
+from pipeval.validate.bgzf import _check_bgzf_integrity, _scan_bgzf_blocks
+from pipeval.validate.probe import _identify_prefix_compression, _probe_file
 
 def _identify_compression(path:Path):
     ''' Identify compression type and returns appropriate file handler '''
@@ -15,39 +18,84 @@ def _identify_compression(path:Path):
         'application/x-bzip2': bz2.open
     }
 
-    file_mime = magic.from_file(path.resolve(), mime=True)
-    return compression_handlers.get(file_mime, None)
+    return compression_handlers.get(_probe_file(path).mime, None)
 
-def _check_compression_integrity(path:Path, handler:Union[gzip.open,bz2.open]):
-    ''' Verify integrity of compressed file '''
+@contextmanager
+def _compression_errors():
+    ''' Report decompression failures as compression integrity errors '''
     integrity_error = ''
-    read_chunk_size = 1000000 # 1 MB chunks
 
-    with handler(path, 'rb') as file_reader:
-        try:
-            while file_reader.read(read_chunk_size) != b'':
-                pass
-        except gzip.BadGzipFile as bad_gzip:
-            integrity_error = f'Invalid Gzip file: {bad_gzip}'
-        except EOFError as eof_error:
-            integrity_error = f'Truncated or corrupted file: {eof_error}'
-        except zlib.error as zlib_error:
-            integrity_error = f'Decompression error: {zlib_error}'
+    try:
+        yield
+    except gzip.BadGzipFile as bad_gzip:
+        integrity_error = f'Invalid Gzip file: {bad_gzip}'
+    except EOFError as eof_error:
+        integrity_error = f'Truncated or corrupted file: {eof_error}'
+    except zlib.error as zlib_error:
+        integrity_error = f'Decompression error: {zlib_error}'
 
     if integrity_error != '':
         raise TypeError(f'Compression integrity check failed: {integrity_error}')
 
-def _check_compressed(path:Path, test_integrity:bool):
-    ''' Check file compression '''
+def _identify_stream_compression(prefix:bytes):
+    ''' Identify compression type from the first bytes of a stream and return its handler '''
+    compression_handlers = {
+        'gzip': gzip.open,
+        'bzip2': bz2.open
+    }
+
+    return compression_handlers.get(_identify_prefix_compression(prefix), None)
+
+def _check_compression_integrity(
+    path:Union[Path,BinaryIO],
+    handler:Union[gzip.open,bz2.open]):
+    ''' Verify integrity of compressed file
+
+        `path` may also be an open binary stream of the compressed file
+    '''
+    read_chunk_size = 1000000 # 1 MB chunks
+
+    with handler(path, 'rb') as file_reader, _compression_errors():
+        while file_reader.read(read_chunk_size) != b'':
+            pass
+
+def _check_compressed(path:Path, test_integrity:bool, stream:Optional[BinaryIO]=None,
+    threads:Optional[int]=None, scan_bgzf:bool=False):
+    ''' Check file compression
+
+        If `stream` is given, the integrity test reads the compressed data
+        from it instead of opening `path` again. BGZF files are tested
+        block by block on a pool of `threads` threads, also checking their
+        block chain and EOF marker if `scan_bgzf` is set.
+    '''
 
     file_handler = _identify_compression(path)
 
     if file_handler is None:
         warnings.warn(f'Warning: file {path} is not compressed.')
-        return
+        return None
 
     if test_integrity:
-        _check_compression_integrity(path, file_handler)
+        source = path if stream is None else stream
+        if file_handler is gzip.open and _probe_file(path).is_bgzf:
+            with _compression_errors():
+                _check_bgzf_integrity(source, threads, scan_bgzf)
+        else:
+            _check_compression_integrity(source, file_handler)
+
+    return file_handler
+
+def _check_bgzf_structure(path:Path, stream:Optional[BinaryIO]=None):
+    ''' Check the BGZF block chain of a BGZF file without decompressing it
+
+        Files that are not BGZF are left alone. If `stream` is given, the
+        blocks are read from it instead of opening `path` again.
+    '''
+    if not _probe_file(path).is_bgzf:
+        return
+
+    with _compression_errors():
+        _scan_bgzf_blocks(path if stream is None else stream)
 
 def _path_exists(path:Path):
     ''' Check if path exists '''
@@ -0,0 +1,111 @@
+''' Per-path file probe shared by every validation stage '''
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Union
+import os
+
+from pipeval.validate.bgzf import _bgzf_block_size
+from pipeval.generate_checksum.checksum import _find_checksum_files
+
+PROBE_SIZE = 4096 # First 4 KB of the file
+PROBE_CACHE_SIZE = 1024
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+
+COMPRESSION_MIME_TYPES = {
+    'gzip': 'application/gzip',
+    'bzip2': 'application/x-bzip2'
+}
+
+@lru_cache(maxsize=None)
+def _libmagic():
+    ''' Shared libmagic handle used when the magic bytes of a file are not recognised
+
+        libmagic is only loaded once such a file is seen.
+    '''
+    import magic # pylint: disable=C0415
+    return magic.Magic(mime=True)
+
+def _identify_prefix_compression(prefix:bytes):
+    ''' Identify the compression of a file from its first bytes: gzip, bzip2 or None '''
+    if prefix.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if prefix.startswith(BZIP2_MAGIC):
+        return 'bzip2'
+
+    return None
+
+def _is_text_prefix(prefix:bytes):
+    ''' Check whether the first bytes of a file are UTF-8 text
+
+        An empty file is not text, so libmagic reports it as empty.
+    '''
+    if not prefix or b'\x00' in prefix:
+        return False
+
+    try:
+        prefix.decode('utf-8')
+    except UnicodeDecodeError as decode_error:
+        # A multi-byte character may be cut off at the end of the prefix
+        if decode_error.start < len(prefix) - 3:
+            return False
+
+    return True
+
+@dataclass
+class FileProbe:
+    ''' What is known about a file from one read of its first bytes
+
+        `compression` is 'gzip', 'bzip2' or None. The MIME type only falls
+        back to libmagic for files that are neither compressed nor text, and
+        the checksum files
+        next to the file are looked up once on first use.
+    '''
+    path: Path
+    prefix: bytes
+
+    def __post_init__(self):
+        self.compression = _identify_prefix_compression(self.prefix)
+        self.is_bgzf = bool(_bgzf_block_size(self.prefix))
+        self.is_text = _is_text_prefix(self.prefix)
+        self._mime = None
+        self._checksum_files = None
+
+    @property
+    def mime(self):
+        ''' MIME type of the file '''
+        if self._mime is None:
+            if self.compression is not None:
+                self._mime = COMPRESSION_MIME_TYPES[self.compression]
+            elif self.is_text:
+                self._mime = 'text/plain'
+            else:
+                self._mime = _libmagic().from_buffer(self.prefix)
+
+        return self._mime
+
+    @property
+    def checksum_files(self) -> Dict[str, Path]:
+        ''' Existing checksum files for the file, keyed by hash type '''
+        if self._checksum_files is None:
+            self._checksum_files = _find_checksum_files(self.path)
+
+        return self._checksum_files
+
+# pylint: disable=W0613
+@lru_cache(maxsize=PROBE_CACHE_SIZE)
+def _cached_probe(path:str, device:int, inode:int, size:int, mtime_ns:int):
+    ''' Probe a file once per version of it on disk '''
+    with open(path, 'rb') as file_reader:
+        return FileProbe(Path(path), file_reader.read(PROBE_SIZE))
+
+def _probe_file(path:Union[Path,str]):
+    ''' Shared probe of `path`, read from disk only the first time it is asked for '''
+    stat = os.stat(path)
+    return _cached_probe(str(path), stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+def _clear_probes():
+    ''' Forget every probe, so that the next validation run reads files afresh '''
+    _cached_probe.cache_clear()
@@ -0,0 +1,74 @@
+''' Profiling of validation workers '''
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional, Union
+import cProfile
+import io
+import os
+import pstats
+import re
+
+from pipeval.validate.validate_types import ValidateArgs
+
+PROFILE_VARIABLE = 'PIPEVAL_PROFILE'
+PROFILE_SUFFIX = '.prof'
+PROFILE_SUMMARY_NAME = 'summary.txt'
+PROFILE_SUMMARY_FUNCTIONS = 30
+
+def _profile_directory(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Directory to write profiles to, from `--profile` or PIPEVAL_PROFILE, or None '''
+    directory = args.profile or os.environ.get(PROFILE_VARIABLE)
+    return Path(directory) if directory else None
+
+def _profile_path(directory:Path, name:str):
+    ''' Path of the stats file of `name`, validated by this process '''
+    file_name = re.sub(r'[^\w.+-]', '_', name.strip(os.sep))
+    return directory / f'{os.getpid()}-{file_name}{PROFILE_SUFFIX}'
+
+@contextmanager
+def _profiling(directory:Optional[Path], name:str):
+    ''' Profile the current thread into a stats file for `name` if `directory` is given
+
+        cProfile only follows the thread it is enabled on, so work handed to
+        other threads must be profiled separately. From Python 3.12 only one
+        profiler can be active per process, so nothing is profiled while
+        another profiler is enabled.
+    '''
+    if directory is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(_profile_path(directory, name)))
+
+def _summarize_profiles(directory:Path, since:float=0.0):
+    ''' Merge the stats files written to `directory` since `since` into a summary of hot functions
+
+        Returns the path of the summary, or None if there were no stats files.
+    '''
+    profile_paths = sorted(path for path in directory.glob(f'*{PROFILE_SUFFIX}') \
+        if path.stat().st_mtime >= since)
+    if not profile_paths:
+        return None
+
+    summary = io.StringIO()
+    summary.write(f'Merged profile of {len(profile_paths)} stats file(s) in {directory}\n')
+    stats = pstats.Stats(*[str(path) for path in profile_paths], stream=summary)
+    stats.strip_dirs()
+    for sort_key in ['tottime', 'cumulative']:
+        summary.write(f'\nTop {PROFILE_SUMMARY_FUNCTIONS} functions by {sort_key}\n')
+        stats.sort_stats(sort_key).print_stats(PROFILE_SUMMARY_FUNCTIONS)
+
+    summary_path = directory / PROFILE_SUMMARY_NAME
+    summary_path.write_text(summary.getvalue())
+    return summary_path
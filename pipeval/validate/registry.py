@@ -0,0 +1,31 @@
+''' Lazily imported functions keyed by file type '''
+from collections.abc import Mapping
+from importlib import import_module
+from typing import Callable, Dict, Iterator
+
+class LazyFunctionRegistry(Mapping):
+    ''' Read-only mapping of keys to functions, imported the first time their key is looked up
+
+        Functions are given as `module:function` names, so the module of a
+        validator and its dependencies only load once a file of its type is seen.
+    '''
+    def __init__(self, function_names:Dict[str, str]):
+        ''' Constructor '''
+        self._function_names = dict(function_names)
+        self._functions = {}
+
+    def __getitem__(self, key:str) -> Callable:
+        if key not in self._functions:
+            module_name, function_name = self._function_names[key].split(':')
+            self._functions[key] = getattr(import_module(module_name), function_name)
+
+        return self._functions[key]
+
+    def __contains__(self, key:object):
+        return key in self._function_names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._function_names)
+
+    def __len__(self):
+        return len(self._function_names)
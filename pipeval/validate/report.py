@@ -0,0 +1,188 @@
+''' Machine-readable per-file validation reports '''
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional, TextIO, Union
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+REPORT_FORMATS = ['json', 'jsonl']
+VALIDATION_STAGES = ['existence', 'checksum', 'compression', 'content']
+PROC_IO_PATH = '/proc/self/io'
+
+_active_report = threading.local()
+_finished_reports = []
+
+def _io_read_bytes():
+    ''' Bytes read by this process so far, or None where the OS does not report it '''
+    try:
+        with open(PROC_IO_PATH, 'r', encoding='ascii') as io_file:
+            for line in io_file:
+                if line.startswith('rchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return None
+
+def _peak_rss_bytes():
+    ''' Peak resident set size of this process, or None where the OS does not report it '''
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+# pylint: disable=R0902
+class FileReport:
+    ''' Verdict, resource use and per-stage timings of the validation of one file
+
+        Stages are timed while the report is active on the current thread.
+        Stages sharing a single read of the file are each charged the time
+        they spend consuming it. CPU time and bytes read are those of the
+        whole worker process, so they include other threads, such as those
+        of threaded decompression or of the other mate of a FASTQ pair.
+    '''
+    def __init__(self, path:Union[Path,str]):
+        ''' Constructor '''
+        self.path = str(path)
+        self.stages = {stage: {'wall_time': 0.0, 'cpu_time': 0.0} for stage in VALIDATION_STAGES}
+        self.bytes_read = 0
+        self.shards = 0
+        self.error = None
+        self.sampled = False
+        self.cached = False
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.file_type = None
+        self.verdict = None
+        self.pid = None
+        self.peak_rss_bytes = None
+        self._start_read_bytes = _io_read_bytes()
+        self._start_wall_time = time.perf_counter()
+        self._start_cpu_time = time.process_time()
+
+    @contextmanager
+    def active(self):
+        ''' Make this the report that stages of the current thread are timed into '''
+        previous_report = getattr(_active_report, 'report', None)
+        _active_report.report = self
+        try:
+            yield self
+        finally:
+            _active_report.report = previous_report
+
+    def add_stage_time(self, stage:str, wall_time:float, cpu_time:float):
+        ''' Add time spent in a validation stage '''
+        self.stages[stage]['wall_time'] += wall_time
+        self.stages[stage]['cpu_time'] += cpu_time
+
+    def add_bytes_read(self, bytes_read:int):
+        ''' Count bytes read, used where the OS does not report the bytes read by the process '''
+        if self._start_read_bytes is None:
+            self.bytes_read += bytes_read
+
+    def add_error(self, error:Union[BaseException,str]):
+        ''' Record an error, keeping the first one reported for the file '''
+        if self.error is None:
+            self.error = str(error)
+
+    def merge(self, other:'FileReport'):
+        ''' Add the stage times, bytes read and error of a report on a shard of the same file '''
+        for stage, times in other.stages.items():
+            self.add_stage_time(stage, times['wall_time'], times['cpu_time'])
+        self.bytes_read += other.bytes_read
+        self.wall_time += other.wall_time
+        self.cpu_time += other.cpu_time
+        if other.error is not None:
+            self.add_error(other.error)
+        self.shards += 1
+
+    def set_verdict(self, valid:Optional[bool]):
+        ''' Record whether the file is valid, or None if it was skipped '''
+        self.verdict = 'skipped' if valid is None else 'valid' if valid else 'invalid'
+
+    def finish(self, file_type:str, valid:Optional[bool]):
+        ''' Record the verdict of the file and queue the report to be collected '''
+        end_read_bytes = _io_read_bytes()
+        if self._start_read_bytes is not None and end_read_bytes is not None:
+            self.bytes_read += end_read_bytes - self._start_read_bytes
+            self._start_read_bytes = None
+        self.wall_time += time.perf_counter() - self._start_wall_time
+        self.cpu_time += time.process_time() - self._start_cpu_time
+
+        self.file_type = file_type
+        self.set_verdict(valid)
+        self.pid = os.getpid()
+        self.peak_rss_bytes = _peak_rss_bytes()
+        _finished_reports.append(self)
+
+    def to_dict(self):
+        ''' JSON-serialisable form of the report '''
+        return {
+            'path': self.path,
+            'type': self.file_type,
+            'verdict': self.verdict,
+            'error': self.error,
+            'sampled': self.sampled,
+            'cached': self.cached,
+            'bytes_read': self.bytes_read,
+            'wall_time': self.wall_time,
+            'cpu_time': self.cpu_time,
+            'stages': self.stages,
+            'shards': self.shards,
+            'pid': self.pid,
+            'peak_rss_bytes': self.peak_rss_bytes
+        }
+
+@contextmanager
+def _report_stage(stage:str):
+    ''' Time a validation stage into the report active on the current thread, if any '''
+    report = getattr(_active_report, 'report', None)
+    if report is None:
+        yield
+        return
+
+    start_wall_time = time.perf_counter()
+    start_cpu_time = time.process_time()
+    try:
+        yield
+    finally:
+        report.add_stage_time(stage,
+            time.perf_counter() - start_wall_time, time.process_time() - start_cpu_time)
+
+def _report_error(error:Union[BaseException,str]):
+    ''' Record an error into the report active on the current thread, if any '''
+    report = getattr(_active_report, 'report', None)
+    if report is not None:
+        report.add_error(error)
+
+def _report_bytes_read(bytes_read:int):
+    ''' Count bytes read into the report active on the current thread, if any '''
+    report = getattr(_active_report, 'report', None)
+    if report is not None:
+        report.add_bytes_read(bytes_read)
+
+def _collect_reports():
+    ''' Take the reports finished in this process since they were last collected '''
+    reports = _finished_reports[:]
+    del _finished_reports[:len(reports)]
+    return reports
+
+def _write_report(report_format:str, reports:List[FileReport], output:Optional[TextIO]=None):
+    ''' Write reports to `output`, by default standard output, as JSON lines or one document '''
+    output = sys.stdout if output is None else output
+    if report_format == 'jsonl':
+        for report in reports:
+            print(json.dumps(report.to_dict()), file=output, flush=True)
+    else:
+        json.dump({'files': [report.to_dict() for report in reports]}, output, indent=2)
+        print(file=output)
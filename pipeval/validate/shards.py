@@ -0,0 +1,21 @@
+''' Splitting of indexed files into regions validated in parallel '''
+from typing import List, Optional, Tuple
+
+SHARDS_PER_PROCESS = 4 # More shards than processes balances uneven contigs
+
+def _region_shards(contigs:List[Tuple[str, Optional[int]]], num_processes:int):
+    ''' Split contigs, given as (name, length), into (contig, start, end) regions of similar length
+
+        The last region of each contig is open-ended to cover records past
+        its declared length, as is the only region of a contig of unknown length.
+    '''
+    total_length = sum(length for _, length in contigs if length)
+    region_length = max(total_length // (num_processes * SHARDS_PER_PROCESS), 1)
+
+    shards = []
+    for contig, length in contigs:
+        starts = range(0, length, region_length) if length else [0]
+        shards += [(contig, start, start + region_length) for start in starts[:-1]]
+        shards.append((contig, starts[-1], None))
+
+    return shards
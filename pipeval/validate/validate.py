@@ -1,68 +1,265 @@
 ''' File validation functions '''
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from functools import partial
 from pathlib import Path
 import sys
 import os
-from typing import Dict, Union
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+import copy
 import multiprocessing
-from itertools import repeat
+import warnings
 
-from pipeval.validate.validators.bam import _check_bam
-from pipeval.validate.validators.sam import _check_sam
-from pipeval.validate.validators.cram import _check_cram
-from pipeval.validate.validators.vcf import _check_vcf
-from pipeval.validate.validators.fastq import _check_fastq
 from pipeval.validate.files import (
+    _check_bgzf_structure,
     _check_compressed,
+    _check_compression_integrity,
+    _identify_stream_compression,
     _path_exists
 )
-from pipeval.validate.validate_types import ValidateArgs
-from pipeval.generate_checksum.checksum import _validate_checksums
-
-# Currently supported data types
-FILE_TYPES_DICT = {
-    'file-bam': ['.bam'],
-    'file-sam': ['.sam'],
-    'file-cram': ['.cram'],
-    'file-vcf': ['.vcf', '.vcf.gz'],
-    'file-fasta': ['.fasta', '.fa'],
-    'file-fastq':['.fastq', '.fq.gz', '.fq', '.fastq.gz', '.fastq.bz2', '.fq.bz2'],
-    'file-bed': ['.bed', '.bed.gz'],
-    'file-py': ['.py']
-    }
+from pipeval.validate.probe import _clear_probes, _probe_file
+from pipeval.validate.profiling import _profile_directory, _profiling, _summarize_profiles
+from pipeval.validate.report import (
+    FileReport,
+    _collect_reports,
+    _report_bytes_read,
+    _report_error,
+    _report_stage,
+    _write_report
+)
+from pipeval.validate.registry import LazyFunctionRegistry
+from pipeval.validate.validate_types import CACHE_DIR_VARIABLE, FILE_TYPES_DICT, ValidateArgs
+from pipeval.generate_checksum.checksum import (
+    HashingReader,
+    _find_checksum_files,
+    _validate_checksums,
+    _write_checksum_file
+)
+from pipeval.common import _available_cpus, _is_validation_skipped, _PrefixedReader
+
+if TYPE_CHECKING:
+    from pipeval.validate.cache import VerdictCache
+    from pipeval.validate.validators.fastq import FASTQ_PAIR
+
 UNKNOWN_FILE_TYPE = 'file-unknown' # file type is unlisted
-CHECK_FUNCTION_SWITCH = {
-    'file-bam': _check_bam,
-    'file-sam': _check_sam,
-    'file-cram': _check_cram,
-    'file-vcf': _check_vcf,
-    'file-fastq': _check_fastq
-}
+# Validator functions are imported along with their dependencies once a file of their type is seen
+CHECK_FUNCTION_SWITCH = LazyFunctionRegistry({
+    'file-bam': 'pipeval.validate.validators.bam:_check_bam',
+    'file-sam': 'pipeval.validate.validators.sam:_check_sam',
+    'file-cram': 'pipeval.validate.validators.cram:_check_cram',
+    'file-vcf': 'pipeval.validate.validators.vcf:_check_vcf',
+    'file-fastq': 'pipeval.validate.validators.fastq:_check_fastq'
+})
+# Content checks that can consume the shared single-pass stream of the file
+STREAM_CHECK_FUNCTION_SWITCH = LazyFunctionRegistry({
+    'file-fastq': 'pipeval.validate.validators.fastq:_check_fastq_stream'
+})
+# Content checks that can split a file into shards validated in parallel
+SHARD_FUNCTION_SWITCH = LazyFunctionRegistry({
+    'file-bam': 'pipeval.validate.validators.bam:_shard_bam',
+    'file-cram': 'pipeval.validate.validators.cram:_shard_cram',
+    'file-vcf': 'pipeval.validate.validators.vcf:_shard_vcf'
+})
+SHARD_CHECK_FUNCTION_SWITCH = LazyFunctionRegistry({
+    'file-bam': 'pipeval.validate.validators.bam:_check_bam_shard',
+    'file-cram': 'pipeval.validate.validators.cram:_check_cram_shard',
+    'file-vcf': 'pipeval.validate.validators.vcf:_check_vcf_shard'
+})
+# Whole-file checks run on the results of the shards of a file
+SHARD_MERGE_FUNCTION_SWITCH = LazyFunctionRegistry({
+    'file-bam': 'pipeval.validate.validators.bam:_merge_bam_shards',
+    'file-cram': 'pipeval.validate.validators.cram:_merge_cram_shards'
+})
+# Content checks that can validate a sample of the file, used by quick validation
+SAMPLE_CHECK_FUNCTION_SWITCH = LazyFunctionRegistry({
+    'file-fastq': 'pipeval.validate.validators.fastq:_check_fastq_sampled'
+})
 CHECK_COMPRESSION_TYPES = ['file-vcf', 'file-fastq', 'file-bed', 'file-fastq']
+# Relative cost per byte of validating each file type, used to schedule the costliest files first
+VALIDATION_COST_FACTORS = {
+    'file-bam': 4,
+    'file-cram': 8,
+    'file-sam': 2,
+    'file-vcf': 4,
+    'file-fastq': 2
+}
+STDIN_PATH = '-'
+STREAM_PROBE_SIZE = 65536 # Enough of the stream to identify its compression
 
-def _validate_file(
+def _validate_file( # pylint: disable=R0913,R0917
     path:Path, file_type:str,
     file_extension:str,
-    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+    stream_check:Optional[Callable]=None,
+    check_content:bool=True):
     ''' Validate a single file
         `args` must contain the following:
         `path` is a required argument with a value of list of files
         `cram_reference` is a required argument with either a string value or None
         `unmapped_bam` is a required argument of boolean variable
+        `quick` is an optional boolean argument to validate a sample of the file instead
+        `stream_check` overrides the streamed content check for the file type
+        `check_content` is False when the content is validated separately, in shards
+        Returns whether only a sample of the file was validated.
     '''
-    _path_exists(path)
+    with _report_stage('existence'):
+        _path_exists(path)
 
     if not file_extension:
         raise TypeError(f'File {path} does not have a valid extension.')
 
-    if file_type in CHECK_COMPRESSION_TYPES:
-        _check_compressed(path, args.test_integrity)
+    # Sampling skips the full read, so checksums are not verified for sampled files
+    if args.quick and check_content and stream_check is None \
+        and file_type in SAMPLE_CHECK_FUNCTION_SWITCH:
+        with _report_stage('content'):
+            sampled = SAMPLE_CHECK_FUNCTION_SWITCH[file_type](path, args)
+        if sampled:
+            return True
+
+    content_validated = _validate_single_pass(path, file_type, args, stream_check)
+
+    if check_content and not content_validated:
+        with _report_stage('content'):
+            CHECK_FUNCTION_SWITCH.get(file_type, lambda p, a: None)(path, args)
+
+    return False
+
+def _validate_single_pass(
+    path:Path,
+    file_type:str,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+    stream_check:Optional[Callable]=None):
+    ''' Run checksum, compression and streamable content checks over one read of the file
+
+        Every requested hasher, the compression integrity test or BGZF block
+        chain scan and any content check in `STREAM_CHECK_FUNCTION_SWITCH`
+        consume the same raw read.
+        Returns whether the content of the file was validated.
+    '''
+    with _report_stage('checksum'):
+        probe = _probe_file(path)
+        hash_types = [] if _is_validation_skipped('CHECKSUM') else list(probe.checksum_files)
+    if stream_check is None:
+        stream_check = STREAM_CHECK_FUNCTION_SWITCH.get(file_type)
+    content_error = None
+
+    with HashingReader(path, hash_types) as reader:
+        with _report_stage('compression'):
+            if file_type in CHECK_COMPRESSION_TYPES:
+                # A streamed content check decompresses the whole file, testing integrity on the way
+                _check_compressed(path, args.test_integrity and stream_check is None, reader,
+                    args.threads, args.scan_bgzf)
+
+            # The integrity test checks the block chain of BGZF files itself while inflating them
+            full_integrity_test = args.test_integrity and file_type in CHECK_COMPRESSION_TYPES
+            if args.scan_bgzf and stream_check is None and not full_integrity_test:
+                _check_bgzf_structure(path, reader)
+
+        if stream_check is not None:
+            try:
+                with _report_stage('content'):
+                    stream_check(path, reader, args)
+            except ValueError as err:
+                # Checksum failures are reported ahead of content errors
+                content_error = err
+
+        with _report_stage('checksum'):
+            if hash_types:
+                reader.drain()
 
-    _validate_checksums(path)
+    _report_bytes_read(reader.bytes_read)
+    with _report_stage('checksum'):
+        _validate_checksums(path, reader.hexdigests(), probe.checksum_files)
 
-    CHECK_FUNCTION_SWITCH.get(file_type, lambda p, a: None)(path, args)
+    if content_error is not None:
+        raise content_error
+
+    return stream_check is not None
+
+def _is_stream(path:Union[Path,str]):
+    ''' Check whether the input is stdin or a named pipe '''
+    return str(path) == STDIN_PATH or Path(path).is_fifo()
+
+def _probe_stream(reader:HashingReader):
+    ''' Identify the compression of a stream, returning it with the stream to read from '''
+    # Streams cannot be rewound, so the bytes used to identify compression are replayed
+    prefix = reader.read(STREAM_PROBE_SIZE)
+    return _identify_stream_compression(prefix), _PrefixedReader(prefix, reader)
+
+def _output_stream_checksums(path:Union[Path,str],
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]], hexdigests:dict):
+    ''' Write the requested checksums of a stream for its `tee` copy, or print them '''
+    for hash_type in args.checksum_type if args.checksum_type else []:
+        if args.tee:
+            _write_checksum_file(Path(args.tee), hash_type, hexdigests[hash_type])
+        else:
+            print(f'{hexdigests[hash_type]}  {path}')
+
+def _validate_stream(
+    path:Union[Path,str],
+    file_type:str,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Validate an input read from stdin or a named pipe as the bytes go by
+        `args` must contain the following in addition to those of `_validate_file`:
+        `tee` is a required argument with either a path to copy the stream to or None
+        `checksum_type` is a required argument with either a list of checksum types to
+            compute over the stream or None. Checksum files are written for `tee`, or the
+            checksums are printed otherwise.
+    '''
+    if file_type == UNKNOWN_FILE_TYPE:
+        raise TypeError(f'File type of stream {path} must be given with --type.')
+
+    is_stdin = str(path) == STDIN_PATH
+    checksum_files = {} if is_stdin or _is_validation_skipped('CHECKSUM') \
+        else _find_checksum_files(path)
+    output_checksum_types = args.checksum_type if args.checksum_type else []
+    hash_types = list(dict.fromkeys([*output_checksum_types, *checksum_files]))
+    stream_check = STREAM_CHECK_FUNCTION_SWITCH.get(file_type)
+    content_error = None
+
+    with ExitStack() as stack:
+        reader = stack.enter_context(HashingReader(sys.stdin.fileno() if is_stdin else path,
+            hash_types, tee=stack.enter_context(open(args.tee, 'wb')) if args.tee else None))
+        compression_handler, stream = _probe_stream(reader)
+
+        if stream_check is not None:
+            try:
+                with _report_stage('content'):
+                    stream_check(path, stream, args, compression_handler or open)
+            except ValueError as err:
+                # Checksum failures are reported ahead of content errors
+                content_error = err
+        elif compression_handler is not None and args.test_integrity:
+            with _report_stage('compression'):
+                _check_compression_integrity(stream, compression_handler)
+
+        # Always consume the whole stream so the writer is never cut off
+        with _report_stage('checksum'):
+            reader.drain()
+
+    _report_bytes_read(reader.bytes_read)
+    hexdigests = reader.hexdigests()
+    if checksum_files:
+        with _report_stage('checksum'):
+            _validate_checksums(path, hexdigests)
+
+    if content_error is not None:
+        raise content_error
+
+    _output_stream_checksums(path, args, hexdigests)
+
+    if stream_check is None:
+        if args.tee:
+            with _report_stage('content'):
+                CHECK_FUNCTION_SWITCH.get(file_type, lambda p, a: None)(Path(args.tee), args)
+        else:
+            warnings.warn(f'Warning: content of {file_type} stream {path} cannot be validated '
+                'while streaming. Use --tee to validate the copied output.')
 
 def _print_error(path:Path, err:BaseException):
-    ''' Prints error message '''
+    ''' Prints error message, recording it in the report of the file being validated '''
+    _report_error(err)
     print(f'PID:{os.getpid()} - Error: `{str(path)}` {str(err)}', file=sys.stderr)
 
 def _print_success(path:Path, file_type:str):
@@ -92,32 +289,550 @@ def _check_extension(extension:str):
 
     return UNKNOWN_FILE_TYPE
 
-def _validation_worker(path: Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
-    ''' Worker function to validate a single file '''
+def _validation_worker(path: Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+    check_content:bool=True):
+    ''' Worker function to validate a single file
+
+        With `check_content` False, only the whole-file checks are run and
+        success is reported once the shards of the file are validated.
+    '''
+    report = FileReport(path)
+    file_type = UNKNOWN_FILE_TYPE
+    with report.active():
+        try:
+            if _is_stream(path):
+                file_type = args.type if args.type \
+                    else _detect_file_type_and_extension(Path(path))[0]
+                _validate_stream(path, file_type, args)
+            else:
+                file_type, file_extension = _detect_file_type_and_extension(path)
+                report.sampled = _validate_file(path, file_type, file_extension, args,
+                    check_content=check_content)
+        except FileNotFoundError as file_not_found_err:
+            print(f"Warning: {str(path)} {str(file_not_found_err)}", file=sys.stderr)
+            report.add_error(file_not_found_err)
+            report.finish(file_type, None)
+            return True
+        except (TypeError, ValueError, IOError, OSError) as err:
+            _print_error(path, err)
+            report.finish(file_type, False)
+            return False
+
+    report.finish(file_type, True)
+    if check_content:
+        _print_success(path, f'{file_type} (sampled)' if report.sampled else file_type)
+    return True
+
+def _file_shards(path:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+    num_processes:int):
+    ''' Shards to validate the content of a file across in parallel, if it can be split '''
+    # A stream can only be read once, by the worker validating it
+    if num_processes < 2 or _is_stream(path):
+        return []
+
+    file_type = _detect_file_type_and_extension(path)[0]
     try:
-        file_type, file_extension = _detect_file_type_and_extension(path)
-        _validate_file(path, file_type, file_extension, args)
-    except FileNotFoundError as file_not_found_err:
-        print(f"Warning: {str(path)} {str(file_not_found_err)}", file=sys.stderr)
+        return SHARD_FUNCTION_SWITCH.get(file_type, lambda p, a, n: [])(path, args, num_processes)
+    except (ValueError, OSError):
+        # Files that cannot be opened are validated whole, so the worker reports the error
+        return []
+
+def _shard_validation_worker(path:Path, shard:tuple,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Worker function to validate the content of one shard of a file
+
+        Returns whether the shard is valid and the result of its check.
+    '''
+    report = FileReport(path)
+    file_type = _detect_file_type_and_extension(path)[0]
+    with report.active():
+        try:
+            with _report_stage('content'):
+                shard_result = SHARD_CHECK_FUNCTION_SWITCH[file_type](path, shard, args)
+        except (TypeError, ValueError, IOError, OSError) as err:
+            _print_error(path, f'{err} (shard {":".join(str(part) for part in shard)})')
+            report.finish(file_type, False)
+            return False, None
+
+    report.finish(file_type, True)
+    return True, shard_result
+
+def _merge_shard_results(path:Path, file_valid:bool, shard_results:list,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Merge the whole-file result and the results of the shards of a file into one verdict '''
+    if not file_valid or not all(shard_valid for shard_valid, _ in shard_results):
+        return False
+
+    file_type = _detect_file_type_and_extension(path)[0]
+    try:
+        SHARD_MERGE_FUNCTION_SWITCH.get(file_type, lambda p, r, a: None)(
+            path, [shard_result for _, shard_result in shard_results], args)
     except (TypeError, ValueError, IOError, OSError) as err:
         _print_error(path, err)
         return False
 
-    _print_success(path, file_type)
+    _print_success(path, f'{file_type} ({len(shard_results)} shards)')
+    return True
+
+def _validate_mate(pair:'FASTQ_PAIR', mate:int, path:Path,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]], report:Optional[FileReport]=None):
+    ''' Validate one mate of a FASTQ pair, passing its read names on for the pairing check '''
+    # The pairing check waits on both mates, so each must be finished whatever happens
+    with report.active() if report is not None else nullcontext():
+        try:
+            with _profiling(_profile_directory(args), str(path)):
+                file_type, file_extension = _detect_file_type_and_extension(path)
+                if file_type != 'file-fastq':
+                    raise TypeError(f'File {path} is not a FASTQ file.')
+
+                _validate_file(path, file_type, file_extension, args,
+                    partial(STREAM_CHECK_FUNCTION_SWITCH['file-fastq'],
+                        block_callback=pair.block_callback(mate)))
+        finally:
+            pair.finish(mate)
+
+def _pair_validation_worker(paths:Tuple[Path, Path],
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Worker function to validate a pair of mate FASTQ files
+
+        Both mates are read concurrently, each on its own thread, while their
+        read names are compared in lockstep.
+    '''
+    # pylint: disable=C0415
+    from pipeval.validate.validators.fastq import FASTQ_PAIR, FASTQ_PAIRING_STOPPED
+
+    pair = FASTQ_PAIR(*paths)
+    pairing_error = None
+    reports = {path: FileReport(path) for path in paths}
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        mate_futures = [executor.submit(_validate_mate, pair, mate, path, args, reports[path]) \
+            for mate, path in enumerate(paths)]
+        try:
+            pair.check_pairing()
+        except ValueError as err:
+            pairing_error = err
+
+    mate_errors = [(path, future.exception()) for path, future in zip(paths, mate_futures) \
+        if future.exception() is not None \
+            and not isinstance(future.exception(), FASTQ_PAIRING_STOPPED)]
+
+    for path, err in mate_errors:
+        if not isinstance(err, (TypeError, ValueError, IOError, OSError)):
+            raise err
+        with reports[path].active():
+            _print_error(path, err)
+
+    if not mate_errors and pairing_error is not None:
+        _print_error(f'{paths[0]}` and `{paths[1]}', pairing_error)
+        for report in reports.values():
+            report.add_error(pairing_error)
+
+    pair_valid = not mate_errors and pairing_error is None
+    for report in reports.values():
+        report.finish('file-fastq', pair_valid)
+
+    if not pair_valid:
+        return False
+
+    for path in paths:
+        _print_success(path, 'paired file-fastq')
     return True
 
+def _validation_cost(paths:Tuple[Path, ...], check_content:bool=True):
+    ''' Estimated cost of validating files, from their size and type '''
+    cost = 0
+    for path in paths:
+        try:
+            file_size = path.stat().st_size
+        except OSError:
+            file_size = 0
+        file_type = _detect_file_type_and_extension(path)[0]
+        cost += file_size * (VALIDATION_COST_FACTORS.get(file_type, 1) if check_content else 1)
+
+    return cost
+
+def _task_name(task:tuple):
+    ''' Name of the input validated by a scheduled task '''
+    worker, target, *worker_args = task
+    if worker is _shard_validation_worker:
+        return f'{target}:{":".join(str(part) for part in worker_args[0])}'
+    if worker is _pair_validation_worker:
+        return '+'.join(str(path) for path in target)
+
+    return 'stdin' if str(target) == STDIN_PATH else str(target)
+
+def _validation_task(task:tuple, profile_directory:Optional[Path]=None):
+    ''' Run a scheduled task, given as a worker function followed by its arguments
+
+        The task is profiled into `profile_directory` if it is given.
+        Returns the task along with its result, as tasks finish out of order,
+        and the reports of the files it validated.
+    '''
+    worker, *worker_args = task
+    with _profiling(profile_directory, _task_name(task)):
+        result = worker(*worker_args)
+
+    return task, result, _collect_reports()
+
+def _task_args(args:Union[ValidateArgs,Dict[str, Union[str,list]]], threads:int):
+    ''' Copy of the arguments for a task that may use `threads` threads '''
+    if isinstance(args, tuple):
+        return args._replace(threads=threads)
+
+    task_args = copy.copy(args)
+    task_args.threads = threads
+    return task_args
+
+def _schedule_validation_tasks(file_paths:list, file_shards:dict, fastq_pairs:list,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]], thread_budget:Optional[int]=None):
+    ''' Validation tasks for the pool, costliest first so no large file is left until last
+
+        With a `thread_budget`, every task is given a share of the threads in
+        proportion to its share of the total cost, and at least one thread.
+        The pool runs as many tasks at a time as the budget allows, so the
+        largest shares are then capped for any tasks running together to
+        stay within the budget.
+    '''
+    scheduled_tasks = []
+    for path in file_paths:
+        check_content = path not in file_shards
+        scheduled_tasks.append((_validation_cost((path,), check_content),
+            (_validation_worker, path, args, check_content)))
+
+    for path, shards in file_shards.items():
+        shard_cost = _validation_cost((path,)) / len(shards)
+        scheduled_tasks += [(shard_cost, (_shard_validation_worker, path, shard, args)) \
+            for shard in shards]
+
+    for pair in fastq_pairs:
+        scheduled_tasks.append((_validation_cost(pair), (_pair_validation_worker, pair, args)))
+
+    scheduled_tasks.sort(key=lambda scheduled_task: scheduled_task[0], reverse=True)
+    if thread_budget is None:
+        return [task for _, task in scheduled_tasks]
+
+    return _budget_task_threads(scheduled_tasks, args, thread_budget)
+
+def _budget_task_threads(scheduled_tasks:list,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]], thread_budget:int):
+    ''' Tasks of the `(cost, task)` pairs, each given a share of `thread_budget` by its cost '''
+    total_cost = sum(cost for cost, _ in scheduled_tasks) or 1
+    task_threads = _cap_concurrent_threads(
+        [max(1, min(thread_budget, round(thread_budget * cost / total_cost))) \
+            for cost, _ in scheduled_tasks],
+        _budgeted_pool_size(len(scheduled_tasks), thread_budget), thread_budget)
+    budgeted_tasks = []
+    for threads, (_, task) in zip(task_threads, scheduled_tasks):
+        task_args = _task_args(args, threads)
+        budgeted_tasks.append(tuple(task_args if argument is args else argument \
+            for argument in task))
+
+    return budgeted_tasks
+
+def _budgeted_pool_size(num_tasks:int, thread_budget:int):
+    ''' Number of pool workers for `num_tasks` tasks sharing `thread_budget` threads '''
+    return max(min(thread_budget, num_tasks), 1)
+
+def _cap_concurrent_threads(task_threads:List[int], pool_size:int, thread_budget:int):
+    ''' Cap the thread counts of tasks so that any `pool_size` of them fit in `thread_budget`
+
+        The counts above the highest cap that fits are lowered to it, and the
+        threads that are still spare go one each to the costliest of them.
+    '''
+    def _concurrent_threads(cap:int):
+        capped_threads = sorted((min(threads, cap) for threads in task_threads), reverse=True)
+        return sum(capped_threads[:pool_size])
+
+    cap = max(task_threads, default=1)
+    while cap > 1 and _concurrent_threads(cap) > thread_budget:
+        cap -= 1
+
+    spare_threads = thread_budget - _concurrent_threads(cap)
+    capped_threads = []
+    for threads in task_threads:
+        if threads > cap and spare_threads > 0:
+            capped_threads.append(cap + 1)
+            spare_threads -= 1
+        else:
+            capped_threads.append(min(threads, cap))
+
+    return capped_threads
+
+def _merge_shard_reports(file_reports:list, valid:bool):
+    ''' Merge the reports on the whole-file checks and on each shard of a file into one '''
+    file_report, *shard_reports = file_reports
+    for shard_report in shard_reports:
+        file_report.merge(shard_report)
+    file_report.set_verdict(valid)
+
+    return file_report
+
+def _emit_reports(report_format:Optional[str], new_reports:list, reports:list):
+    ''' Keep the reports of files as they finish, writing them out at once as JSON lines '''
+    reports += new_reports
+    if report_format == 'jsonl':
+        _write_report(report_format, new_reports)
+
+def _input_paths(validation_input:Union[Path,Tuple[Path, ...]]):
+    ''' Paths of an input, either a file or a pair of mate files '''
+    return validation_input if isinstance(validation_input, tuple) else (validation_input,)
+
+def _skip_cached_inputs(inputs:list, verdict_cache:'VerdictCache', cache_keys:dict,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Inputs left to validate, reporting those with a cached valid verdict as valid
+
+        The cache keys of the inputs left are kept in `cache_keys`, so their
+        verdicts can be stored once they are found valid.
+    '''
+    uncached_inputs = []
+    for validation_input in inputs:
+        paths = _input_paths(validation_input)
+        key = verdict_cache.key(paths)
+        if key is None or args.cache_refresh or not verdict_cache.is_valid(key):
+            cache_keys[validation_input] = key
+            uncached_inputs.append(validation_input)
+            continue
+
+        for path in paths:
+            file_type = 'file-fastq' if len(paths) > 1 else _detect_file_type_and_extension(path)[0]
+            report = FileReport(path)
+            report.cached = True
+            report.finish(file_type, True)
+            _print_success(path, f'{"paired " if len(paths) > 1 else ""}{file_type} (cached)')
+
+    return uncached_inputs
+
+def _store_valid_verdict(verdict_cache:Optional['VerdictCache'], cache_keys:dict,
+    validation_input:Union[Path,Tuple[Path, ...]]):
+    ''' Cache that an input was found valid, if the cache is enabled '''
+    key = cache_keys.get(validation_input)
+    if verdict_cache is not None and key is not None:
+        verdict_cache.store_valid(key, _input_paths(validation_input))
+
+def _report_unvalidated_inputs(inputs:list, finished_inputs:set):
+    ''' Report the inputs left unvalidated once validation stopped at the first invalid input '''
+    for validation_input in inputs:
+        if validation_input in finished_inputs:
+            continue
+
+        for path in _input_paths(validation_input):
+            report = FileReport(path)
+            report.add_error('not validated: --fail-fast stopped at the first invalid input')
+            report.finish(_detect_file_type_and_extension(path)[0], None)
+            print(f'Warning: `{path}` was not validated, as --fail-fast stopped at the first '
+                'invalid input', file=sys.stderr)
+
+class _ValidationResults:
+    ''' Verdicts and reports of the inputs validated so far, in the order they finish '''
+    def __init__(self, args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+        verdict_cache:Optional['VerdictCache'], cache_keys:dict):
+        ''' Constructor '''
+        self.args = args
+        self.verdict_cache = verdict_cache
+        self.cache_keys = cache_keys
+        self.verdicts = []
+        self.reports = []
+        self.finished_inputs = set()
+
+    def emit_reports(self, new_reports:list):
+        ''' Keep the reports of files as they finish, in the report format of the run '''
+        _emit_reports(self.args.report, new_reports, self.reports)
+
+    def add(self, validation_input:Union[Path,str,Tuple[Path, ...]], valid:bool, reports:list):
+        ''' Record the verdict and reports of an input once all of its validation is done '''
+        self.verdicts.append(valid)
+        self.finished_inputs.add(validation_input)
+        self.emit_reports(reports)
+        if valid:
+            _store_valid_verdict(self.verdict_cache, self.cache_keys, validation_input)
+
+class _ShardedResults:
+    ''' Results and reports of the tasks on sharded files, kept until all of a file's are done '''
+    def __init__(self, file_shards:dict):
+        ''' Constructor '''
+        self.file_shards = file_shards
+        self.file_results = {}
+        self.shard_results = {path: [] for path in file_shards}
+        self.shard_reports = {path: [] for path in file_shards}
+
+    def add(self, worker:Callable, path:Path, result, task_reports:list):
+        ''' Keep the result of a task on a sharded file, returning whether the task passed '''
+        if worker is _shard_validation_worker:
+            self.shard_results[path].append(result)
+            self.shard_reports[path] += task_reports
+            return result[0]
+
+        self.file_results[path] = result
+        self.shard_reports[path][:0] = task_reports
+        return result
+
+    def is_done(self, path:Path):
+        ''' Whether the whole-file checks and every shard of a file are done '''
+        return path in self.file_results \
+            and len(self.shard_results[path]) == len(self.file_shards[path])
+
+    def merge(self, path:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+        ''' Verdict and report of a file whose tasks are all done '''
+        file_reports = self.shard_reports.pop(path)
+        with file_reports[0].active() if file_reports else nullcontext():
+            file_valid = _merge_shard_results(
+                path, self.file_results[path], self.shard_results[path], args)
+
+        return file_valid, [_merge_shard_reports(file_reports, file_valid)] if file_reports else []
+
+    def fail(self, path:Path):
+        ''' Verdict and report of a file one of whose tasks failed, with others left running '''
+        file_reports = self.shard_reports.pop(path)
+        return False, [_merge_shard_reports(file_reports, False)] if file_reports else []
+
+def _collect_task_result(task:tuple, result, task_reports:list, sharded:_ShardedResults,
+    results:_ValidationResults):
+    ''' Record the result of a finished task, returning whether validation should stop '''
+    worker, path, *_ = task
+    fail_fast = results.args.fail_fast
+    if path in sharded.file_shards:
+        if not sharded.add(worker, path, result, task_reports) and fail_fast:
+            # A sharded file is invalid as soon as one of its tasks fails
+            results.add(path, *sharded.fail(path))
+            return True
+        # Sharded files are merged into one verdict once all of their tasks are done
+        if not sharded.is_done(path):
+            return False
+        result, task_reports = sharded.merge(path, results.args)
+
+    results.add(path, result, task_reports)
+    return not result and fail_fast
+
+def _run_validation_tasks(run_task:Callable, validation_tasks:list, num_parallel:int,
+    sharded:_ShardedResults, results:_ValidationResults):
+    ''' Validate in a pool of workers, reporting each input as soon as its tasks finish '''
+    # Leaving the pool terminates the workers still validating, when stopping at a failure
+    with multiprocessing.Pool(num_parallel) as parallel_pool:
+        for task, result, task_reports in parallel_pool.imap_unordered(
+            run_task, validation_tasks, chunksize=1):
+            if _collect_task_result(task, result, task_reports, sharded, results):
+                break
+
+def _check_option_combinations(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Exit with an error if options that cannot be used together are given '''
+    if args.tee and len(args.path) > 1:
+        print('Error: --tee can only be used when validating a single input', file=sys.stderr)
+        sys.exit(1)
+
+    if args.report and args.checksum_type and not args.tee:
+        print('Error: --report needs --tee to write the checksums of a streamed input to',
+            file=sys.stderr)
+        sys.exit(1)
+
+def _open_cache(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Cache of valid verdicts, or None if caching is not enabled '''
+    if not args.cache_dir and not os.environ.get(CACHE_DIR_VARIABLE):
+        return None
+
+    # pylint: disable=C0415
+    from pipeval.validate.cache import _open_verdict_cache
+    return _open_verdict_cache(args)
+
+def _shared_reference_cache(args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+    file_paths:list):
+    ''' Context populating a CRAM reference cache for the workers, where it is worth it '''
+    # Caching the reference reads and writes all of it, which only pays off once it is shared
+    # by several CRAMs: a single CRAM, even in shards, only loads the sequences it needs
+    num_crams = sum(_detect_file_type_and_extension(path)[0] == 'file-cram' for path in file_paths)
+    if not args.cram_reference or num_crams < 2:
+        return nullcontext()
+
+    # pylint: disable=C0415
+    from pipeval.validate.validators.cram import _cram_reference_cache
+    return _cram_reference_cache(args.cram_reference)
+
+def _print_profile_summary(profile_directory:Path, run_start_time:float):
+    ''' Summarize the profiles written during the run '''
+    summary_path = _summarize_profiles(profile_directory, run_start_time)
+    if summary_path is not None:
+        print(f'Profile summary written to {summary_path}', file=sys.stderr)
+
 def run_validate(args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
     ''' Function to validate file(s)
         `args` must contain the following:
         `path` is a required argument with a value of list of files
         `cram_reference` is a required argument with either a string value or None
+        `path` may include `-` to validate stdin
+        `paired_fastq` is a required argument with either a list of pairs of mate FASTQ
+            paths or None
+        `report` is an optional argument with either a report format, `json` or `jsonl`,
+            to write results to standard output in, or None
+        `profile` is an optional argument with either a directory to write a profile of
+            each input to or None. PIPEVAL_PROFILE is used if it is not given
+        `cache_dir` is an optional argument with either a directory to cache valid verdicts
+            in or None. PIPEVAL_CACHE_DIR is used if it is not given
+        `cache_refresh`, `cache_max_entries` and `cache_max_age` are optional arguments
+            to revalidate cached inputs and to evict cache entries
+        `fail_fast` is an optional argument to stop validating at the first invalid input
     '''
+    _clear_probes()
+    file_paths = [Path(pathname).resolve(strict=True) \
+        for pathname in args.path if pathname != STDIN_PATH]
 
-    num_parallel = min(args.processes, multiprocessing.cpu_count())
+    _check_option_combinations(args)
+    fastq_pairs = [tuple(Path(pathname).resolve(strict=True) for pathname in pair) \
+        for pair in args.paired_fastq] if args.paired_fastq else []
 
-    with multiprocessing.Pool(num_parallel) as parallel_pool:
-        validation_results = parallel_pool.starmap(_validation_worker, \
-            zip([Path(pathname).resolve(strict=True) for pathname in args.path], repeat(args)))
+    verdict_cache = _open_cache(args)
+    cache_keys = {}
+    if verdict_cache is not None:
+        file_paths = _skip_cached_inputs(file_paths, verdict_cache, cache_keys, args)
+        fastq_pairs = _skip_cached_inputs(fastq_pairs, verdict_cache, cache_keys, args)
+
+    # A thread budget is split between concurrent files and threads within each file
+    num_parallel = args.threads if args.threads \
+        else min(args.processes, multiprocessing.cpu_count())
+    file_shards = {path: _file_shards(path, args, num_parallel) for path in file_paths}
+    file_shards = {path: shards for path, shards in file_shards.items() if shards}
+
+    profile_directory = _profile_directory(args)
+    if profile_directory is not None:
+        profile_directory.mkdir(parents=True, exist_ok=True)
+    run_start_time = time.time()
+    run_task = partial(_validation_task, profile_directory=profile_directory)
+
+    # The reference cache is populated once and shared by every worker of the pool
+    with _shared_reference_cache(args, file_paths):
+        results = _ValidationResults(args, verdict_cache, cache_keys)
+        results.emit_reports(_collect_reports())
+        # Pool workers have no access to stdin, so it is validated in this process
+        if STDIN_PATH in args.path:
+            _, stdin_result, stdin_reports = run_task((_validation_worker, STDIN_PATH, args))
+            results.add(STDIN_PATH, stdin_result, stdin_reports)
+
+        task_args = args
+        if not args.threads and num_parallel > 1:
+            # Workers validating at the same time share the CPUs instead of each using all of them
+            task_args = _task_args(args, max(1, _available_cpus() // num_parallel))
+        validation_tasks = _schedule_validation_tasks(file_paths, file_shards, fastq_pairs,
+            task_args, args.threads)
+        if args.fail_fast and not all(results.verdicts):
+            validation_tasks = []
+        if args.threads:
+            num_parallel = _budgeted_pool_size(len(validation_tasks), args.threads)
+
+        _run_validation_tasks(run_task, validation_tasks, num_parallel,
+            _ShardedResults(file_shards), results)
+
+        if args.fail_fast and not all(results.verdicts):
+            _report_unvalidated_inputs(file_paths + fastq_pairs, results.finished_inputs)
+            results.emit_reports(_collect_reports())
+
+    if verdict_cache is not None:
+        verdict_cache.evict(args.cache_max_entries, args.cache_max_age)
+        verdict_cache.close()
+
+    if args.report == 'json':
+        _write_report(args.report, results.reports)
+
+    if profile_directory is not None:
+        _print_profile_summary(profile_directory, run_start_time)
 
-    if not all(validation_results):
+    if not all(results.verdicts):
         sys.exit(1)
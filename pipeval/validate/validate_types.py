@@ -1,7 +1,28 @@
 '''Type definitions for validation functions'''
 from collections import namedtuple
 
+# Currently supported data types
+FILE_TYPES_DICT = {
+    'file-bam': ['.bam'],
+    'file-sam': ['.sam'],
+    'file-cram': ['.cram'],
+    'file-vcf': ['.vcf', '.vcf.gz'],
+    'file-fasta': ['.fasta', '.fa'],
+    'file-fastq':['.fastq', '.fq.gz', '.fq', '.fastq.gz', '.fastq.bz2', '.fq.bz2'],
+    'file-bed': ['.bed', '.bed.gz'],
+    'file-py': ['.py']
+    }
+VCF_ENGINE_NAMES = ['vcftools', 'pysam']
+DEFAULT_VCF_ENGINE = 'vcftools'
+CACHE_DIR_VARIABLE = 'PIPEVAL_CACHE_DIR'
+DEFAULT_CACHE_MAX_ENTRIES = 100000
+
 ValidateArgs = namedtuple(
     'args',
-    'path, cram_reference, unmapped_bam, processes, test_integrity'
+    'path, cram_reference, unmapped_bam, processes, test_integrity, type, tee, checksum_type, '
+    'paired_fastq, quick, quick_records, quick_samples, deep, scan_bgzf, vcf_engine, '
+    'threads, report, profile, cache_dir, cache_refresh, cache_max_entries, cache_max_age, '
+    'fail_fast',
+    defaults=[None, None, None, None, False, 10000, 16, False, False, None, None, None, None,
+        None, False, DEFAULT_CACHE_MAX_ENTRIES, None, False]
 )
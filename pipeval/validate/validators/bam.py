@@ -1,10 +1,18 @@
 '''Helper methods for BAM file validation'''
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Union
+from typing import Dict, List, Optional, Tuple, Union
+import re
 
 import pysam
 
 from pipeval.validate.validate_types import ValidateArgs
+from pipeval.common import _available_cpus
+from pipeval.validate.shards import _region_shards
+
+UNMAPPED_REFERENCE_ID = -1
+UNMAPPED_CONTIG = '*'
+BAM_INDEX_EXTENSIONS = ['.bai', '.csi']
 
 def _validate_bam_file(path:Path, unmapped_bam:bool):
     '''Validates bam file'''
@@ -27,6 +35,144 @@ def _validate_bam_file(path:Path, unmapped_bam:bool):
 
     return True
 
+def _coordinate_sort_key(read:pysam.AlignedSegment):
+    '''Sort key of a read in a coordinate sorted file, with unplaced reads last'''
+    reference_id = read.reference_id
+    if reference_id == UNMAPPED_REFERENCE_ID:
+        return (float('inf'), 0)
+    return (reference_id, read.reference_start)
+
+def _natural_sort_key(read:pysam.AlignedSegment):
+    '''Sort key of a read in a queryname sorted file, comparing runs of digits as numbers'''
+    return [int(part) if index % 2 else part \
+        for index, part in enumerate(re.split(r'(\d+)', read.query_name or ''))]
+
+def _sort_key_function(header:Dict):
+    '''Sort key function for the sort order declared by the @HD SO tag, or None if unsorted'''
+    header_line = header.get('HD', {})
+    sort_order = header_line.get('SO')
+
+    if sort_order == 'coordinate':
+        return _coordinate_sort_key
+    if sort_order == 'queryname':
+        if header_line.get('SS', '').endswith(':lexicographical'):
+            return lambda read: read.query_name or ''
+        return _natural_sort_key
+
+    return None
+
+@contextmanager
+def _keeping_read_errors(alignment_file:pysam.AlignmentFile):
+    '''Close an alignment file once done, without an error on closing hiding one from reading it
+
+        htslib reports a corrupted block again when the file is closed, with
+        an unrelated errno that would replace the error raised on reading it.
+    '''
+    try:
+        yield alignment_file
+    except BaseException:
+        try:
+            alignment_file.close()
+        except OSError:
+            pass
+        raise
+    alignment_file.close()
+
+def _validate_alignment_records(alignment_file:pysam.AlignmentFile, path:Path,
+    shard:Optional[Tuple[str, int, Optional[int]]]=None):
+    '''Validates the records of an open alignment file in order, returning their number
+
+        The records must be in the sort order declared by the @HD SO tag. If
+        `shard` is given as (contig, start, end), only the records starting in
+        that region, or the unplaced reads for `UNMAPPED_CONTIG`, are read
+        through the index.
+    '''
+    sort_key = _sort_key_function(alignment_file.header.to_dict())
+    shard_start = shard[1] if shard is not None and shard[0] != UNMAPPED_CONTIG else None
+
+    num_reads = 0
+    previous_key = None
+    out_of_order_read = None
+    try:
+        if shard is None:
+            records = alignment_file.fetch(until_eof=True)
+        elif shard[0] == UNMAPPED_CONTIG:
+            records = alignment_file.fetch(UNMAPPED_CONTIG)
+        else:
+            records = alignment_file.fetch(*shard)
+        for read in records:
+            # Reads overlapping the start of the region belong to the previous region
+            if shard_start is not None and read.reference_start < shard_start:
+                continue
+
+            num_reads += 1
+            if sort_key is None:
+                continue
+
+            read_key = sort_key(read)
+            if previous_key is not None and read_key < previous_key:
+                out_of_order_read = read.query_name
+                break
+            previous_key = read_key
+    except (OSError, ValueError) as err:
+        raise ValueError(f'pysam deep check failed at record {num_reads + 1} of '
+            f'{str(path)}. {str(err)}') from err
+
+    if out_of_order_read is not None:
+        raise ValueError(f'pysam deep check failed. Record {num_reads} `{out_of_order_read}` of '
+            f'{str(path)} is out of order for sort order '
+            f'`{alignment_file.header.to_dict()["HD"]["SO"]}`')
+
+    return num_reads
+
+def _deep_validate_bam_file(path:Path, unmapped_bam:bool, threads:Optional[int]=None):
+    '''Validates every record of the bam file, streaming them with htslib decompression threads
+
+        The records must be in the sort order declared by the @HD SO tag and,
+        if the file is indexed, match the read count of the index.
+    '''
+    try:
+        with _keeping_read_errors(pysam.AlignmentFile(str(path), 'rb',
+            check_sq=not unmapped_bam, threads=threads if threads else _available_cpus())) as bam:
+            num_reads = _validate_alignment_records(bam, path)
+            indexed_reads = _indexed_read_count(bam)
+    except OSError as err:
+        raise ValueError(f'pysam bam deep check failed for {str(path)}. {str(err)}') from err
+
+    _check_read_count(path, num_reads, indexed_reads)
+
+    return True
+
+def _check_read_count(path:Path, num_reads:int, indexed_reads:Optional[int]):
+    '''Checks that the bam file has reads, as many as its index counts if it is indexed'''
+    if num_reads == 0:
+        raise ValueError("pysam bam check failed. No reads in " + str(path))
+
+    if indexed_reads is not None and indexed_reads != num_reads:
+        raise ValueError(f'pysam bam deep check failed. {str(path)} has {num_reads} reads '
+            f'but its index counts {indexed_reads}')
+
+def _indexed_read_count(bam:pysam.AlignmentFile):
+    '''Total read count from the index of the bam file, or None if it has no index'''
+    if not bam.has_index():
+        return None
+
+    return sum(statistics.total for statistics in bam.get_index_statistics()) + bam.nocoordinate
+
+def _alignment_shards(alignment_file:pysam.AlignmentFile, num_processes:int):
+    '''Reference regions to validate an indexed alignment file across in parallel,
+        followed by its unplaced reads
+
+        References without reads are left out when the index has read counts.
+    '''
+    read_counts = {statistics.contig: statistics.total \
+        for statistics in alignment_file.get_index_statistics()}
+    contigs = [(contig, length) for contig, length \
+        in zip(alignment_file.references, alignment_file.lengths) \
+        if read_counts.get(contig) or not any(read_counts.values())]
+
+    return _region_shards(contigs, num_processes) + [(UNMAPPED_CONTIG, 0, None)]
+
 def _check_bam_index(path:Path):
     '''Checks if index file is present and can be opened'''
     try:
@@ -42,6 +188,42 @@ def _check_bam(path:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
     ''' Validation for BAMs
     `args` must contains the following:
         `cram_reference` is a required key with either a string value or None
+        `deep` is an optional boolean key to validate every record of the file
+        `threads` is an optional key with the number of threads to decompress the file with
     '''
     _validate_bam_file(path, args.unmapped_bam)
+    if args.deep:
+        _deep_validate_bam_file(path, args.unmapped_bam, args.threads)
     _check_bam_index(path)
+
+def _has_index_file(path:Path, index_extensions:List[str]):
+    '''Checks for an index file named after the file, or in place of its extension'''
+    return any(Path(f'{path}{extension}').exists() or Path(path).with_suffix(extension).exists() \
+        for extension in index_extensions)
+
+def _shard_bam(path:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]], num_processes:int):
+    ''' Shards to deep validate an indexed BAM across, or none to validate it as a whole '''
+    # Looking for the index first spares opening files that cannot be sharded anyway
+    if not args.deep or not _has_index_file(path, BAM_INDEX_EXTENSIONS):
+        return []
+
+    with pysam.AlignmentFile(str(path), check_sq=not args.unmapped_bam) as bam:
+        if not bam.has_index():
+            return []
+        return _alignment_shards(bam, num_processes)
+
+def _check_bam_shard(path:Path, shard:Tuple[str, int, Optional[int]],
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Deep validation of the reads starting in one region of a BAM, returning their number '''
+    with _keeping_read_errors(pysam.AlignmentFile(str(path),
+        check_sq=not args.unmapped_bam)) as bam:
+        return _validate_alignment_records(bam, path, shard)
+
+def _merge_bam_shards(path:Path, shard_read_counts:List[int],
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    ''' Whole-file checks of a BAM validated in shards, cross-checking the read count of
+        the shards against the index
+    '''
+    _validate_bam_file(path, args.unmapped_bam)
+    with pysam.AlignmentFile(str(path), check_sq=not args.unmapped_bam) as bam:
+        _check_read_count(path, sum(shard_read_counts), _indexed_read_count(bam))
@@ -1,34 +1,114 @@
 '''Helper methods for CRAM file validation'''
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, Union, Optional
+from typing import Dict, List, Optional, Tuple, Union
+import hashlib
+import os
+import sys
+import tempfile
 
 import pysam
 
 from pipeval.validate.validate_types import ValidateArgs
+from pipeval.validate.validators.bam import (
+    _alignment_shards,
+    _has_index_file,
+    _keeping_read_errors,
+    _validate_alignment_records
+)
 
-def _validate_cram_file(path:Path, reference:str=None):
-    '''Validates cram file'''
+REFERENCE_CACHE_VARIABLE = 'PIPEVAL_REF_CACHE'
+REFERENCE_CACHE_FORMAT = '%2s/%2s/%s'
+CRAM_INDEX_EXTENSIONS = ['.crai']
+
+def _reference_cache_path(cache_dir:Path, md5:str):
+    '''Path of a sequence in an htslib reference cache, following `REFERENCE_CACHE_FORMAT`'''
+    return cache_dir / md5[:2] / md5[2:4] / md5[4:]
+
+def _populate_reference_cache(reference:Path, cache_dir:Path):
+    '''Write every sequence of the reference FASTA to the cache, named by its @SQ M5 tag MD5'''
+    with pysam.FastxFile(str(reference)) as fasta:
+        for entry in fasta:
+            sequence = entry.sequence.upper().encode()
+            cache_path = _reference_cache_path(cache_dir, hashlib.md5(sequence).hexdigest())
+            if not cache_path.exists():
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                cache_path.write_bytes(sequence)
+
+@contextmanager
+def _cram_reference_cache(reference:Optional[str]):
+    '''Serve CRAM references from a local cache populated from the reference FASTA
+
+        htslib looks references up by the MD5 in the @SQ M5 tags through
+        REF_PATH and memory-maps sequences found in the cache, so every worker
+        shares one warm copy of the reference and none is fetched over the
+        network.
+    '''
+    if not reference:
+        yield
+        return
+
+    with tempfile.TemporaryDirectory(prefix='pipeval_ref_cache_') as cache_dir:
+        _populate_reference_cache(Path(reference), Path(cache_dir))
+        cache_variables = {
+            'REF_PATH': os.path.join(cache_dir, REFERENCE_CACHE_FORMAT),
+            'REF_CACHE': os.path.join(cache_dir, REFERENCE_CACHE_FORMAT),
+            REFERENCE_CACHE_VARIABLE: cache_dir
+        }
+        original_variables = {name: os.environ.get(name) for name in cache_variables}
+        os.environ.update(cache_variables)
+        try:
+            yield
+        finally:
+            for name, value in original_variables.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+
+def _open_cram(path:Path, reference:str=None, threads:int=1):
+    '''Opens cram file, decoding it from the reference cache if every @SQ M5 sequence is cached'''
+    reference_cache = os.environ.get(REFERENCE_CACHE_VARIABLE)
+    if reference and reference_cache:
+        cram = pysam.AlignmentFile(str(path), threads=threads)
+        reference_md5s = [sequence.get('M5') for sequence in cram.header.to_dict().get('SQ', [])]
+        if all(md5 and _reference_cache_path(Path(reference_cache), md5).exists() \
+            for md5 in reference_md5s):
+            return cram
+        cram.close()
+
+    if reference:
+        return pysam.AlignmentFile(str(path), reference_filename=reference, threads=threads)
+
+    return pysam.AlignmentFile(str(path), threads=threads)
+
+def _quickcheck_cram(path:Path):
+    '''Runs samtools quickcheck on cram file'''
     try:
         pysam.quickcheck(str(path))
     except pysam.SamtoolsError as err:
         raise ValueError("samtools cram check failed. " + str(err)) from err
 
+def _validate_cram_file(path:Path, reference:str=None, cram:Optional[pysam.AlignmentFile]=None):
+    '''Validates cram file, reading from `cram` if it was already opened after a quickcheck'''
+    if cram is None:
+        _quickcheck_cram(path)
+        cram = _open_cram(path, reference)
+
     if not reference:
         print(f'No reference specified for {str(path)}, ' \
-            'pysam will automatically check CRAM header for reference URL')
-        cram_head: pysam.IteratorRowHead = pysam.AlignmentFile(str(path)).head(1)
-    else:
-        cram_head: pysam.IteratorRowHead = pysam.AlignmentFile(
-            str(path), reference_filename=reference).head(1)
+            'pysam will automatically check CRAM header for reference URL', file=sys.stderr)
+
+    cram_head: pysam.IteratorRowHead = cram.head(1)
     if next(cram_head, None) is None:
         raise ValueError("pysam cram check failed. No reads in " + str(path))
 
     return True
 
-def _check_cram_index(path:Path):
-    '''Checks if index file is present and can be opened'''
+def _check_cram_index(path:Path, cram:Optional[pysam.AlignmentFile]=None):
+    '''Checks if index file is present and can be opened, reading from `cram` if already open'''
     try:
-        pysam.AlignmentFile(str(path)).check_index()
+        (pysam.AlignmentFile(str(path)) if cram is None else cram).check_index()
     except ValueError as err:
         raise FileNotFoundError(f'pysam cram index check failed. Index file for {str(path)}'\
             'could not be opened or does not exist.') from err
@@ -39,6 +119,40 @@ def _check_cram(path:Path, args:Union[ValidateArgs,Dict[str, Optional[str]]]):
     ''' Validation for CRAMs
         `args` must contains the following:
         `cram_reference` is a required key with either a string value or None
+        `deep` is an optional boolean key to validate every record of the file
+        `threads` is an optional key with the number of threads to decode the file with
+    '''
+    _quickcheck_cram(path)
+    with _keeping_read_errors(_open_cram(path, args.cram_reference,
+        args.threads if args.threads else 1)) as cram:
+        _validate_cram_file(path, args.cram_reference, cram)
+        if args.deep:
+            _validate_alignment_records(cram, path)
+        _check_cram_index(path, cram)
+
+def _shard_cram(path:Path, args:Union[ValidateArgs,Dict[str, Optional[str]]], num_processes:int):
+    ''' Shards to deep validate an indexed CRAM across, or none to validate it as a whole '''
+    if not args.deep or not _has_index_file(path, CRAM_INDEX_EXTENSIONS):
+        return []
+
+    with _open_cram(path, args.cram_reference) as cram:
+        if not cram.has_index():
+            return []
+        return _alignment_shards(cram, num_processes)
+
+def _check_cram_shard(path:Path, shard:Tuple[str, int, Optional[int]],
+    args:Union[ValidateArgs,Dict[str, Optional[str]]]):
+    ''' Deep validation of the reads starting in one region of a CRAM, returning their number '''
+    with _keeping_read_errors(_open_cram(path, args.cram_reference)) as cram:
+        return _validate_alignment_records(cram, path, shard)
+
+# pylint: disable=W0613
+def _merge_cram_shards(path:Path, shard_read_counts:List[int],
+    args:Union[ValidateArgs,Dict[str, Optional[str]]]):
+    ''' Whole-file checks of a CRAM validated in shards
+
+        CRAM indexes hold no read counts to cross-check the shards against.
     '''
-    _validate_cram_file(path, args.cram_reference)
-    _check_cram_index(path)
+    _quickcheck_cram(path)
+    if sum(shard_read_counts) == 0:
+        raise ValueError("pysam cram check failed. No reads in " + str(path))
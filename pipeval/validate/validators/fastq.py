@@ -1,16 +1,24 @@
 # pylint: disable=C0103
 '''Helper methods for FASTQ file validation'''
 from pathlib import Path
-from typing import Dict, Union, ClassVar
+from typing import BinaryIO, Callable, Dict, List, Optional, Union, ClassVar
 from dataclasses import dataclass
+import io
+import os
+import queue
+import random
 import re
+import threading
 import gzip
 import bz2
-import magic
 
 from pipeval.validate.validate_types import ValidateArgs
+from pipeval.validate.files import _compression_errors
+from pipeval.validate.bgzf import _find_bgzf_block, _inflate_bgzf_from, BGZF_EOF
+from pipeval.validate.probe import _probe_file
 
 RECORD_LENGTH = 4
+SAMPLE_WINDOW_SIZE = 1024 * 1024 # 1 MB of records around each sampled offset
 
 @dataclass
 class FASTQ_RECORD:
@@ -74,13 +82,70 @@ class FASTQ_RECORD_VALIDATOR:
             record_errors = '\n'.join(invalid_entries)
             raise ValueError(f'Record {record} is invalid: {record_errors}')
 
+@dataclass
+class FASTQ_BLOCK_VALIDATOR:
+    ''' Block-oriented FASTQ validator working on raw bytes
+
+        Checks whole blocks of records at once through byte lookup tables and
+        only falls back to `FASTQ_RECORD_VALIDATOR` to build the per-record
+        error once a block is found to be invalid.
+    '''
+    block_size: ClassVar[int] = 4 * 1024 * 1024 # 4 MB blocks
+    sequence_bytes: ClassVar[bytes] = b'ACTGNactgn'
+    quality_bytes: ClassVar[bytes] = bytes(range(
+        FASTQ_RECORD_VALIDATOR.minimum_quality_ordinal,
+        FASTQ_RECORD_VALIDATOR.maximum_quality_ordinal + 1
+    ))
+
+    @staticmethod
+    def is_valid_block(lines:List[bytes]):
+        '''Check whether every record in the given lines is valid'''
+        identifiers = b'\n' + b'\n'.join(lines[0::RECORD_LENGTH])
+        sequences = lines[1::RECORD_LENGTH]
+        extra_fields = b'\n' + b'\n'.join(lines[2::RECORD_LENGTH])
+        qualities = lines[3::RECORD_LENGTH]
+        num_records = len(sequences)
+
+        sequence_lengths = list(map(len, sequences))
+
+        return identifiers.isascii() and extra_fields.isascii() \
+            and identifiers.count(b'\n@') == num_records \
+            and extra_fields.count(b'\n+') == num_records \
+            and 0 not in sequence_lengths \
+            and sequence_lengths == list(map(len, qualities)) \
+            and not b''.join(sequences).translate(None, FASTQ_BLOCK_VALIDATOR.sequence_bytes) \
+            and not b''.join(qualities).translate(None, FASTQ_BLOCK_VALIDATOR.quality_bytes)
+
+    @staticmethod
+    def validate_block(lines:List[bytes]):
+        '''Validate the records in the given lines, a multiple of `RECORD_LENGTH` long'''
+        if FASTQ_BLOCK_VALIDATOR.is_valid_block(lines):
+            return
+
+        for record_start in range(0, len(lines), RECORD_LENGTH):
+            record_lines = [line.decode().strip()
+                for line in lines[record_start:record_start + RECORD_LENGTH]]
+            record = FASTQ_RECORD(
+                identifier = record_lines[0],
+                sequence = record_lines[1],
+                extra_field = record_lines[2],
+                quality = record_lines[3]
+            )
+            FASTQ_RECORD_VALIDATOR.validate_record(record)
+
 # pylint: disable=R0903
 class FASTQ():
     ''' FASTQ file handling and validation class '''
-    def __init__(self, fastq_file:Path):
-        '''Constructor'''
+    def __init__(self, fastq_file:Path, file_handler:Optional[Callable]=None,
+        block_callback:Optional[Callable[[List[bytes]], None]]=None):
+        '''Constructor
+
+            `file_handler` skips format detection when the handler is already known.
+            `block_callback` is called with the lines of every validated block of records.
+        '''
         self._fastq_path = fastq_file
-        self._file_handler = self._get_file_handler()
+        self._file_handler = self._get_file_handler() if file_handler is None else file_handler
+        self._block_callback = block_callback
 
     def _get_file_handler(self):
         '''Detect file format and return approriate handler to read file'''
@@ -91,7 +156,7 @@ class FASTQ():
             'text/plain': open
         }
 
-        file_mime = magic.from_file(self._fastq_path.resolve(), mime=True)
+        file_mime = _probe_file(self._fastq_path).mime
 
         handler = _handler_map.get(file_mime, None)
 
@@ -102,30 +167,273 @@ class FASTQ():
 
     def validate_fastq(self):
         ''' Validate the FASTQ file '''
-        with self._file_handler(self._fastq_path, 'rt') as rd:
-            current_record = []
-            current_record_length = 0
-            for line in rd:
-                current_record.append(line.strip())
-                current_record_length = current_record_length + 1
-
-                if current_record_length == RECORD_LENGTH:
-                    record = FASTQ_RECORD(
-                        identifier = current_record[0],
-                        sequence = current_record[1],
-                        extra_field = current_record[2],
-                        quality = current_record[3]
-                    )
-                    FASTQ_RECORD_VALIDATOR.validate_record(record)
-                    current_record = []
-                    current_record_length = 0
-
-        if current_record_length != 0:
+        with self._file_handler(self._fastq_path, 'rb') as rd:
+            self._validate_blocks(rd)
+
+    def validate_stream(self, stream:BinaryIO):
+        ''' Validate the FASTQ file from an already open binary stream of its raw bytes '''
+        with _compression_errors():
+            if self._file_handler is open:
+                self._validate_blocks(stream)
+            else:
+                with self._file_handler(stream, 'rb') as rd:
+                    self._validate_blocks(rd)
+
+    def validate_sampled(self, num_records:int, num_samples:int):
+        ''' Validate the first `num_records` records, the records before the end of the file
+            and the records around `num_samples` random offsets
+
+            Returns False without validating anything if the file cannot be read
+            from random offsets, which needs it to be uncompressed or BGZF.
+        '''
+        if self._file_handler is open:
+            read_window = FASTQ._read_text_window
+        elif self._file_handler is gzip.open and _probe_file(self._fastq_path).is_bgzf:
+            read_window = FASTQ._read_bgzf_window
+        else:
+            return False
+
+        with _compression_errors():
+            if self._validate_head(num_records):
+                return True
+
+            with open(self._fastq_path, 'rb') as rd:
+                file_size = os.fstat(rd.fileno()).st_size
+                if read_window is FASTQ._read_bgzf_window:
+                    rd.seek(max(file_size - len(BGZF_EOF), 0))
+                    if rd.read() != BGZF_EOF:
+                        raise ValueError(f'FASTQ check failed. FASTQ file `{self._fastq_path}` '
+                            'is missing the BGZF end-of-file marker. The file may be truncated.')
+
+                self._validate_tail(
+                    read_window(rd, max(file_size - SAMPLE_WINDOW_SIZE, 0), file_size))
+
+                for offset in sorted(random.sample(range(file_size), min(num_samples, file_size))):
+                    self._validate_sample(
+                        read_window(rd, offset, file_size, SAMPLE_WINDOW_SIZE), offset)
+
+        return True
+
+    @staticmethod
+    def _read_text_window(rd:BinaryIO, offset:int, file_size:int, size:Optional[int]=None):
+        ''' Read `size` bytes, or up to the end of the file, from an offset of a plain file '''
+        rd.seek(offset)
+        return rd.read(file_size - offset if size is None else size)
+
+    @staticmethod
+    def _read_bgzf_window(rd:BinaryIO, offset:int, file_size:int, size:Optional[int]=None):
+        ''' Inflate `size` bytes, or up to the end of the file, from the first BGZF block
+            at or after an offset
+        '''
+        block_offset = _find_bgzf_block(rd, offset, file_size)
+        return b'' if block_offset is None else _inflate_bgzf_from(rd, block_offset, size)
+
+    @staticmethod
+    def _record_boundary(lines:List[bytes]):
+        ''' Index of the first line of the first complete record in the lines, or None
+
+            A quality line may start with '@', but is then followed two lines
+            later by a sequence rather than a '+' line.
+        '''
+        for start in range(min(RECORD_LENGTH, len(lines) - RECORD_LENGTH + 1)):
+            if lines[start][:1] == b'@' and lines[start + 2][:1] == b'+' \
+                and len(lines[start + 1]) == len(lines[start + 3]):
+                return start
+
+        return None
+
+    def _validate_head(self, num_records:int):
+        ''' Validate the first records of the file, returning whether the whole file was read '''
+        chunks = []
+        num_lines = 0
+        with self._file_handler(self._fastq_path, 'rb') as rd:
+            while num_lines < num_records * RECORD_LENGTH:
+                chunk = rd.read(SAMPLE_WINDOW_SIZE)
+                if chunk == b'':
+                    self._validate_blocks(io.BytesIO(b''.join(chunks)))
+                    return True
+                chunks.append(chunk)
+                num_lines += chunk.count(b'\n')
+
+        self._validate_block(b''.join(chunks).split(b'\n')[:num_records * RECORD_LENGTH])
+        return False
+
+    def _validate_tail(self, data:bytes):
+        ''' Validate the records in data read up to the end of the file '''
+        # The first line may have been cut
+        lines = data.split(b'\n')[1:]
+        if lines and lines[-1] == b'':
+            lines.pop()
+
+        start = FASTQ._record_boundary(lines)
+        if start is None or (len(lines) - start) % RECORD_LENGTH:
+            raise ValueError(f'FASTQ check failed. FASTQ file `{self._fastq_path}` '
+                'does not end with a complete record. The file may be truncated or corrupted.')
+
+        self._validate_block(lines[start:])
+
+    def _validate_sample(self, data:bytes, offset:int):
+        ''' Validate the complete records in data read from an offset of the file '''
+        # The first and last lines may have been cut
+        lines = data.split(b'\n')[1:-1]
+        if len(lines) < 2 * RECORD_LENGTH:
+            # Too close to the end of the file, which is validated separately
+            return
+
+        start = FASTQ._record_boundary(lines)
+        if start is None:
+            raise ValueError(f'FASTQ check failed. No FASTQ record found near offset {offset} '
+                f'of `{self._fastq_path}`. The file may be corrupted.')
+
+        num_lines = len(lines) - start
+        self._validate_block(lines[start:start + num_lines - num_lines % RECORD_LENGTH])
+
+    def _validate_block(self, lines:List[bytes]):
+        ''' Validate a block of records and pass it on to the block callback '''
+        FASTQ_BLOCK_VALIDATOR.validate_block(lines)
+        if self._block_callback is not None:
+            self._block_callback(lines)
+
+    def _validate_blocks(self, rd:BinaryIO):
+        ''' Validate every record in the binary stream of the FASTQ file, block by block '''
+        partial_lines = b''
+        for block in iter(lambda: rd.read(FASTQ_BLOCK_VALIDATOR.block_size), b''):
+            lines = (partial_lines + block).split(b'\n')
+            # The last line may be continued in the next block
+            complete_lines = (len(lines) - 1) - (len(lines) - 1) % RECORD_LENGTH
+            self._validate_block(lines[:complete_lines])
+            partial_lines = b'\n'.join(lines[complete_lines:])
+
+        remaining_lines = partial_lines.split(b'\n') if partial_lines else []
+        if remaining_lines and remaining_lines[-1] == b'':
+            remaining_lines.pop()
+
+        complete_lines = len(remaining_lines) - len(remaining_lines) % RECORD_LENGTH
+        self._validate_block(remaining_lines[:complete_lines])
+
+        if complete_lines != len(remaining_lines):
             raise ValueError(f'FASTQ check failed. FASTQ file `{self._fastq_path}` '
                 'contains invalid number of lines. The file may be truncated or corrupted.')
 
+class FASTQ_PAIRING_STOPPED(Exception):
+    ''' Raised in a mate's reader once pairing has already failed '''
+
+class FASTQ_PAIR():
+    ''' Lockstep pairing check of the records of two mate FASTQ files
+
+        Each mate is read on its own thread and passes the read names of its
+        validated blocks through a bounded queue, so neither file is held in
+        memory while the names are compared in order.
+    '''
+    queue_size: ClassVar[int] = 8
+    mate_suffixes: ClassVar[tuple] = (b'/1', b'/2')
+
+    def __init__(self, r1_path:Path, r2_path:Path):
+        '''Constructor'''
+        self._paths = (r1_path, r2_path)
+        self._name_queues = (queue.Queue(self.queue_size), queue.Queue(self.queue_size))
+        self._stopped = threading.Event()
+
+    @staticmethod
+    def read_names(lines:List[bytes]):
+        '''Read names of the records in the lines, without any /1 or /2 mate suffix'''
+        names = [(identifier[1:].split(None, 1) or [b''])[0]
+            for identifier in lines[0::RECORD_LENGTH]]
+        return [name[:-2] if name[-2:] in FASTQ_PAIR.mate_suffixes else name for name in names]
+
+    def _put(self, mate:int, names:Optional[List[bytes]]):
+        '''Queue names for the comparison, giving up once pairing has failed'''
+        while not self._stopped.is_set():
+            try:
+                self._name_queues[mate].put(names, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+        raise FASTQ_PAIRING_STOPPED()
+
+    def block_callback(self, mate:int):
+        '''Block callback for the reader of one mate'''
+        return lambda lines: self._put(mate, FASTQ_PAIR.read_names(lines))
+
+    def finish(self, mate:int):
+        '''Mark the end of the records of one mate'''
+        try:
+            self._put(mate, None)
+        except FASTQ_PAIRING_STOPPED:
+            pass
+
+    def stop(self):
+        '''Stop the readers of both mates'''
+        self._stopped.set()
+
+    def check_pairing(self):
+        '''Compare read names of both mates in lockstep until both are finished'''
+        try:
+            self._check_pairing()
+        finally:
+            self.stop()
+
+    def _check_names_match(self, r1_names:list, r2_names:list, num_paired:int):
+        if r1_names != r2_names:
+            mismatch = next(index for index, (r1_name, r2_name) \
+                in enumerate(zip(r1_names, r2_names)) if r1_name != r2_name)
+            record_number = num_paired + mismatch + 1
+            raise ValueError(f'Paired FASTQ check failed. Record {record_number} of '
+                f'`{self._paths[0]}` is `{r1_names[mismatch].decode(errors="replace")}` '
+                f'but record {record_number} of `{self._paths[1]}` is '
+                f'`{r2_names[mismatch].decode(errors="replace")}`.')
+
+    def _check_pairing(self):
+        pending = [[], []]
+        offsets = [0, 0]
+        finished = [False, False]
+        num_paired = 0
+
+        while True:
+            for mate in (0, 1):
+                if offsets[mate] == len(pending[mate]) and not finished[mate]:
+                    names = self._name_queues[mate].get()
+                    finished[mate] = names is None
+                    pending[mate] = [] if names is None else names
+                    offsets[mate] = 0
+
+            r1_left = len(pending[0]) - offsets[0]
+            r2_left = len(pending[1]) - offsets[1]
+
+            if r1_left and r2_left:
+                num_names = min(r1_left, r2_left)
+                r1_names = pending[0][offsets[0]:offsets[0] + num_names]
+                r2_names = pending[1][offsets[1]:offsets[1] + num_names]
+                self._check_names_match(r1_names, r2_names, num_paired)
+                offsets[0] += num_names
+                offsets[1] += num_names
+                num_paired += num_names
+            elif finished[0] and finished[1]:
+                return
+            elif finished[0] and r2_left or finished[1] and r1_left:
+                shorter, longer = (0, 1) if finished[0] else (1, 0)
+                raise ValueError(f'Paired FASTQ check failed. `{self._paths[shorter]}` has '
+                    f'{num_paired} records but `{self._paths[longer]}` has more.')
+
 # pylint: disable=W0613
 def _check_fastq(path:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
     '''Validation for FASTQs'''
     fastq = FASTQ(path)
     fastq.validate_fastq()
+
+def _check_fastq_sampled(path:Path, args:Union[ValidateArgs,Dict[str, Union[str,list]]]):
+    '''Sampled validation for FASTQs, returning False if the file cannot be sampled'''
+    fastq = FASTQ(path)
+    return fastq.validate_sampled(args.quick_records, args.quick_samples)
+
+# pylint: disable=W0613
+def _check_fastq_stream(
+    path:Path,
+    stream:BinaryIO,
+    args:Union[ValidateArgs,Dict[str, Union[str,list]]],
+    file_handler:Optional[Callable]=None,
+    block_callback:Optional[Callable[[List[bytes]], None]]=None):
+    '''Validation for FASTQs read from a shared stream of the file'''
+    fastq = FASTQ(path, file_handler, block_callback)
+    fastq.validate_stream(stream)
@@ -1,22 +1,292 @@
 '''Helper methods for vcf file validation'''
 
 from pathlib import Path
+from collections import namedtuple
+from typing import List, Optional, Tuple
 import argparse
+import re
+import sys
 
 import subprocess
+import pysam
+
+from pipeval.common import _available_cpus
+from pipeval.validate.validate_types import DEFAULT_VCF_ENGINE
+from pipeval.validate.shards import _region_shards
+
+VCF_INDEX_EXTENSIONS = ['.tbi', '.csi']
+VCF_FIXED_COLUMNS = 8 # CHROM to INFO, followed by FORMAT and the samples
+VCF_REF_FORMAT = re.compile('^[ACGTNacgtn]+$')
+VCF_ALT_FORMAT = re.compile(
+    r'^(?:[ACGTNacgtn]+|\*|<[^<>]+>'            # bases, overlapping deletion, symbolic
+    r'|[ACGTNacgtn]*[\[\]][^\[\]]+[\[\]][ACGTNacgtn]*' # breakend
+    r'|\.[ACGTNacgtn]+|[ACGTNacgtn]+\.)$'       # single breakend
+)
+VCF_MISSING_VALUE = '.'
+VCF_GENOTYPE_SEPARATOR = re.compile('[/|]')
+VCF_VALUE_FORMATS = {
+    'Integer': r'[-+]?[0-9]+',
+    'Float': r'[-+]?(?:(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?'
+        r'|[Ii]nf(?:inity)?|INF(?:INITY)?|[Nn]a[Nn])',
+    'Character': r'.'
+}
+# Comma-separated lists of values of each type, any of which may be missing
+VCF_VALUE_LIST_FORMATS = {
+    value_type: re.compile(rf'^(?:{value_format}|\.)(?:,(?:{value_format}|\.))*$') \
+        for value_type, value_format in VCF_VALUE_FORMATS.items()
+}
+
+# Header definitions of the fields and samples that records are checked against
+VcfDefinitions = namedtuple('VcfDefinitions', 'info, formats, filters, num_samples')
 
 def _validate_vcf_file(path):
     '''Validate vcf file'''
     vcf_command = "vcf-validator " + str(path)
 
     try:
-        subprocess.check_call(vcf_command, shell=True)
+        # vcf-validator reports on stdout, which is reserved for --report output
+        subprocess.check_call(vcf_command, shell=True, stdout=sys.stderr)
     except subprocess.CalledProcessError as err:
         raise ValueError("vcftools validation check failed. " + str(err)) from err
 
     return True
 
+def _expected_value_count(number, num_alts:int, ploidy:Optional[int]=None):
+    '''Number of values a field with the given header Number must have, or None if it varies
+
+        Number=G depends on the `ploidy` of the sample, and is not checked without one.
+    '''
+    if number == 'A':
+        return num_alts
+    if number == 'R':
+        return num_alts + 1
+    if number == 'G':
+        if ploidy is None:
+            return None
+        # Genotypes are the multisets of `ploidy` alleles, (num_alts + ploidy choose ploidy)
+        num_genotypes = 1
+        for allele in range(1, ploidy + 1):
+            num_genotypes = num_genotypes * (num_alts + allele) // allele
+        return num_genotypes
+    if isinstance(number, int):
+        return number
+    return None
+
+def _check_vcf_values(field:str, key:str, raw_value:str, definition:Tuple,
+    expected_count:Optional[int]):
+    '''Check the raw values of an INFO or FORMAT field against its header Number and Type'''
+    number, value_type = definition
+    if raw_value == VCF_MISSING_VALUE:
+        return
+
+    num_values = raw_value.count(',') + 1
+    if expected_count is not None and num_values != expected_count:
+        raise ValueError(f'{field} field `{key}` has {num_values} values but Number={number} '
+            f'requires {expected_count}')
+
+    value_list_format = VCF_VALUE_LIST_FORMATS.get(value_type)
+    if value_list_format is not None and not value_list_format.match(raw_value):
+        value_format = re.compile(f'^(?:{VCF_VALUE_FORMATS[value_type]}|\\.)$')
+        value = next(value for value in raw_value.split(',') if not value_format.match(value))
+        raise ValueError(f'{field} field `{key}` value `{value}` is not of Type={value_type}')
+
+def _vcf_definitions(path:Path):
+    '''Definitions of the INFO, FORMAT and FILTER fields and the samples of a vcf header'''
+    with pysam.VariantFile(str(path)) as vcf:
+        return VcfDefinitions(
+            info={key: (definition.number, definition.type) \
+                for key, definition in vcf.header.info.items()},
+            formats={key: (definition.number, definition.type) \
+                for key, definition in vcf.header.formats.items()},
+            filters=set(vcf.header.filters) | {'PASS'},
+            num_samples=len(vcf.header.samples)
+        )
+
+def _check_vcf_alleles(ref:str, alt:str):
+    '''Check the REF and ALT alleles of a record, returning the number of ALT alleles'''
+    if not VCF_REF_FORMAT.match(ref):
+        raise ValueError(f'REF `{ref}` is invalid')
+    if alt == VCF_MISSING_VALUE:
+        return 0
+
+    alts = alt.split(',')
+    for allele in alts:
+        if not VCF_ALT_FORMAT.match(allele):
+            raise ValueError(f'ALT `{allele}` is invalid')
+
+    return len(alts)
+
+def _check_vcf_info(info:str, definitions:VcfDefinitions, num_alts:int):
+    '''Check that the INFO fields of a record are defined and match their definition'''
+    if info == VCF_MISSING_VALUE:
+        return
+
+    for entry in info.split(';'):
+        key, has_value, raw_value = entry.partition('=')
+        if key not in definitions.info:
+            raise ValueError(f'INFO field `{key}` is not defined in the header')
+
+        number, value_type = definitions.info[key]
+        if value_type == 'Flag':
+            if has_value:
+                raise ValueError(f'INFO flag `{key}` has a value')
+        elif not has_value:
+            raise ValueError(f'INFO field `{key}` has no value')
+        else:
+            _check_vcf_values('INFO', key, raw_value, definitions.info[key],
+                _expected_value_count(number, num_alts))
+
+def _check_vcf_samples(format_keys:str, samples:List[str], definitions:VcfDefinitions,
+    num_alts:int):
+    '''Check that the FORMAT fields of a record are defined and the samples match them'''
+    keys = format_keys.split(':')
+    for key in keys:
+        if key not in definitions.formats:
+            raise ValueError(f'FORMAT field `{key}` is not defined in the header')
+
+    for sample in samples:
+        sample_values = sample.split(':')
+        if len(sample_values) > len(keys):
+            raise ValueError(f'Sample `{sample}` has more values than FORMAT `{format_keys}`')
+
+        ploidy = None
+        if keys[0] == 'GT' and sample_values[0] != VCF_MISSING_VALUE:
+            ploidy = len(VCF_GENOTYPE_SEPARATOR.split(sample_values[0]))
+        for key, raw_value in zip(keys, sample_values):
+            if key != 'GT':
+                _check_vcf_values('FORMAT', key, raw_value, definitions.formats[key],
+                    _expected_value_count(definitions.formats[key][0], num_alts, ploidy))
+
+def _check_vcf_line(line:str, definitions:VcfDefinitions):
+    '''Check one raw record line against the header, returning its contig and position
+
+        Values are checked on the raw text, as htslib reads those it cannot
+        parse as missing.
+    '''
+    fields = line.rstrip('\r\n').split('\t')
+    if len(fields) < VCF_FIXED_COLUMNS:
+        raise ValueError(f'Record has {len(fields)} columns instead of at least '
+            f'{VCF_FIXED_COLUMNS}')
+    chrom, pos, _, ref, alt, _, filters, info = fields[:VCF_FIXED_COLUMNS]
+    if not pos.isdigit():
+        raise ValueError(f'POS `{pos}` of record on `{chrom}` is not a position')
+
+    try:
+        if len(fields) > VCF_FIXED_COLUMNS \
+            and len(fields) != VCF_FIXED_COLUMNS + 1 + definitions.num_samples:
+            raise ValueError(f'Record has {len(fields)} columns but the header has '
+                f'{definitions.num_samples} samples')
+        num_alts = _check_vcf_alleles(ref, alt)
+        for filter_key in filters.split(';'):
+            if filter_key not in definitions.filters and filter_key != VCF_MISSING_VALUE:
+                raise ValueError(f'FILTER `{filter_key}` is not defined in the header')
+        _check_vcf_info(info, definitions, num_alts)
+        if len(fields) > VCF_FIXED_COLUMNS:
+            _check_vcf_samples(fields[VCF_FIXED_COLUMNS], fields[VCF_FIXED_COLUMNS + 1:],
+                definitions, num_alts)
+    except ValueError as err:
+        raise ValueError(f'{err} at {chrom}:{pos}') from err
+
+    return chrom, int(pos)
+
+def _vcf_lines(path:Path, region:Optional[Tuple[str, int, Optional[int]]]=None,
+    threads:int=1):
+    '''Raw record lines of a vcf file, or of those overlapping `region` through its index'''
+    if region is not None:
+        index_paths = [Path(f'{path}{extension}') for extension in VCF_INDEX_EXTENSIONS]
+        index_path = next((str(index_path) for index_path in index_paths \
+            if index_path.exists()), None)
+        with pysam.TabixFile(str(path), index=index_path, threads=threads) as tabix_file:
+            yield from tabix_file.fetch(*region)
+        return
+
+    with pysam.BGZFile(str(path), 'rb') as raw_file:
+        for line in raw_file:
+            if line.strip() and not line.startswith(b'#'):
+                yield line.decode()
+
+def _validate_vcf_file_native(path:Path, threads:Optional[int]=None,
+    region:Optional[Tuple[str, int, Optional[int]]]=None):
+    '''Validate vcf file in-process, reading each record once through htslib
+
+        Checks INFO, FORMAT and FILTER fields against the header definitions,
+        the raw INFO and FORMAT values against their header Number and Type,
+        REF/ALT syntax and that records are sorted by position with each
+        contig in one contiguous run. If `region` is given as (contig, start,
+        end), only records overlapping it are read through the index, with
+        `threads` decompression threads.
+    '''
+    num_records = 0
+    try:
+        definitions = _vcf_definitions(path)
+        finished_contigs = set()
+        current_contig = None
+        previous_position = 0
+
+        for line in _vcf_lines(path, region, threads if threads else _available_cpus()):
+            contig, position = _check_vcf_line(line, definitions)
+            if contig != current_contig:
+                if contig in finished_contigs:
+                    raise ValueError(f'Records of contig `{contig}` are not contiguous')
+                finished_contigs.add(current_contig)
+                current_contig = contig
+            elif position < previous_position:
+                raise ValueError(f'Record at {contig}:{position} is out of order')
+            previous_position = position
+
+            num_records += 1
+    except (OSError, ValueError, UnicodeDecodeError) as err:
+        raise ValueError(f'pysam vcf check failed at record {num_records + 1} of '
+            f'{str(path)}. {str(err)}') from err
+
+    return True
+
+def _vcf_shards(path:Path, num_processes:int):
+    '''Regions to validate an indexed vcf file across in parallel, as (contig, start, end)
+
+        Records overlapping two regions are validated in both.
+    '''
+    if not any(Path(f'{path}{extension}').exists() for extension in VCF_INDEX_EXTENSIONS):
+        return []
+
+    with pysam.VariantFile(str(path)) as vcf:
+        if vcf.index is None:
+            return []
+        contigs = [(contig, vcf.header.contigs[contig].length \
+            if contig in vcf.header.contigs else None) for contig in vcf.index.keys()]
+
+    return _region_shards(contigs, num_processes)
+
 # pylint: disable=W0613
-def _check_vcf(path:Path, args:argparse.Namespace):
-    ''' Validation for VCFs '''
+def _check_vcf_shard(path:Path, shard:Tuple[str, int, Optional[int]], args:argparse.Namespace):
+    ''' Validation for one region of an indexed VCF '''
+    _validate_vcf_file_native(path, 1, shard)
+
+def _shard_vcf(path:Path, args:argparse.Namespace, num_processes:int):
+    ''' Shards to validate a VCF across, or none if it must be validated as a whole
+
+        Only the `pysam` engine can validate parts of a file, through its index.
+    '''
+    if args.vcf_engine != 'pysam':
+        return []
+
+    return _vcf_shards(path, num_processes)
+
+# pylint: disable=W0613
+def _check_vcf_vcftools(path:Path, args:argparse.Namespace):
+    ''' Validation for VCFs through the `vcf-validator` script of VCFtools '''
     _validate_vcf_file(path)
+
+# pylint: disable=W0613
+def _check_vcf_native(path:Path, args:argparse.Namespace):
+    ''' Validation for VCFs through htslib '''
+    _validate_vcf_file_native(path, args.threads)
+
+VCF_ENGINES = {
+    'vcftools': _check_vcf_vcftools,
+    'pysam': _check_vcf_native
+}
+
+def _check_vcf(path:Path, args:argparse.Namespace):
+    ''' Validation for VCFs, through the engine selected by `vcf_engine` '''
+    VCF_ENGINES[args.vcf_engine if args.vcf_engine else DEFAULT_VCF_ENGINE](path, args)
@@ -0,0 +1,216 @@
+''' Throughput benchmarks of the validators and checksums on synthetic data
+
+    Run from the repository root with `python -m test.benchmark`. A run fails
+    if any benchmark that reads its whole input is slower than its stored
+    baseline by more than the tolerance.
+'''
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import bz2
+import gzip
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+
+from pipeval.common import positive_integer
+from pipeval.generate_checksum.checksum import _generate_checksums, CHECKSUM_TYPES
+from pipeval.validate.bgzf import _check_bgzf_integrity, _scan_bgzf_blocks
+from pipeval.validate.files import _check_compression_integrity
+from pipeval.validate.probe import _clear_probes
+from pipeval.validate.validate import _validate_file
+from pipeval.validate.validate_types import ValidateArgs
+from pipeval.validate.validators.bam import _deep_validate_bam_file, _validate_bam_file
+from pipeval.validate.validators.fastq import FASTQ
+from pipeval.validate.validators.sam import _validate_sam_file
+from pipeval.validate.validators.vcf import _validate_vcf_file, _validate_vcf_file_native
+from .synthetic import _write_synthetic_files
+
+# Number of records in each synthetic input, by size
+BENCHMARK_SIZES = {
+    'small': 10000,
+    'medium': 100000,
+    'large': 1000000
+}
+DEFAULT_SIZES = ['small', 'medium']
+DEFAULT_BASELINE = Path(__file__).parent / 'baseline.json'
+DEFAULT_TOLERANCE = 0.25
+MIN_MEASUREMENT_TIME = 0.2 # seconds
+FILE_ARGS = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+    test_integrity=True)
+
+def _checksum_benchmark(hash_type:str):
+    ''' Benchmark generating one checksum type '''
+    return lambda path: _generate_checksums(path, [hash_type])
+
+# Benchmark names mapped to the synthetic input they read and the function they time
+BENCHMARKS = {
+    'fastq': ('fastq', lambda path: FASTQ(path).validate_fastq()),
+    'fastq-gz': ('fastq-gz', lambda path: FASTQ(path).validate_fastq()),
+    'fastq-bgzf': ('fastq-bgzf', lambda path: FASTQ(path).validate_fastq()),
+    'fastq-bz2': ('fastq-bz2', lambda path: FASTQ(path).validate_fastq()),
+    'gzip-integrity': ('fastq-gz', lambda path: _check_compression_integrity(path, gzip.open)),
+    'bz2-integrity': ('fastq-bz2', lambda path: _check_compression_integrity(path, bz2.open)),
+    'bgzf-integrity': ('fastq-bgzf', _check_bgzf_integrity),
+    'bgzf-scan': ('fastq-bgzf', _scan_bgzf_blocks),
+    'sam': ('sam', _validate_sam_file),
+    'bam': ('bam', lambda path: _validate_bam_file(path, False)),
+    'bam-deep': ('bam', lambda path: _deep_validate_bam_file(path, False)),
+    'vcf-pysam': ('vcf', _validate_vcf_file_native),
+    'vcf-vcftools': ('vcf', _validate_vcf_file),
+    'bed': ('bed', lambda path: _validate_file(path, 'file-bed', '.bed', FILE_ARGS)),
+    'bed-gz': ('bed-gz', lambda path: _validate_file(path, 'file-bed', '.bed.gz', FILE_ARGS)),
+    **{hash_type: ('fastq', _checksum_benchmark(hash_type)) for hash_type in CHECKSUM_TYPES}
+}
+
+# Benchmarks of checks that only read a header or the first records, whose time does not depend
+# on the size of the input, so they are reported in calls/s and not compared to a baseline
+CONSTANT_COST_BENCHMARKS = ['sam', 'bam', 'bed']
+
+def _benchmark_available(name:str):
+    ''' Check whether the tools a benchmark needs are installed '''
+    if name == 'vcf-vcftools':
+        return shutil.which('vcf-validator') is not None
+    if name == 'xxh64':
+        try:
+            import xxhash # pylint: disable=C0415,W0611
+        except ImportError:
+            return False
+
+    return True
+
+def _time_benchmark(function:Callable, path:Path, repeat:int):
+    ''' Best mean wall time per call of `function` on `path`, over `repeat` measurements
+
+        Each measurement calls `function` as many times as fit in
+        MIN_MEASUREMENT_TIME, so that checks taking a fixed few milliseconds
+        are timed as steadily as those reading the whole file. File probes
+        are cleared before every call, as each file is only probed once per run.
+    '''
+    def _timed_calls(num_calls:int):
+        start_time = time.perf_counter()
+        for _ in range(num_calls):
+            _clear_probes()
+            function(path)
+        return (time.perf_counter() - start_time) / num_calls
+
+    first_time = _timed_calls(1)
+    num_calls = max(1, math.ceil(MIN_MEASUREMENT_TIME / first_time)) if first_time > 0 else 1
+
+    return min(_timed_calls(num_calls) for _ in range(repeat))
+
+def _run_benchmarks(data_dir:Path, sizes:List[str], names:List[str], repeat:int):
+    ''' Time every benchmark at every size, keyed by `name/size` '''
+    results = {}
+    for size in sizes:
+        num_records = BENCHMARK_SIZES[size]
+        print(f'Generating {size} inputs of {num_records} records', file=sys.stderr)
+        inputs = _write_synthetic_files(data_dir / size, num_records)
+
+        for name in names:
+            input_name, function = BENCHMARKS[name]
+            path = inputs[input_name]
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                seconds = _time_benchmark(function, path, repeat)
+
+            if name in CONSTANT_COST_BENCHMARKS:
+                results[f'{name}/{size}'] = {'seconds': seconds, 'calls_per_s': 1 / seconds}
+                continue
+
+            results[f'{name}/{size}'] = {
+                'seconds': seconds,
+                'mb_per_s': path.stat().st_size / 1000000 / seconds,
+                'records_per_s': num_records / seconds
+            }
+
+    return results
+
+def _compare_to_baseline(results:Dict[str, dict], baseline:Dict[str, dict], tolerance:float):
+    ''' Print each result against its baseline and return the names of those that slowed down '''
+    slowdowns = []
+    print(f'{"benchmark":<28}{"MB/s":>10}{"records/s":>14}{"baseline MB/s":>15}{"change":>9}')
+    for name, result in results.items():
+        if 'mb_per_s' not in result:
+            print(f'{name:<28}{"-":>10}{"-":>14}  '
+                f'{result["calls_per_s"]:.0f} calls/s, not compared')
+            continue
+
+        line = f'{name:<28}{result["mb_per_s"]:>10.1f}{result["records_per_s"]:>14.0f}'
+        if name in baseline:
+            ratio = result['mb_per_s'] / baseline[name]['mb_per_s']
+            line += f'{baseline[name]["mb_per_s"]:>15.1f}{ratio - 1:>+9.0%}'
+            if ratio < 1 - tolerance:
+                slowdowns.append(name)
+                line += '  SLOWER'
+        print(line)
+
+    return slowdowns
+
+def _read_baseline(path:Path):
+    ''' Stored baseline results, keyed by `name/size` '''
+    if not path.exists():
+        return {}
+
+    return json.loads(path.read_text())['benchmarks']
+
+def _write_baseline(path:Path, results:Dict[str, dict]):
+    ''' Store results as the baseline, keeping baselines of benchmarks that were not run
+
+        Constant-cost benchmarks are left out, as they are not compared.
+    '''
+    baseline = {name: result for name, result in {**_read_baseline(path), **results}.items() \
+        if 'mb_per_s' in result}
+    path.write_text(json.dumps({'benchmarks': dict(sorted(baseline.items()))}, indent=2) + '\n')
+
+def _parse_args(argv:Optional[List[str]]=None):
+    ''' Parse arguments '''
+    parser = argparse.ArgumentParser(
+        prog='python -m test.benchmark',
+        description='Benchmark the validators and checksums on deterministic synthetic data',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, choices=list(BENCHMARK_SIZES),
+        help='Sizes of synthetic inputs to benchmark')
+    parser.add_argument('--only', nargs='+', default=None, choices=list(BENCHMARKS),
+        help='Benchmarks to run instead of all of them')
+    parser.add_argument('--repeat', type=positive_integer, default=3,
+        help='Number of runs of each benchmark, of which the fastest is kept')
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE,
+        help='Baseline JSON to compare results against')
+    parser.add_argument('--update-baseline', action='store_true',
+        help='Store the results as the new baseline instead of comparing against it')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+        help='Fraction of baseline throughput a benchmark may lose before the run fails')
+    parser.add_argument('--data-dir', type=Path, default=None,
+        help='Directory to write synthetic inputs to. A temporary directory is used if not given')
+
+    return parser.parse_args(argv)
+
+def main(argv:Optional[List[str]]=None):
+    ''' Run the benchmarks and compare them against the baseline '''
+    args = _parse_args(argv)
+    names = [name for name in (args.only or BENCHMARKS) if _benchmark_available(name)]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = args.data_dir if args.data_dir else Path(temp_dir)
+        results = _run_benchmarks(data_dir, args.sizes, names, args.repeat)
+
+    if args.update_baseline:
+        _compare_to_baseline(results, {}, args.tolerance)
+        _write_baseline(args.baseline, results)
+        print(f'Baseline written to {args.baseline}', file=sys.stderr)
+        return
+
+    slowdowns = _compare_to_baseline(results, _read_baseline(args.baseline), args.tolerance)
+    if slowdowns:
+        print(f'Error: {len(slowdowns)} benchmark(s) slower than baseline by more than '
+            f'{args.tolerance:.0%}: {", ".join(slowdowns)}', file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
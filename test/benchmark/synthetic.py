@@ -0,0 +1,134 @@
+''' Deterministic synthetic input files for benchmarks '''
+from pathlib import Path
+import bz2
+import gzip
+import random
+import shutil
+
+import pysam
+
+READ_LENGTH = 100
+CONTIG_LENGTH = 10000000
+CONTIGS = ['chr1', 'chr2']
+QUALITY_CHARACTERS = ''.join(chr(ordinal) for ordinal in range(35, 75))
+VCF_HEADER = (
+    '##fileformat=VCFv4.2\n'
+    + ''.join(f'##contig=<ID={contig},length={CONTIG_LENGTH}>\n' for contig in CONTIGS)
+    + '##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">\n'
+    '##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">\n'
+    '##FILTER=<ID=q10,Description="Quality below 10">\n'
+    '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+    '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">\n'
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tsample1\tsample2\n'
+)
+
+def _bases(rng:random.Random, length:int):
+    ''' Random bases '''
+    return ''.join(rng.choices('ACGT', k=length))
+
+def _write_fastq(path:Path, num_records:int, seed:int):
+    ''' Write `num_records` FASTQ records of READ_LENGTH bases '''
+    rng = random.Random(seed)
+    with open(path, 'w', encoding='ascii') as fastq:
+        for index in range(num_records):
+            fastq.write(f'@read{index}/1\n{_bases(rng, READ_LENGTH)}\n+\n'
+                f'{"".join(rng.choices(QUALITY_CHARACTERS, k=READ_LENGTH))}\n')
+
+def _write_gzip(source:Path, path:Path):
+    ''' Compress `source` to a plain gzip file with a fixed timestamp '''
+    with open(source, 'rb') as source_file, open(path, 'wb') as raw_file, \
+        gzip.GzipFile(fileobj=raw_file, mode='wb', mtime=0) as gzip_file:
+        shutil.copyfileobj(source_file, gzip_file)
+
+def _write_bz2(source:Path, path:Path):
+    ''' Compress `source` to a bzip2 file '''
+    with open(source, 'rb') as source_file, bz2.open(path, 'wb') as bz2_file:
+        shutil.copyfileobj(source_file, bz2_file)
+
+def _write_alignments(path:Path, num_records:int, seed:int, mode:str):
+    ''' Write `num_records` coordinate-sorted reads to a SAM (`mode` 'w') or BAM ('wb') file '''
+    rng = random.Random(seed)
+    header = {
+        'HD': {'VN': '1.6', 'SO': 'coordinate'},
+        'SQ': [{'SN': contig, 'LN': CONTIG_LENGTH} for contig in CONTIGS]
+    }
+    records_per_contig = num_records // len(CONTIGS) + 1
+    step = max((CONTIG_LENGTH - READ_LENGTH) // records_per_contig, 1)
+
+    with pysam.AlignmentFile(str(path), mode, header=header) as alignment_file:
+        for index in range(num_records):
+            read = pysam.AlignedSegment(alignment_file.header)
+            read.query_name = f'read{index}'
+            read.reference_id = index // records_per_contig
+            read.reference_start = (index % records_per_contig) * step
+            read.mapping_quality = 60
+            read.cigarstring = f'{READ_LENGTH}M'
+            read.query_sequence = _bases(rng, READ_LENGTH)
+            read.query_qualities = pysam.qualitystring_to_array(
+                ''.join(rng.choices(QUALITY_CHARACTERS, k=READ_LENGTH)))
+            alignment_file.write(read)
+
+    if mode == 'wb':
+        pysam.index(str(path))
+
+def _write_vcf(path:Path, num_records:int, seed:int):
+    ''' Write `num_records` sorted variants, bgzipped and tabix-indexed '''
+    rng = random.Random(seed)
+    records_per_contig = num_records // len(CONTIGS) + 1
+    step = max(CONTIG_LENGTH // records_per_contig, 1)
+    plain_path = path.with_suffix('')
+
+    with open(plain_path, 'w', encoding='ascii') as vcf:
+        vcf.write(VCF_HEADER)
+        for index in range(num_records):
+            ref, alt = rng.sample('ACGT', 2)
+            vcf.write(f'{CONTIGS[index // records_per_contig]}\t'
+                f'{(index % records_per_contig) * step + 1}\tvar{index}\t{ref}\t{alt}\t'
+                f'{rng.randint(10, 99)}\tPASS\tDP={rng.randint(10, 200)};AF=0.{rng.randint(1, 9)}'
+                f'\tGT:DP\t0/1:{rng.randint(5, 99)}\t1/1:{rng.randint(5, 99)}\n')
+
+    pysam.tabix_compress(str(plain_path), str(path), force=True)
+    pysam.tabix_index(str(path), preset='vcf', force=True)
+    plain_path.unlink()
+
+def _write_bed(path:Path, num_records:int, seed:int):
+    ''' Write `num_records` sorted intervals '''
+    rng = random.Random(seed)
+    records_per_contig = num_records // len(CONTIGS) + 1
+    step = max(CONTIG_LENGTH // records_per_contig, 1)
+
+    with open(path, 'w', encoding='ascii') as bed:
+        for index in range(num_records):
+            start = (index % records_per_contig) * step
+            bed.write(f'{CONTIGS[index // records_per_contig]}\t{start}\t'
+                f'{start + rng.randint(1, step)}\tinterval{index}\n')
+
+def _write_synthetic_files(directory:Path, num_records:int, seed:int=0):
+    ''' Write every synthetic input, each holding `num_records` records
+
+        Returns the paths written, keyed by input name.
+    '''
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = {
+        'fastq': directory / 'reads.fq',
+        'fastq-gz': directory / 'reads.fq.gz',
+        'fastq-bgzf': directory / 'reads.bgzf.fq.gz',
+        'fastq-bz2': directory / 'reads.fq.bz2',
+        'sam': directory / 'reads.sam',
+        'bam': directory / 'reads.bam',
+        'vcf': directory / 'variants.vcf.gz',
+        'bed': directory / 'intervals.bed',
+        'bed-gz': directory / 'intervals.bed.gz'
+    }
+
+    _write_fastq(paths['fastq'], num_records, seed)
+    _write_gzip(paths['fastq'], paths['fastq-gz'])
+    pysam.tabix_compress(str(paths['fastq']), str(paths['fastq-bgzf']), force=True)
+    _write_bz2(paths['fastq'], paths['fastq-bz2'])
+    _write_alignments(paths['sam'], num_records, seed, 'w')
+    _write_alignments(paths['bam'], num_records, seed, 'wb')
+    _write_vcf(paths['vcf'], num_records, seed)
+    _write_bed(paths['bed'], num_records, seed)
+    _write_gzip(paths['bed'], paths['bed-gz'])
+
+    return paths
@@ -12,10 +12,11 @@ def test__skippedValidation__properly_skips_function_call(monkeypatch, capsys):
 
     to_be_decorated()
 
-    out, _ = capsys.readouterr()
+    out, err = capsys.readouterr()
 
-    assert 'Skipping validation CHECKSUM' in out
+    assert 'Skipping validation CHECKSUM' in err
     assert 'Decorated function called' not in out
+    assert out == ''
 
 def test__skippedValidation__properly_calls_function(monkeypatch, capsys):
     monkeypatch.setenv('PIPEVAL_SKIP_CHECKSUM', 'false')
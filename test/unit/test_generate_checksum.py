@@ -1,18 +1,25 @@
 # pylint: disable=C0116
 # pylint: disable=C0114
 from unittest.mock import mock_open
+import argparse
 import hashlib
+import subprocess
+import sys
 import mock
 import pytest
 
+from pipeval.generate_checksum.__main__ import add_subparser_generate_checksum
 from pipeval.generate_checksum.checksum import (
     _validate_checksums,
     _compare_hash,
     _write_checksum_file,
     _generate_md5,
     _generate_sha512,
+    _generate_checksums,
     generate_checksum,
-    ChecksumArgs
+    ChecksumArgs,
+    HashingReader,
+    HASH_BUFFER_SIZE
 )
 
 @mock.patch('pipeval.generate_checksum.checksum.Path', autospec=True)
@@ -116,26 +123,71 @@ def test__write_checksum_file__writes_proper_checksum(mock_path, mock_write_open
     handle.write.assert_called_once_with(f'{computed_hash}  {file_path}\n')
 
 # pylint: disable=W0613
-@mock.patch('pipeval.generate_checksum.checksum.open', new_callable=mock_open)
-@mock.patch('pipeval.generate_checksum.checksum.Path', autospec=True)
-@mock.patch('pipeval.generate_checksum.checksum.iter')
-def test__generate_md5__return_correct_checksum(mock_iter, mock_path, mock_read_open):
-    md5_checksum = hashlib.md5()
-    md5_checksum.update(b'')
-    mock_iter.return_value = iter([b''])
+@pytest.mark.parametrize(
+    'test_data',
+    [
+        (b''),
+        (b'data' * 10000)
+    ]
+)
+def test__generate_md5__return_correct_checksum(tmp_path, test_data):
+    test_path = tmp_path / 'file.txt'
+    test_path.write_bytes(test_data)
 
-    assert _generate_md5(mock_path) == md5_checksum.hexdigest()
+    assert _generate_md5(test_path) == hashlib.md5(test_data).hexdigest()
 
-# pylint: disable=W0613
-@mock.patch('pipeval.generate_checksum.checksum.open', new_callable=mock_open)
-@mock.patch('pipeval.generate_checksum.checksum.Path', autospec=True)
-@mock.patch('pipeval.generate_checksum.checksum.iter')
-def test__generate_sha512__return_correct_checksum(mock_iter, mock_path, mock_read_open):
-    sha512_checksum = hashlib.sha512()
-    sha512_checksum.update(b'')
-    mock_iter.return_value = iter([b''])
+@pytest.mark.parametrize(
+    'test_data',
+    [
+        (b''),
+        (b'data' * 10000)
+    ]
+)
+def test__generate_sha512__return_correct_checksum(tmp_path, test_data):
+    test_path = tmp_path / 'file.txt'
+    test_path.write_bytes(test_data)
 
-    assert _generate_sha512(mock_path) == sha512_checksum.hexdigest()
+    assert _generate_sha512(test_path) == hashlib.sha512(test_data).hexdigest()
+
+@pytest.mark.parametrize(
+    'test_data, test_buffer_size, test_use_mmap',
+    [
+        (b'', 7, False),
+        (b'', 7, True),
+        (b'data' * 10000, 7, False),
+        (b'data' * 10000, 7, True),
+        (b'data' * 10000, HASH_BUFFER_SIZE, True)
+    ]
+)
+def test__generate_checksums__matches_hashlib_for_any_read_path(
+    tmp_path,
+    test_data,
+    test_buffer_size,
+    test_use_mmap):
+    test_path = tmp_path / 'file.txt'
+    test_path.write_bytes(test_data)
+
+    checksums, throughput = _generate_checksums(
+        test_path, ['md5', 'sha512'], test_buffer_size, test_use_mmap)
+
+    assert checksums == {
+        'md5': hashlib.md5(test_data).hexdigest(),
+        'sha512': hashlib.sha512(test_data).hexdigest()
+    }
+    assert throughput >= 0
+
+def test__hashing_reader__mmap_drain_continues_after_partial_read(tmp_path):
+    test_path = tmp_path / 'file.txt'
+    test_data = bytes(range(256)) * 100
+    test_path.write_bytes(test_data)
+
+    with HashingReader(test_path, ['md5'], 100, True) as reader:
+        assert reader.read(1000) == test_data[:1000]
+        reader.drain()
+        assert reader.read(1) == b''
+
+    assert reader.bytes_read == len(test_data)
+    assert reader.hexdigests()['md5'] == hashlib.md5(test_data).hexdigest()
 
 @pytest.mark.parametrize(
     'test_args',
@@ -161,24 +213,135 @@ def test__generate_checksum__fails_with_invalid_type(mock_path):
     'test_args',
     [
         (ChecksumArgs(path=['some/path'], type='md5')),
-        (ChecksumArgs(path=['some/path'], type='sha512'))
+        (ChecksumArgs(path=['some/path'], type='sha512')),
+        (ChecksumArgs(path=['some/path'], type=['md5', 'sha512']))
     ]
 )
 @mock.patch('pipeval.generate_checksum.checksum.Path', autospec=True)
-@mock.patch('pipeval.generate_checksum.checksum._generate_md5')
-@mock.patch('pipeval.generate_checksum.checksum._generate_sha512')
+@mock.patch('pipeval.generate_checksum.checksum._generate_checksums')
 @mock.patch('pipeval.generate_checksum.checksum._write_checksum_file')
 def test__generate_checksum__fails_with_failed_write(
     mock_write_checksum_file,
-    mock_generate_sha512,
-    mock_generate_md5,
+    mock_generate_checksums,
     mock_path,
     test_args):
-    mock_generate_md5.return_value = ''
-    mock_generate_sha512.return_value = ''
+    mock_generate_checksums.return_value = ({'md5': '', 'sha512': ''}, 0.0)
     mock_write_checksum_file.side_effect = IOError('fail write')
     expected_code = 1
 
     with pytest.raises(SystemExit) as pytest_exit:
         generate_checksum(test_args)
     assert pytest_exit.value.code == expected_code
+
+@mock.patch('pipeval.generate_checksum.checksum.multiprocessing.cpu_count')
+def test__generate_checksum__parallel_output_matches_serial(mock_cpu_count, tmp_path, capsys):
+    mock_cpu_count.return_value = 4
+    paths = []
+    for index in range(8):
+        path = tmp_path / f'file{index}.txt'
+        path.write_bytes(b'data' * index)
+        paths.append(str(path))
+    paths.insert(3, str(tmp_path / 'missing.txt'))
+
+    for processes in [1, 4]:
+        with pytest.raises(SystemExit) as pytest_exit:
+            generate_checksum(ChecksumArgs(path=paths, type='md5', processes=processes))
+        assert pytest_exit.value.code == 1
+        out, _ = capsys.readouterr()
+        if processes == 1:
+            serial_out = out
+        else:
+            assert out == serial_out
+
+    for path in paths[:3] + paths[4:]:
+        with open(f'{path}.md5', encoding='utf-8') as checksum_file:
+            assert checksum_file.read().split()[0] == _generate_md5(path)
+
+@mock.patch('pipeval.generate_checksum.checksum.open', wraps=open)
+def test__generate_checksums__hashes_all_types_in_one_read(mock_read_open, tmp_path):
+    test_path = tmp_path / 'file.txt'
+    test_data = b'data' * 10000
+    test_path.write_bytes(test_data)
+
+    checksums, _ = _generate_checksums(test_path, ['md5', 'sha512'])
+
+    mock_read_open.assert_called_once_with(test_path, 'rb', buffering=0, closefd=True)
+    assert checksums == {
+        'md5': hashlib.md5(test_data).hexdigest(),
+        'sha512': hashlib.sha512(test_data).hexdigest()
+    }
+
+def test__generate_checksum__writes_every_requested_type(tmp_path, capsys):
+    test_path = tmp_path / 'file.txt'
+    test_path.write_bytes(b'data')
+
+    generate_checksum(ChecksumArgs(path=[str(test_path)], type=['md5', 'sha512']))
+
+    out, _ = capsys.readouterr()
+    assert out == f'md5 checksum generated for {test_path}\n' \
+        f'sha512 checksum generated for {test_path}\n'
+    assert (tmp_path / 'file.txt.md5').read_text().split()[0] == hashlib.md5(b'data').hexdigest()
+    assert (tmp_path / 'file.txt.sha512').read_text().split()[0] \
+        == hashlib.sha512(b'data').hexdigest()
+
+@pytest.mark.parametrize(
+    'hash_type',
+    [
+        ('blake2b'),
+        ('xxh64')
+    ]
+)
+def test__compare_hash__verifies_fast_checksum_types(tmp_path, hash_type):
+    if hash_type == 'xxh64':
+        pytest.importorskip('xxhash')
+    test_path = tmp_path / 'file.txt'
+    test_path.write_bytes(b'data')
+
+    generate_checksum(ChecksumArgs(path=[str(test_path)], type=hash_type))
+    hash_path = tmp_path / f'file.txt.{hash_type}'
+
+    assert _compare_hash(hash_type, test_path, hash_path)
+    _validate_checksums(test_path)
+
+    test_path.write_bytes(b'other data')
+    with pytest.raises(IOError, match=f'{hash_type} checksum failed'):
+        _validate_checksums(test_path)
+
+@mock.patch('pipeval.generate_checksum.checksum.xxhash', None)
+def test__generate_checksum__fails_xxh64_without_xxhash(tmp_path, capsys):
+    test_path = tmp_path / 'file.txt'
+    test_path.write_bytes(b'data')
+
+    with pytest.raises(SystemExit) as pytest_exit:
+        generate_checksum(ChecksumArgs(path=[str(test_path)], type='xxh64'))
+
+    out, _ = capsys.readouterr()
+    assert pytest_exit.value.code == 1
+    assert 'require the `xxhash` package' in out
+
+def test__generate_checksum__cli_does_not_import_validation():
+    test_script = (
+        'import sys\n'
+        'import pipeval.__main__\n'
+        'assert "pipeval.validate.validate" not in sys.modules\n'
+        'assert "pysam" not in sys.modules and "magic" not in sys.modules\n'
+    )
+
+    subprocess.run([sys.executable, '-c', test_script], check=True)
+
+@pytest.mark.parametrize(
+    'test_argv, expected_types',
+    [
+        (['generate-checksum', 'file.txt'], ['sha512']),
+        (['generate-checksum', '-t', 'md5', 'file.txt'], ['md5']),
+        (['generate-checksum', '-t', 'md5', '-t', 'sha512', 'file.txt'], ['md5', 'sha512'])
+    ]
+)
+def test__add_subparser_generate_checksum__parses_types_before_paths(test_argv, expected_types):
+    test_parser = argparse.ArgumentParser()
+    add_subparser_generate_checksum(test_parser.add_subparsers())
+
+    test_args = test_parser.parse_args(test_argv)
+
+    assert test_args.path == ['file.txt']
+    assert test_args.type == expected_types
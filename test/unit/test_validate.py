@@ -1,13 +1,23 @@
 # pylint: disable=C0116
 # pylint: disable=C0114
+# pylint: disable=C0302
 from pathlib import Path
-from argparse import Namespace, ArgumentTypeError
+from argparse import ArgumentParser, Namespace, ArgumentTypeError
 from unittest.mock import Mock, mock_open, MagicMock
+import cProfile
+import os
+import subprocess
+import sys
+import threading
 import warnings
+import hashlib
+import json
+import pickle
 import zlib
 import gzip
 import bz2
 import mock
+import pysam
 import pytest
 
 from pipeval.validate.files import (
@@ -16,33 +26,67 @@ from pipeval.validate.files import (
     _identify_compression,
     _check_compression_integrity
 )
+from pipeval.validate.bgzf import (
+    _bgzf_block_size,
+    _check_bgzf_integrity,
+    _find_bgzf_block,
+    _inflate_bgzf_from,
+    _scan_bgzf_blocks
+)
+from pipeval.validate.cache import VerdictCache
+from pipeval.validate.probe import _probe_file, FileProbe
+from pipeval.validate.report import _collect_reports, _write_report, FileReport
+from pipeval.validate.profiling import _profile_directory, _summarize_profiles
+from pipeval.validate.registry import LazyFunctionRegistry
 from pipeval.validate.validators.bam import (
     _validate_bam_file,
-    _check_bam_index
+    _deep_validate_bam_file,
+    _check_bam_index,
+    _check_bam_shard,
+    _merge_bam_shards,
+    _shard_bam
 )
 from pipeval.validate.validators.vcf import (
-    _validate_vcf_file
+    _validate_vcf_file,
+    _validate_vcf_file_native,
+    _vcf_shards,
+    _check_vcf
 )
 from pipeval.validate.validators.sam import (
     _validate_sam_file
 )
 from pipeval.validate.validators.cram import (
     _validate_cram_file,
-    _check_cram_index
+    _check_cram_index,
+    _check_cram,
+    _cram_reference_cache,
+    _populate_reference_cache
 )
 from pipeval.validate.validators.fastq import (
     FASTQ,
     FASTQ_RECORD,
-    FASTQ_RECORD_VALIDATOR
+    FASTQ_RECORD_VALIDATOR,
+    FASTQ_BLOCK_VALIDATOR,
+    FASTQ_PAIR
 )
 from pipeval.validate.validate import (
     _detect_file_type_and_extension,
+    _file_shards,
+    _merge_shard_reports,
     _check_extension,
     run_validate,
     _validate_file,
+    _validate_single_pass,
+    _validate_stream,
+    _is_stream,
+    _pair_validation_worker,
+    _shard_validation_worker,
+    _schedule_validation_tasks,
+    _budgeted_pool_size,
+    _validation_task,
     _validation_worker
 )
-from pipeval.validate.__main__ import positive_integer
+from pipeval.validate.__main__ import add_subparser_validate, positive_integer
 from pipeval.validate.validate_types import ValidateArgs
 
 def test__positive_integer__returns_correct_integer():
@@ -106,10 +150,10 @@ def test__path_exists__errors_for_non_existing_path(mock_path):
     with pytest.raises(IOError):
         _path_exists(mock_path)
 
-@mock.patch('pipeval.validate.files.magic.from_file')
+@mock.patch('pipeval.validate.files._probe_file')
 @mock.patch('pipeval.validate.files.Path', autospec=True)
-def test__check_compressed__raises_warning_for_uncompressed_path(mock_path, mock_magic):
-    mock_magic.return_value = 'text/plain'
+def test__check_compressed__raises_warning_for_uncompressed_path(mock_path, mock_probe):
+    mock_probe.return_value.mime = 'text/plain'
     test_args = ValidateArgs(
         path=[],
         cram_reference=None,
@@ -130,14 +174,15 @@ def test__check_compressed__raises_warning_for_uncompressed_path(mock_path, mock
     ]
 )
 @mock.patch('pipeval.validate.files._check_compression_integrity')
-@mock.patch('pipeval.validate.files.magic.from_file')
+@mock.patch('pipeval.validate.files._probe_file')
 @mock.patch('pipeval.validate.files.Path', autospec=True)
 def test__check_compressed__passes_compression_check(
     mock_path,
-    mock_magic,
+    mock_probe,
     mock_integrity,
     compression_mime):
-    mock_magic.return_value = compression_mime
+    mock_probe.return_value.is_bgzf = False
+    mock_probe.return_value.mime = compression_mime
     mock_integrity.return_value = None
     test_args = ValidateArgs(
         path=[],
@@ -291,6 +336,12 @@ def test__validate_vcf_file__passes_vcf_validation(mock_call):
 
     _validate_vcf_file('some/file')
 
+@mock.patch('pipeval.validate.validators.vcf.subprocess.check_call')
+def test__validate_vcf_file__keeps_vcf_validator_output_off_stdout(mock_check_call):
+    _validate_vcf_file('some/file')
+
+    assert mock_check_call.call_args.kwargs['stdout'] is sys.stderr
+
 def test__run_validate__passes_validation_no_files():
     test_args = ValidateArgs(
         path=[],
@@ -348,8 +399,9 @@ def test__run_validate__passes_on_all_valid_files(
         processes=1,
         test_integrity=False)
 
-    mock_path_resolve.return_value = None
-    mock_pool.return_value.__enter__.return_value = Namespace(starmap=lambda y, z: [True])
+    mock_path_resolve.return_value = Path(test_path)
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: [(task, True, []) for task in tasks])
 
     run_validate(test_args)
 
@@ -367,8 +419,9 @@ def test__run_validate__fails_with_failing_file(
         test_integrity=False)
     expected_code = 1
 
-    mock_path_resolve.return_value = None
-    mock_pool.return_value.__enter__.return_value = Namespace(starmap=lambda y, z: [False])
+    mock_path_resolve.return_value = Path(test_path)
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: [(task, False, []) for task in tasks])
 
     with pytest.raises(SystemExit) as pytest_exit:
         run_validate(test_args)
@@ -393,6 +446,9 @@ def test__validate_file__errors_with_invalid_extension(mock_path_exists):
 @mock.patch('pipeval.validate.validate._check_compressed')
 @mock.patch('pipeval.validate.validate._validate_checksums')
 @mock.patch('pipeval.validate.validate.CHECK_FUNCTION_SWITCH')
+@mock.patch('pipeval.validate.validate.STREAM_CHECK_FUNCTION_SWITCH', {})
+@mock.patch('pipeval.validate.validate._probe_file', Mock(return_value=Mock(checksum_files={})))
+@mock.patch('pipeval.validate.validate.HashingReader', MagicMock())
 def test__validate_file__checks_compression(
     mock_check_function_switch,
     mock_validate_checksums,
@@ -414,6 +470,153 @@ def test__validate_file__checks_compression(
 
     mock_check_compressed.assert_called_once()
 
+VALID_FASTQ_DATA = b'@read1\nACTGN\n+\nFFFFF\n@read2\nACTGA\n+\nFF#FF\n'
+
+def _write_checksum_sidecar(path:Path, hash_type:str, data:bytes):
+    checksum = hashlib.new(hash_type, data).hexdigest()
+    path.with_suffix(path.suffix + f'.{hash_type}').write_text(f'{checksum}  {path}\n')
+
+@mock.patch('pipeval.generate_checksum.checksum.open', wraps=open)
+def test___validate_single_pass__reads_file_once(mock_checksum_open, tmp_path):
+    test_path = tmp_path / 'test.fq.gz'
+    compressed_data = gzip.compress(VALID_FASTQ_DATA)
+    test_path.write_bytes(compressed_data)
+    _write_checksum_sidecar(test_path, 'md5', compressed_data)
+    _write_checksum_sidecar(test_path, 'sha512', compressed_data)
+    test_args = ValidateArgs(
+        path=[str(test_path)],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=True)
+
+    assert _validate_single_pass(test_path, 'file-fastq', test_args)
+    mock_checksum_open.assert_called_once_with(test_path, 'rb', buffering=0, closefd=True)
+
+def test___validate_single_pass__fails_on_checksum_mismatch(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+    _write_checksum_sidecar(test_path, 'sha512', b'other data')
+    test_args = ValidateArgs(
+        path=[str(test_path)],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False)
+
+    with pytest.raises(IOError, match='sha512 checksum failed'):
+        _validate_single_pass(test_path, 'file-fastq', test_args)
+
+def test___validate_single_pass__checksum_failure_precedes_content_error(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(b'badID\nA\n+\n!\n')
+    _write_checksum_sidecar(test_path, 'md5', b'other data')
+    test_args = ValidateArgs(
+        path=[str(test_path)],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False)
+
+    with pytest.raises(IOError, match='md5 checksum failed'):
+        _validate_single_pass(test_path, 'file-fastq', test_args)
+
+def test___validate_single_pass__fails_on_truncated_compressed_fastq(tmp_path):
+    test_path = tmp_path / 'test.fq.gz'
+    test_path.write_bytes(gzip.compress(VALID_FASTQ_DATA)[:-10])
+    test_args = ValidateArgs(
+        path=[str(test_path)],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False)
+
+    with pytest.raises(TypeError):
+        _validate_single_pass(test_path, 'file-fastq', test_args)
+
+def test___is_stream__detects_stdin_and_named_pipes(tmp_path):
+    fifo_path = tmp_path / 'test.fq'
+    os.mkfifo(fifo_path)
+    file_path = tmp_path / 'file.fq'
+    file_path.write_bytes(VALID_FASTQ_DATA)
+
+    assert _is_stream('-')
+    assert _is_stream(fifo_path)
+    assert not _is_stream(file_path)
+
+@pytest.mark.parametrize(
+    'test_compress',
+    [
+        (lambda data: data),
+        (gzip.compress),
+        (bz2.compress)
+    ]
+)
+def test___validate_stream__tees_and_writes_checksums(tmp_path, test_compress):
+    stream_path = tmp_path / 'stream'
+    stream_data = test_compress(VALID_FASTQ_DATA)
+    stream_path.write_bytes(stream_data)
+    tee_path = tmp_path / 'copy.fq'
+    test_args = ValidateArgs(
+        path=[str(stream_path)],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False,
+        type='file-fastq',
+        tee=str(tee_path),
+        checksum_type=['md5', 'sha512'])
+
+    _validate_stream(stream_path, 'file-fastq', test_args)
+
+    assert tee_path.read_bytes() == stream_data
+    assert (tmp_path / 'copy.fq.md5').read_text().split()[0] == hashlib.md5(stream_data).hexdigest()
+    assert (tmp_path / 'copy.fq.sha512').read_text().split()[0] == \
+        hashlib.sha512(stream_data).hexdigest()
+
+def test___validate_stream__reads_whole_stream_on_invalid_content(tmp_path):
+    stream_path = tmp_path / 'stream'
+    stream_data = b'badID\nA\n+\n!\n' + VALID_FASTQ_DATA * 1000
+    stream_path.write_bytes(stream_data)
+    tee_path = tmp_path / 'copy.fq'
+    test_args = ValidateArgs(
+        path=[str(stream_path)],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False,
+        tee=str(tee_path))
+
+    with pytest.raises(ValueError):
+        _validate_stream(stream_path, 'file-fastq', test_args)
+
+    assert tee_path.read_bytes() == stream_data
+
+def test___validate_stream__requires_file_type():
+    test_args = ValidateArgs(
+        path=['-'],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False)
+
+    with pytest.raises(TypeError):
+        _validate_stream('-', 'file-unknown', test_args)
+
+def test__run_validate__fails_tee_with_multiple_inputs():
+    test_args = ValidateArgs(
+        path=['-', '-'],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False,
+        type='file-fastq',
+        tee='copy.fq')
+
+    with pytest.raises(SystemExit) as pytest_exit:
+        run_validate(test_args)
+    assert pytest_exit.value.code == 1
+
 @mock.patch('pipeval.validate.validate.Path.resolve', autospec=True)
 def test__run_validate__fails_on_unresolvable_symlink(mock_path_resolve):
     expected_error = FileNotFoundError
@@ -487,6 +690,50 @@ def test__validate_record__passes_valid_read():
 
     FASTQ_RECORD_VALIDATOR.validate_record(valid_record)
 
+def test__validate_block__passes_valid_reads():
+    FASTQ_BLOCK_VALIDATOR.validate_block(
+        [b'@record1', b'ACTGANAAAC', b'+', b'FFF*GH!#FF',
+         b'@record2', b'acgtn', b'+record2', b'~~~~!']
+    )
+
+@pytest.mark.parametrize(
+    'test_record',
+    [
+        ([b'badID', b'A', b'+', b'!']),
+        ([b'@ID', b'BADSEQ', b'+', b'!FFFFF']),
+        ([b'@ID', b'A', b'badextra', b'!']),
+        ([b'@ID', b'A', b'+', b' ']),
+        ([b'@ID', b'AC', b'+', b'!']),
+        ([b'@ID', b'', b'+', b'']),
+        ([b'@ID', b'A', b'+', b'\x7f'])
+    ]
+)
+def test__validate_block__matches_record_validator_errors(test_record):
+    valid_record = [b'@record1', b'ACTGA', b'+', b'FFFFF']
+    record = FASTQ_RECORD(*[line.decode().strip() for line in test_record])
+
+    with pytest.raises(ValueError) as record_error:
+        FASTQ_RECORD_VALIDATOR.validate_record(record)
+
+    assert not FASTQ_BLOCK_VALIDATOR.is_valid_block(valid_record + test_record)
+    with pytest.raises(ValueError) as block_error:
+        FASTQ_BLOCK_VALIDATOR.validate_block(valid_record + test_record)
+
+    assert str(block_error.value) == str(record_error.value)
+
+def test__validate_block__strips_whitespace_like_record_validator():
+    FASTQ_BLOCK_VALIDATOR.validate_block([b'@record1\r', b'ACTGA\r', b'+\r', b'FFFFF \r'])
+
+@mock.patch('pipeval.validate.validators.fastq._probe_file')
+@mock.patch('pipeval.validate.validators.fastq.FASTQ_BLOCK_VALIDATOR.block_size', 7)
+def test__validate_fastq__validates_records_split_across_blocks(mock_probe):
+    test_data = b'@record1\nACTGA\n+\nFFFFF\n@record2\nACTGA\n+\nFFFF\n'
+    mock_probe.return_value.mime = 'text/plain'
+    with mock.patch("builtins.open", mock_open(read_data=test_data)):
+        test_fastq = FASTQ(Path('test/path'))
+        with pytest.raises(ValueError, match='Sequence and quality must be of the same length'):
+            test_fastq.validate_fastq()
+
 # pylint: disable=W0212
 @pytest.mark.parametrize(
     'test_file_type, test_handler',
@@ -497,20 +744,20 @@ def test__validate_record__passes_valid_read():
         ('text/plain', open)
     ]
 )
-@mock.patch('pipeval.validate.validators.fastq.magic.from_file')
+@mock.patch('pipeval.validate.validators.fastq._probe_file')
 def test___get_file_handler__detects_correct_handler(
-    mock_from_file,
+    mock_probe,
     test_file_type,
     test_handler):
-    mock_from_file.return_value = test_file_type
+    mock_probe.return_value.mime = test_file_type
 
     test_fastq = FASTQ(Path('test/path'))
 
     assert test_handler == test_fastq._file_handler
 
-@mock.patch('pipeval.validate.validators.fastq.magic.from_file')
-def test___get_file_handler__fails_with_invalid_type(mock_from_file):
-    mock_from_file.return_value = 'invalid/type'
+@mock.patch('pipeval.validate.validators.fastq._probe_file')
+def test___get_file_handler__fails_with_invalid_type(mock_probe):
+    mock_probe.return_value.mime = 'invalid/type'
 
     with pytest.raises(TypeError):
         _ = FASTQ(Path('test/path'))
@@ -525,14 +772,14 @@ def test___get_file_handler__fails_with_invalid_type(mock_from_file):
         (5),
     ]
 )
-@mock.patch('pipeval.validate.validators.fastq.magic.from_file')
+@mock.patch('pipeval.validate.validators.fastq._probe_file')
 @mock.patch('pipeval.validate.validators.fastq.FASTQ_RECORD_VALIDATOR.validate_record')
 def test__validate_fastq__fails_with_invalid_number_of_lines(
     mock_validate_record,
-    mock_from_file,
+    mock_probe,
     test_num_lines):
-    test_data = '\n'.join([str(i) for i in range(test_num_lines)])
-    mock_from_file.return_value = 'text/plain'
+    test_data = '\n'.join([str(i) for i in range(test_num_lines)]).encode()
+    mock_probe.return_value.mime = 'text/plain'
     mock_validate_record.return_value = lambda x: None
     with mock.patch("builtins.open", mock_open(read_data=test_data)) as mock_file:
         test_fastq = FASTQ(Path('test/path'))
@@ -540,13 +787,13 @@ def test__validate_fastq__fails_with_invalid_number_of_lines(
             test_fastq.validate_fastq()
 
 # pylint: disable=W0612
-@mock.patch('pipeval.validate.validators.fastq.magic.from_file')
+@mock.patch('pipeval.validate.validators.fastq._probe_file')
 @mock.patch('pipeval.validate.validators.fastq.FASTQ_RECORD_VALIDATOR.validate_record')
 def test__validate_fastq__fails_with_invalid_record(
     mock_validate_record,
-    mock_from_file):
-    test_data = '1\n2\n3\n4'
-    mock_from_file.return_value = 'text/plain'
+    mock_probe):
+    test_data = b'1\n2\n3\n4'
+    mock_probe.return_value.mime = 'text/plain'
     mock_validate_record.side_effect = ValueError('no')
     with mock.patch("builtins.open", mock_open(read_data=test_data)) as mock_file:
         test_fastq = FASTQ(Path('test/path'))
@@ -563,14 +810,14 @@ def test__validate_fastq__fails_with_invalid_record(
         (12),
     ]
 )
-@mock.patch('pipeval.validate.validators.fastq.magic.from_file')
+@mock.patch('pipeval.validate.validators.fastq._probe_file')
 @mock.patch('pipeval.validate.validators.fastq.FASTQ_RECORD_VALIDATOR.validate_record')
 def test__validate_fastq__passes_valid_fastq(
     mock_validate_record,
-    mock_from_file,
+    mock_probe,
     test_num_lines):
-    test_data = '\n'.join([str(i) for i in range(test_num_lines)])
-    mock_from_file.return_value = 'text/plain'
+    test_data = '\n'.join([str(i) for i in range(test_num_lines)]).encode()
+    mock_probe.return_value.mime = 'text/plain'
     mock_validate_record.return_value = lambda x: None
     with mock.patch("builtins.open", mock_open(read_data=test_data)) as mock_file:
         test_fastq = FASTQ(Path('test/path'))
@@ -587,12 +834,12 @@ def test__validate_fastq__passes_valid_fastq(
         ('any/other', None)
     ]
 )
-@mock.patch('pipeval.validate.files.magic.from_file')
+@mock.patch('pipeval.validate.files._probe_file')
 def test___identify_compression__identified_correct_handler(
-    mock_from_file,
+    mock_probe,
     test_file_type,
     test_handler):
-    mock_from_file.return_value = test_file_type
+    mock_probe.return_value.mime = test_file_type
 
     identifier_handler = _identify_compression(Path('test/path'))
 
@@ -625,3 +872,1216 @@ def test___check_compression_integrity__raises_on_exception(test_handler, test_e
 
         with pytest.raises(TypeError):
             _check_compression_integrity('test/path', mock_file)
+
+BGZF_EOF_BLOCK = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+
+def _bgzf_compress(data:bytes, block_size:int=10):
+    blocks = []
+    for start in range(0, len(data), block_size):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        chunk = data[start:start + block_size]
+        deflated = compressor.compress(chunk) + compressor.flush()
+        blocks.append(
+            b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+            + (len(deflated) + 25).to_bytes(2, 'little')
+            + deflated
+            + zlib.crc32(chunk).to_bytes(4, 'little')
+            + len(chunk).to_bytes(4, 'little')
+        )
+    return b''.join(blocks) + BGZF_EOF_BLOCK
+
+def test___bgzf_block_size__detects_bgzf_and_plain_gzip():
+    assert _bgzf_block_size(BGZF_EOF_BLOCK) == len(BGZF_EOF_BLOCK)
+    assert _bgzf_block_size(gzip.compress(b'data')) is None
+    assert _bgzf_block_size(BGZF_EOF_BLOCK[:10]) == 0
+
+@pytest.mark.parametrize(
+    'test_threads',
+    [
+        (1),
+        (4)
+    ]
+)
+def test___check_bgzf_integrity__passes_valid_file(tmp_path, test_threads):
+    test_path = tmp_path / 'test.vcf.gz'
+    test_path.write_bytes(_bgzf_compress(VALID_FASTQ_DATA) + gzip.compress(b'plain member'))
+
+    _check_bgzf_integrity(test_path, test_threads)
+
+@pytest.mark.parametrize(
+    'test_corruption, test_exception',
+    [
+        (lambda data: data[:-40], EOFError),
+        (lambda data: data[:30] + bytes([data[30] ^ 0xff]) + data[31:],
+            (zlib.error, gzip.BadGzipFile))
+    ]
+)
+def test___check_bgzf_integrity__raises_on_corrupted_file(
+    tmp_path,
+    test_corruption,
+    test_exception):
+    test_path = tmp_path / 'test.vcf.gz'
+    test_path.write_bytes(test_corruption(_bgzf_compress(VALID_FASTQ_DATA)))
+
+    with pytest.raises(test_exception):
+        _check_bgzf_integrity(test_path, 2)
+
+@mock.patch('pipeval.validate.files._check_bgzf_integrity', wraps=_check_bgzf_integrity)
+def test__check_compressed__tests_bgzf_blocks_in_parallel(mock_check_bgzf_integrity, tmp_path):
+    test_path = tmp_path / 'test.vcf.gz'
+    test_path.write_bytes(_bgzf_compress(VALID_FASTQ_DATA)[:-40])
+
+    with pytest.raises(TypeError):
+        _check_compressed(test_path, True)
+
+    mock_check_bgzf_integrity.assert_called_once()
+
+def _write_fastq(path:Path, names:list, mate:int):
+    path.write_bytes(b''.join(f'@{name}/{mate} extra\nACTG\n+\nFFFF\n'.encode() for name in names))
+
+def test__read_names__strips_mate_suffix_and_comment():
+    test_lines = [b'@read1/1 comment', b'A', b'+', b'F', b'@read2', b'A', b'+', b'F']
+
+    assert FASTQ_PAIR.read_names(test_lines) == [b'read1', b'read2']
+
+@pytest.mark.parametrize(
+    'test_r2_names, expected_valid',
+    [
+        ([f'read{i}' for i in range(1000)], True),
+        ([f'read{i}' for i in range(999)], False),
+        ([f'read{i}' for i in range(1001)], False),
+        ([f'read{i}' if i != 500 else 'other' for i in range(1000)], False)
+    ]
+)
+@mock.patch('pipeval.validate.validators.fastq.FASTQ_BLOCK_VALIDATOR.block_size', 100)
+@mock.patch('pipeval.validate.validators.fastq.FASTQ_PAIR.queue_size', 1)
+def test___pair_validation_worker__checks_pairing(tmp_path, test_r2_names, expected_valid):
+    r1_path = tmp_path / 'r1.fq'
+    r2_path = tmp_path / 'r2.fq'
+    _write_fastq(r1_path, [f'read{i}' for i in range(1000)], 1)
+    _write_fastq(r2_path, test_r2_names, 2)
+    test_args = ValidateArgs(
+        path=[],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False,
+        paired_fastq=[[str(r1_path), str(r2_path)]])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        assert _pair_validation_worker((r1_path, r2_path), test_args) == expected_valid
+
+@mock.patch('pipeval.validate.validate._print_error')
+def test___pair_validation_worker__reports_invalid_mate(mock_print_error, tmp_path):
+    r1_path = tmp_path / 'r1.fq'
+    r2_path = tmp_path / 'r2.fq'
+    _write_fastq(r1_path, [f'read{i}' for i in range(1000)], 1)
+    r2_path.write_bytes(b'badID\nA\n+\nF\n')
+    test_args = ValidateArgs(
+        path=[],
+        cram_reference=None,
+        unmapped_bam=False,
+        processes=1,
+        test_integrity=False)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        assert not _pair_validation_worker((r1_path, r2_path), test_args)
+
+    mock_print_error.assert_called_once()
+    assert mock_print_error.call_args[0][0] == r2_path
+
+def test___find_bgzf_block__skips_to_next_block(tmp_path):
+    test_file = tmp_path / 'test.gz'
+    test_file.write_bytes(_bgzf_compress(b'0123456789' * 10))
+
+    with open(test_file, 'rb') as file_reader:
+        next_block = _find_bgzf_block(file_reader, 1, test_file.stat().st_size)
+        assert _bgzf_block_size(test_file.read_bytes(), next_block)
+        assert _inflate_bgzf_from(file_reader, next_block) == b'0123456789' * 9
+
+def _sample_test_args(**kwargs):
+    return ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, quick=True, quick_records=10, quick_samples=50, **kwargs)
+
+@pytest.mark.parametrize(
+    'test_compress',
+    [
+        (lambda data: data),
+        (lambda data: _bgzf_compress(data, 500))
+    ]
+)
+@mock.patch('pipeval.validate.validators.fastq.SAMPLE_WINDOW_SIZE', 300)
+def test___validate_sampled__samples_valid_file(tmp_path, test_compress):
+    test_file = tmp_path / 'test.fq'
+    _write_fastq(test_file, [f'read{i}' for i in range(1000)], 1)
+    test_file.write_bytes(test_compress(test_file.read_bytes()))
+
+    fastq = FASTQ(test_file, open if test_file.read_bytes()[:1] == b'@' else gzip.open)
+
+    with mock.patch.object(FASTQ, '_validate_blocks') as mock_validate_blocks:
+        assert fastq.validate_sampled(10, 50)
+
+    mock_validate_blocks.assert_not_called()
+
+@pytest.mark.parametrize(
+    'test_data',
+    [
+        (b'@read1 extra\nACTG\n+\nFFFF\n' * 1000 + b'@read2\nAC'),
+        (b'@read1 extra\nACTG\n+\nFFFF\n' * 500 + b'A\n' * 400
+            + b'@read1 extra\nACTG\n+\nFFFF\n' * 500)
+    ]
+)
+@mock.patch('pipeval.validate.validators.fastq.SAMPLE_WINDOW_SIZE', 300)
+def test___validate_sampled__detects_invalid_file(tmp_path, test_data):
+    test_file = tmp_path / 'test.fq'
+    test_file.write_bytes(test_data)
+
+    with pytest.raises(ValueError):
+        FASTQ(test_file, open).validate_sampled(10, 1000)
+
+def test___validate_sampled__detects_missing_bgzf_eof(tmp_path):
+    test_file = tmp_path / 'test.fq.gz'
+    test_file.write_bytes(
+        _bgzf_compress(b'@read1 extra\nACTG\n+\nFFFF\n' * 100, 500)[:-len(BGZF_EOF_BLOCK)])
+
+    with pytest.raises(ValueError):
+        FASTQ(test_file, gzip.open).validate_sampled(10, 5)
+
+def test___validate_sampled__does_not_sample_plain_gzip(tmp_path):
+    test_file = tmp_path / 'test.fq.gz'
+    test_file.write_bytes(gzip.compress(b'@read1 extra\nACTG\n+\nFFFF\n' * 100))
+
+    assert not FASTQ(test_file, gzip.open).validate_sampled(10, 5)
+
+@mock.patch('pipeval.validate.validate._print_success')
+def test___validation_worker__reports_sampled_file(mock_print_success, tmp_path):
+    test_file = tmp_path / 'test.fq'
+    _write_fastq(test_file, [f'read{i}' for i in range(1000)], 1)
+
+    assert _validation_worker(test_file, _sample_test_args())
+
+    mock_print_success.assert_called_once_with(test_file, 'file-fastq (sampled)')
+
+def _write_bam(path:Path, positions:list, sort_order:str='coordinate'):
+    header = {'HD': {'VN': '1.6', 'SO': sort_order}, 'SQ': [{'SN': 'chr1', 'LN': 1000}]}
+    with pysam.AlignmentFile(str(path), 'wb', header=header) as bam:
+        for index, position in enumerate(positions):
+            read = pysam.AlignedSegment(bam.header)
+            read.query_name = f'read{index}'
+            read.reference_id = 0
+            read.reference_start = position
+            read.cigarstring = '4M'
+            read.query_sequence = 'ACTG'
+            read.query_qualities = pysam.qualitystring_to_array('FFFF')
+            bam.write(read)
+
+@pytest.mark.parametrize(
+    'test_positions, test_sort_order, expected_valid',
+    [
+        ([1, 5, 5, 9], 'coordinate', True),
+        ([1, 9, 5], 'coordinate', False),
+        ([1, 9, 5], 'unsorted', True),
+        ([], 'coordinate', False)
+    ]
+)
+def test___deep_validate_bam_file__checks_records(
+    tmp_path, test_positions, test_sort_order, expected_valid):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, test_positions, test_sort_order)
+
+    if expected_valid:
+        assert _deep_validate_bam_file(test_file, False, 1)
+    else:
+        with pytest.raises(ValueError):
+            _deep_validate_bam_file(test_file, False, 1)
+
+def test___deep_validate_bam_file__checks_queryname_order_naturally(tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(11), 'queryname')
+
+    # read2 sorts before read10 naturally but after it lexicographically
+    assert _deep_validate_bam_file(test_file, False, 1)
+
+def test___deep_validate_bam_file__detects_truncated_file(tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(10000))
+    test_file.write_bytes(test_file.read_bytes()[:-100])
+
+    with pytest.raises(ValueError):
+        _deep_validate_bam_file(test_file, False, 1)
+
+def test___deep_validate_bam_file__reports_corrupted_block_at_its_record(tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, [index // 20 for index in range(20000)])
+    pysam.index(str(test_file))
+    test_data = bytearray(test_file.read_bytes())
+    test_data[len(test_data) // 2:len(test_data) // 2 + 50] = bytes(50)
+    test_file.write_bytes(test_data)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+
+    with pytest.raises(ValueError, match='pysam deep check failed at record'):
+        _deep_validate_bam_file(test_file, False, 1)
+    with pytest.raises(ValueError, match='pysam deep check failed at record'):
+        _check_bam_shard(test_file, ('chr1', 0, None), test_args)
+
+def test___deep_validate_bam_file__checks_index_count(tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(10))
+    pysam.index(str(test_file))
+    assert _deep_validate_bam_file(test_file, False, 1)
+
+    with mock.patch('pipeval.validate.validators.bam._indexed_read_count', return_value=11):
+        with pytest.raises(ValueError):
+            _deep_validate_bam_file(test_file, False, 1)
+
+def test___scan_bgzf_blocks__passes_valid_file(tmp_path):
+    test_file = tmp_path / 'test.gz'
+    test_file.write_bytes(_bgzf_compress(b'0123456789' * 100))
+
+    _scan_bgzf_blocks(test_file)
+
+@pytest.mark.parametrize(
+    'test_corrupt, expected_error',
+    [
+        (lambda data: data[:-len(BGZF_EOF_BLOCK)], EOFError),
+        (lambda data: data[:-len(BGZF_EOF_BLOCK) - 5] + BGZF_EOF_BLOCK, gzip.BadGzipFile),
+        (lambda data: data[:-10], EOFError),
+        (lambda data: data[:-len(BGZF_EOF_BLOCK) - 4] + (70000).to_bytes(4, 'little')
+            + BGZF_EOF_BLOCK, gzip.BadGzipFile)
+    ]
+)
+def test___scan_bgzf_blocks__detects_broken_chain(tmp_path, test_corrupt, expected_error):
+    test_file = tmp_path / 'test.gz'
+    test_file.write_bytes(test_corrupt(_bgzf_compress(b'0123456789' * 100)))
+
+    with pytest.raises(expected_error):
+        _scan_bgzf_blocks(test_file)
+
+@mock.patch('pipeval.validate.validate._check_bgzf_structure')
+def test___validate_single_pass__scans_bgzf_blocks(mock_check_bgzf_structure, tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(10))
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, scan_bgzf=True)
+
+    _validate_single_pass(test_file, 'file-bam', test_args)
+
+    mock_check_bgzf_structure.assert_called_once()
+
+@pytest.mark.parametrize('test_integrity', [False, True])
+def test___validate_single_pass__detects_bgzf_cut_at_block_boundary(tmp_path, test_integrity):
+    test_file = tmp_path / 'test.bed.gz'
+    test_file.write_bytes(_bgzf_compress(b'chr1\t0\t10\n' * 10)[:-len(BGZF_EOF_BLOCK)])
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=test_integrity, scan_bgzf=True)
+
+    _validate_single_pass(test_file, 'file-bed', test_args._replace(scan_bgzf=False))
+    with pytest.raises(TypeError, match='EOF marker'):
+        _validate_single_pass(test_file, 'file-bed', test_args)
+
+def _write_reference(path:Path, sequence:str):
+    path.write_text(f'>chr1\n{sequence}\n')
+    pysam.faidx(str(path))
+
+def test___populate_reference_cache__names_sequences_by_md5(tmp_path):
+    test_reference = tmp_path / 'ref.fa'
+    _write_reference(test_reference, 'acgt' * 10)
+    expected_md5 = hashlib.md5(b'ACGT' * 10).hexdigest()
+
+    _populate_reference_cache(test_reference, tmp_path / 'cache')
+
+    assert (tmp_path / 'cache' / expected_md5[:2] / expected_md5[2:4] / expected_md5[4:]) \
+        .read_bytes() == b'ACGT' * 10
+
+def _write_cram(path:Path, reference:Path):
+    _write_reference(reference, 'ACGT' * 250)
+    header = {'HD': {'VN': '1.6', 'SO': 'coordinate'}, 'SQ': [{'SN': 'chr1', 'LN': 1000}]}
+    with pysam.AlignmentFile(str(path), 'wc', header=header,
+        reference_filename=str(reference)) as cram:
+        read = pysam.AlignedSegment(cram.header)
+        read.query_name = 'read1'
+        read.reference_id = 0
+        read.reference_start = 0
+        read.cigarstring = '4M'
+        read.query_sequence = 'ACGT'
+        read.query_qualities = pysam.qualitystring_to_array('FFFF')
+        cram.write(read)
+    pysam.index(str(path))
+
+def test___cram_reference_cache__validates_cram_from_cache(tmp_path, monkeypatch):
+    test_reference = tmp_path / 'ref.fa'
+    test_file = tmp_path / 'test.cram'
+    _write_cram(test_file, test_reference)
+    monkeypatch.delenv('REF_PATH', raising=False)
+    test_args = ValidateArgs(path=[], cram_reference=str(test_reference), unmapped_bam=False,
+        processes=1, test_integrity=False)
+
+    with _cram_reference_cache(str(test_reference)):
+        # Only the cache is left to decode the reads from
+        test_reference.unlink()
+        assert 'REF_PATH' in os.environ
+        _check_cram(test_file, test_args)
+
+    assert 'REF_PATH' not in os.environ
+
+VCF_HEADER = (
+    '##fileformat=VCFv4.2\n'
+    '##contig=<ID=chr1,length=1000>\n'
+    '##contig=<ID=chr2,length=1000>\n'
+    '##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">\n'
+    '##INFO=<ID=AF,Number=A,Type=Float,Description="Allele frequency">\n'
+    '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+    '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">\n'
+    '##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Genotype likelihoods">\n'
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\n'
+)
+
+@pytest.mark.parametrize(
+    'test_records, expected_valid',
+    [
+        (['chr1\t1\t.\tA\tG,<DEL>\t50\tPASS\tDP=3;AF=0.5,0.1\tGT\t0/1',
+            'chr1\t5\t.\tAC\tA\t50\tPASS\tDP=3;AF=0.5\tGT\t0/1',
+            'chr2\t1\t.\tA\tG]chr1:10]\t50\tPASS\tDP=3\tGT\t0/1'], True),
+        (['chr1\t5\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1',
+            'chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1',
+            'chr2\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1',
+            'chr1\t5\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tAZ\tG\t50\tPASS\tDP=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG+\t50\tPASS\tDP=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tXX=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tq10\tDP=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGQ\t10'], False),
+        (['chr1\t1\t.\tA\tG,T\t50\tPASS\tAF=0.5\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG,T\t50\tPASS\tDP=.;AF=1e-3,.\tGT:AD:PL\t0/2:1,.,3:0,1,2,3,4,5',
+            'chr1\t2\t.\tA\tG\t50\tPASS\tDP=3\tGT:AD:PL\t1:.:0,1'], True),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=abc\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3.5\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tAF=high\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT:AD\t0/1:1,2,3,4'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT:AD\t0/1:1,x'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT:PL\t0/1:0,1'], False),
+        (['chr1\t1\t.\tA\t.\t50\t.\t.'], True),
+        (['chr1\tx\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1'], False),
+        (['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1\t0/1'], False)
+    ]
+)
+def test___validate_vcf_file_native__checks_records(tmp_path, test_records, expected_valid):
+    test_file = tmp_path / 'test.vcf'
+    test_file.write_text(VCF_HEADER + ''.join(f'{record}\n' for record in test_records))
+
+    if expected_valid:
+        assert _validate_vcf_file_native(test_file, 1)
+    else:
+        with pytest.raises(ValueError):
+            _validate_vcf_file_native(test_file, 1)
+
+@pytest.mark.parametrize(
+    'test_engine, expected_function',
+    [
+        (None, '_validate_vcf_file'),
+        ('vcftools', '_validate_vcf_file'),
+        ('pysam', '_validate_vcf_file_native')
+    ]
+)
+def test___check_vcf__uses_selected_engine(test_engine, expected_function):
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, vcf_engine=test_engine)
+
+    with mock.patch(f'pipeval.validate.validators.vcf.{expected_function}') as mock_validate:
+        _check_vcf(Path('test.vcf'), test_args)
+
+    mock_validate.assert_called_once()
+
+def _write_indexed_vcf(path:Path, records:list):
+    plain_path = path.with_suffix('')
+    plain_path.write_text(VCF_HEADER + ''.join(f'{record}\n' for record in records))
+    pysam.tabix_compress(str(plain_path), str(path))
+    pysam.tabix_index(str(path), preset='vcf')
+
+def test___vcf_shards__covers_every_record(tmp_path):
+    test_file = tmp_path / 'test.vcf.gz'
+    test_positions = [('chr1', position) for position in range(1, 1001, 7)] + [('chr2', 1200)]
+    _write_indexed_vcf(test_file,
+        [f'{contig}\t{position}\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1'
+            for contig, position in test_positions])
+
+    test_shards = _vcf_shards(test_file, 2)
+
+    assert len(test_shards) > 2
+    assert [shard for shard in test_shards if shard[2] is None] \
+        == [('chr1', 750, None), ('chr2', 750, None)]
+    with pysam.VariantFile(str(test_file)) as vcf:
+        sharded_positions = {(record.chrom, record.pos) \
+            for shard in test_shards for record in vcf.fetch(*shard)}
+    assert sharded_positions == set(test_positions)
+
+def test___vcf_shards__requires_index(tmp_path):
+    test_file = tmp_path / 'test.vcf.gz'
+    _write_indexed_vcf(test_file, ['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1'])
+    Path(f'{test_file}.tbi').unlink()
+
+    assert _vcf_shards(test_file, 2) == []
+
+def test___validate_vcf_file_native__checks_raw_values_in_region(tmp_path):
+    test_file = tmp_path / 'test.vcf.gz'
+    _write_indexed_vcf(test_file, ['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1',
+        'chr2\t1\t.\tA\tG\t50\tPASS\tDP=abc\tGT\t0/1'])
+
+    assert _validate_vcf_file_native(test_file, 1, ('chr1', 0, None))
+    with pytest.raises(ValueError, match='not of Type=Integer'):
+        _validate_vcf_file_native(test_file, 1, ('chr2', 0, None))
+
+@pytest.mark.parametrize('test_corrupt_data', [True, False])
+@mock.patch('pipeval.validate.validate._print_error')
+def test___file_shards__validates_vcf_with_unreadable_index_whole(
+    mock_print_error,
+    test_corrupt_data,
+    tmp_path):
+    test_file = tmp_path / 'test.vcf.gz'
+    _write_indexed_vcf(test_file, ['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1'])
+    Path(f'{test_file}.tbi').write_bytes(b'')
+    if test_corrupt_data:
+        test_file.write_bytes(os.urandom(4096))
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False, vcf_engine='pysam', threads=2)
+
+    assert _file_shards(test_file, test_args, 2) == []
+    assert _validation_worker(test_file, test_args) != test_corrupt_data
+    assert mock_print_error.called == test_corrupt_data
+
+@mock.patch('pipeval.validate.validate._print_error')
+def test___shard_validation_worker__reports_invalid_shard(mock_print_error, tmp_path):
+    test_file = tmp_path / 'test.vcf.gz'
+    _write_indexed_vcf(test_file, ['chr1\t1\t.\tA\tG\t50\tPASS\tDP=3\tGT\t0/1',
+        'chr2\t1\t.\tAZ\tG\t50\tPASS\tDP=3\tGT\t0/1'])
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False, vcf_engine='pysam')
+
+    assert _shard_validation_worker(test_file, ('chr1', 0, None), test_args)[0]
+    assert not _shard_validation_worker(test_file, ('chr2', 0, None), test_args)[0]
+    mock_print_error.assert_called_once()
+
+def test___shard_bam__shard_read_counts_add_up(tmp_path):
+    test_file = tmp_path / 'test.bam'
+    # Reads of 4 bases overlap the boundaries of the shards
+    _write_bam(test_file, range(0, 990, 3))
+    pysam.index(str(test_file))
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False, deep=True)
+
+    test_shards = _shard_bam(test_file, test_args, 2)
+
+    assert len(test_shards) > 2
+    assert test_shards[-1] == ('*', 0, None)
+    test_counts = [_check_bam_shard(test_file, shard, test_args) for shard in test_shards]
+    assert sum(test_counts) == 330
+    _merge_bam_shards(test_file, test_counts, test_args)
+
+    with pytest.raises(ValueError):
+        _merge_bam_shards(test_file, test_counts[1:], test_args)
+
+def test___shard_bam__requires_deep_and_index(tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(10))
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False, deep=True)
+
+    assert _shard_bam(test_file, test_args, 2) == []
+
+    pysam.index(str(test_file))
+    assert _shard_bam(test_file, test_args._replace(deep=False), 2) == []
+
+@mock.patch('pipeval.validate.validate._print_error')
+def test___file_shards__validates_corrupt_bam_whole(mock_print_error, tmp_path):
+    test_file = tmp_path / 'test.bam'
+    test_file.write_bytes(os.urandom(4096))
+    (tmp_path / 'test.bam.bai').write_bytes(os.urandom(64))
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False, deep=True, threads=2)
+
+    assert _file_shards(test_file, test_args, 2) == []
+    assert not _validation_worker(test_file, test_args)
+    mock_print_error.assert_called_once()
+
+@pytest.mark.parametrize('test_name', ['test.bam', 'test.cram', 'test.vcf.gz'])
+@mock.patch('pipeval.validate.validators.bam.pysam.AlignmentFile')
+@mock.patch('pipeval.validate.validators.cram.pysam.AlignmentFile')
+@mock.patch('pipeval.validate.validators.vcf.pysam.VariantFile')
+def test___file_shards__does_not_open_named_pipes_or_unindexed_files(
+    mock_variant_file,
+    mock_cram_file,
+    mock_bam_file,
+    tmp_path,
+    test_name):
+    test_pipe = tmp_path / 'pipe' / test_name
+    test_pipe.parent.mkdir()
+    os.mkfifo(test_pipe)
+    for test_extension in ['.bai', '.crai', '.tbi']:
+        Path(f'{test_pipe}{test_extension}').write_bytes(b'index')
+    test_file = tmp_path / test_name
+    test_file.write_bytes(b'data')
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False, deep=True, vcf_engine='pysam', threads=2)
+
+    assert _file_shards(test_pipe, test_args, 2) == []
+    assert _file_shards(test_file, test_args, 2) == []
+    mock_bam_file.assert_not_called()
+    mock_cram_file.assert_not_called()
+    mock_variant_file.assert_not_called()
+
+def test___schedule_validation_tasks__schedules_costliest_first(tmp_path):
+    test_small = tmp_path / 'small.bed'
+    test_large = tmp_path / 'large.bed'
+    test_fastq = tmp_path / 'medium.fq'
+    test_small.write_bytes(b'0' * 10)
+    test_large.write_bytes(b'0' * 1000)
+    # FASTQ validation costs more per byte
+    test_fastq.write_bytes(b'0' * 600)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=2,
+        test_integrity=False)
+
+    test_tasks = _schedule_validation_tasks([test_small, test_large, test_fastq], {}, [],
+        test_args)
+
+    assert [task[1] for task in test_tasks] == [test_fastq, test_large, test_small]
+
+@mock.patch('pipeval.validate.validate._print_success')
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__merges_streamed_shard_results(mock_pool, mock_print_success, tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(0, 990, 3))
+    pysam.index(str(test_file))
+    test_args = ValidateArgs(path=[str(test_file)], cram_reference=None, unmapped_bam=False,
+        processes=2, test_integrity=False, deep=True)
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: reversed(list(map(worker, tasks))))
+
+    with mock.patch('pipeval.validate.validate.multiprocessing.cpu_count', return_value=2):
+        run_validate(test_args)
+
+    mock_print_success.assert_called_once()
+    assert 'shards' in mock_print_success.call_args[0][1]
+
+@pytest.mark.parametrize(
+    'test_processes, expected_threads',
+    [
+        (1, None),
+        (2, 4),
+        (8, 1)
+    ]
+)
+@mock.patch('pipeval.validate.validate._print_success')
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__shares_cpus_between_parallel_workers(
+    mock_pool,
+    mock_print_success,
+    tmp_path,
+    test_processes,
+    expected_threads):
+    test_paths = []
+    for index in range(2):
+        test_path = tmp_path / f'test{index}.bed'
+        test_path.write_text('chr1\t0\t10\n')
+        test_paths.append(str(test_path))
+    test_args = ValidateArgs(path=test_paths, cram_reference=None, unmapped_bam=False,
+        processes=test_processes, test_integrity=False)
+    test_tasks = []
+    # pylint: disable=W0613
+    def run_tasks(worker, tasks, chunksize):
+        test_tasks.extend(tasks)
+        return map(worker, tasks)
+    mock_pool.return_value.__enter__.return_value = Namespace(imap_unordered=run_tasks)
+
+    with mock.patch('pipeval.validate.validate.multiprocessing.cpu_count', return_value=8), \
+        mock.patch('pipeval.validate.validate._available_cpus', return_value=8):
+        run_validate(test_args)
+
+    assert mock_print_success.call_count == 2
+    assert [task[2].threads for task in test_tasks] == [expected_threads] * 2
+
+@pytest.mark.parametrize(
+    'test_sizes, expected_threads',
+    [
+        ([1000, 1000], [4, 4]),
+        ([7000, 1000], [7, 1]),
+        ([10] * 20, [1] * 20)
+    ]
+)
+def test___schedule_validation_tasks__splits_thread_budget(tmp_path, test_sizes, expected_threads):
+    test_paths = []
+    for index, test_size in enumerate(test_sizes):
+        test_path = tmp_path / f'test{index}.bed'
+        test_path.write_bytes(b'0' * test_size)
+        test_paths.append(test_path)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, threads=8)
+
+    test_tasks = _schedule_validation_tasks(test_paths, {}, [], test_args, 8)
+
+    assert [task[2].threads for task in test_tasks] == expected_threads
+
+@pytest.mark.parametrize(
+    'test_sizes, test_budget, expected_threads, expected_pool_size',
+    [
+        ([7000, 1000], 8, [7, 1], 2),
+        ([1000, 1000, 1000], 8, [3, 3, 2], 3),
+        ([6000, 1000, 1000, 1000, 1000], 8, [4, 1, 1, 1, 1], 5),
+        ([100000] + [10] * 10, 4, [1] * 11, 4)
+    ]
+)
+def test___schedule_validation_tasks__keeps_concurrent_threads_within_budget(
+    tmp_path,
+    test_sizes,
+    test_budget,
+    expected_threads,
+    expected_pool_size):
+    test_paths = []
+    for index, test_size in enumerate(test_sizes):
+        test_path = tmp_path / f'test{index}.bed'
+        test_path.write_bytes(b'0' * test_size)
+        test_paths.append(test_path)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, threads=test_budget)
+
+    test_tasks = _schedule_validation_tasks(test_paths, {}, [], test_args, test_budget)
+    test_threads = [task[2].threads for task in test_tasks]
+    pool_size = _budgeted_pool_size(len(test_tasks), test_budget)
+
+    assert test_threads == expected_threads
+    assert pool_size == expected_pool_size
+    assert sum(sorted(test_threads, reverse=True)[:pool_size]) == test_budget
+
+@pytest.mark.parametrize(
+    'test_prefix, expected_compression, expected_bgzf, expected_text',
+    [
+        (gzip.compress(VALID_FASTQ_DATA), 'gzip', False, False),
+        (_bgzf_compress(VALID_FASTQ_DATA), 'gzip', True, False),
+        (bz2.compress(VALID_FASTQ_DATA), 'bzip2', False, False),
+        (b'CRAM\x03\x00', None, False, False),
+        (VALID_FASTQ_DATA, None, False, True),
+        (b'', None, False, False)
+    ]
+)
+def test__file_probe__identifies_magic_bytes(
+    test_prefix,
+    expected_compression,
+    expected_bgzf,
+    expected_text):
+    test_probe = FileProbe(Path('test/path'), test_prefix)
+
+    assert test_probe.compression == expected_compression
+    assert test_probe.is_bgzf == expected_bgzf
+    assert test_probe.is_text == expected_text
+
+def test___probe_file__identifies_bam(tmp_path):
+    test_bam = tmp_path / 'test.bam'
+    _write_bam(test_bam, [1, 2, 3])
+
+    test_probe = _probe_file(test_bam)
+
+    assert test_probe.is_bgzf
+    assert not test_probe.is_text
+    assert test_probe.mime == 'application/gzip'
+
+@mock.patch('pipeval.validate.probe._libmagic')
+def test__file_probe__falls_back_to_libmagic_once(mock_libmagic):
+    mock_libmagic.return_value.from_buffer.return_value = 'application/octet-stream'
+    test_probe = FileProbe(Path('test/path'), b'\x00\x01\x02')
+
+    assert test_probe.mime == 'application/octet-stream'
+    assert test_probe.mime == 'application/octet-stream'
+    mock_libmagic.return_value.from_buffer.assert_called_once()
+
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__fails_empty_fastq(mock_pool, tmp_path, capsys):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(b'')
+    test_args = ValidateArgs(path=[str(test_path)], cram_reference=None, unmapped_bam=False,
+        processes=1, test_integrity=False)
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: map(worker, tasks))
+
+    with pytest.raises(SystemExit):
+        run_validate(test_args)
+
+    assert 'Unexpected FASTQ format `application/x-empty`' in capsys.readouterr().err
+
+def test___probe_file__reads_file_once_until_it_changes(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+
+    first_probe = _probe_file(test_path)
+    assert _probe_file(test_path) is first_probe
+
+    test_path.write_bytes(gzip.compress(VALID_FASTQ_DATA))
+
+    assert _probe_file(test_path).compression == 'gzip'
+
+def test__file_probe__finds_checksum_files_once(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+    (tmp_path / 'test.fq.md5').write_text('hash test.fq')
+    test_probe = FileProbe(test_path, VALID_FASTQ_DATA)
+
+    assert list(test_probe.checksum_files) == ['md5']
+
+    (tmp_path / 'test.fq.sha512').write_text('hash test.fq')
+
+    assert list(test_probe.checksum_files) == ['md5']
+
+@pytest.mark.parametrize(
+    'test_data, expected_verdict',
+    [
+        (VALID_FASTQ_DATA, 'valid'),
+        (b'@read1\nACTGN\n+\nFFF\n', 'invalid')
+    ]
+)
+def test___validation_worker__reports_verdict_and_stages(tmp_path, test_data, expected_verdict):
+    test_path = tmp_path / 'test.fq.gz'
+    test_path.write_bytes(gzip.compress(test_data))
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+    _collect_reports()
+
+    _validation_worker(test_path, test_args)
+
+    test_reports = _collect_reports()
+    assert len(test_reports) == 1
+    test_report = test_reports[0].to_dict()
+    assert test_report['path'] == str(test_path)
+    assert test_report['type'] == 'file-fastq'
+    assert test_report['verdict'] == expected_verdict
+    assert (test_report['error'] is None) == (expected_verdict == 'valid')
+    assert test_report['pid'] == os.getpid()
+    assert test_report['stages']['content']['wall_time'] > 0
+    assert test_report['wall_time'] >= sum(
+        stage['wall_time'] for stage in test_report['stages'].values())
+
+def test___pair_validation_worker__reports_both_mates(tmp_path):
+    r1_path = tmp_path / 'r1.fq'
+    r2_path = tmp_path / 'r2.fq'
+    _write_fastq(r1_path, [f'read{i}' for i in range(10)], 1)
+    _write_fastq(r2_path, [f'other{i}' for i in range(10)], 2)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+    _collect_reports()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        _pair_validation_worker((r1_path, r2_path), test_args)
+
+    test_reports = _collect_reports()
+    assert [test_report.path for test_report in test_reports] == [str(r1_path), str(r2_path)]
+    assert all(test_report.verdict == 'invalid' and test_report.error is not None \
+        for test_report in test_reports)
+
+def test___merge_shard_reports__sums_shards_into_file_report():
+    test_reports = [FileReport('test.bam') for _ in range(3)]
+    for test_report in test_reports:
+        test_report.add_stage_time('content', 1.0, 0.5)
+        test_report.finish('file-bam', True)
+    test_reports[2].add_error('bad shard')
+    _collect_reports()
+
+    merged_report = _merge_shard_reports(test_reports, False)
+
+    assert merged_report.shards == 2
+    assert merged_report.stages['content'] == {'wall_time': 3.0, 'cpu_time': 1.5}
+    assert merged_report.verdict == 'invalid'
+    assert merged_report.error == 'bad shard'
+
+@pytest.mark.parametrize(
+    'test_format',
+    [
+        ('json'),
+        ('jsonl')
+    ]
+)
+def test___write_report__writes_parseable_reports(capsys, test_format):
+    test_reports = [FileReport(f'test{index}.bam') for index in range(2)]
+    for test_report in test_reports:
+        test_report.finish('file-bam', True)
+    _collect_reports()
+
+    _write_report(test_format, test_reports)
+
+    output = capsys.readouterr().out
+    if test_format == 'jsonl':
+        test_files = [json.loads(line) for line in output.splitlines()]
+    else:
+        test_files = json.loads(output)['files']
+    assert [test_file['path'] for test_file in test_files] == ['test0.bam', 'test1.bam']
+
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__reports_sharded_file_once(mock_pool, capsys, tmp_path):
+    test_file = tmp_path / 'test.bam'
+    _write_bam(test_file, range(0, 990, 3))
+    pysam.index(str(test_file))
+    test_args = ValidateArgs(path=[str(test_file)], cram_reference=None, unmapped_bam=False,
+        processes=2, test_integrity=False, deep=True, report='jsonl')
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: reversed(list(map(worker, tasks))))
+
+    with mock.patch('pipeval.validate.validate.multiprocessing.cpu_count', return_value=2):
+        run_validate(test_args)
+
+    test_files = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(test_files) == 1
+    assert test_files[0]['verdict'] == 'valid'
+    assert test_files[0]['shards'] > 0
+
+def test___validation_task__writes_profile_per_input(tmp_path):
+    test_path = tmp_path / 'test.fq.gz'
+    test_path.write_bytes(gzip.compress(VALID_FASTQ_DATA))
+    profile_dir = tmp_path / 'profile'
+    profile_dir.mkdir()
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+
+    _, test_result, _ = _validation_task((_validation_worker, test_path, test_args), profile_dir)
+
+    assert test_result
+    profile_paths = list(profile_dir.glob('*.prof'))
+    assert len(profile_paths) == 1
+    assert profile_paths[0].name.startswith(f'{os.getpid()}-')
+    assert profile_paths[0].name.endswith('test.fq.gz.prof')
+
+class _SingleProfile(cProfile.Profile):
+    ''' Profiler that, as from Python 3.12, cannot be enabled while another one is active '''
+    active = False
+
+    def enable(self, *args, **kwargs):
+        if _SingleProfile.active:
+            raise ValueError('Another profiling tool is already active')
+        _SingleProfile.active = True
+        super().enable(*args, **kwargs)
+
+    def disable(self):
+        super().disable()
+        _SingleProfile.active = False
+
+@mock.patch('pipeval.validate.profiling.cProfile.Profile', _SingleProfile)
+def test___validation_task__profiles_pair_with_single_profiler(tmp_path):
+    r1_path = tmp_path / 'r1.fq'
+    r2_path = tmp_path / 'r2.fq'
+    _write_fastq(r1_path, [f'read{i}' for i in range(100)], 1)
+    _write_fastq(r2_path, [f'read{i}' for i in range(100)], 2)
+    profile_dir = tmp_path / 'profile'
+    profile_dir.mkdir()
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, profile=str(profile_dir))
+    test_results = []
+
+    def test_task():
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            test_results.append(_validation_task(
+                (_pair_validation_worker, (r1_path, r2_path), test_args), profile_dir)[1])
+
+    # A mate left unfinished would block the pairing check forever
+    test_thread = threading.Thread(target=test_task, daemon=True)
+    test_thread.start()
+    test_thread.join(timeout=30)
+
+    assert test_results == [True]
+    assert len(list(profile_dir.glob('*.prof'))) == 1
+
+def test___summarize_profiles__merges_hot_functions(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+
+    assert _summarize_profiles(tmp_path) is None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for _ in range(2):
+            _validation_task((_validation_worker, test_path, test_args), tmp_path)
+
+    summary_path = _summarize_profiles(tmp_path)
+
+    assert 'validate_stream' in summary_path.read_text()
+
+@pytest.mark.parametrize(
+    'test_profile, test_environment, expected_directory',
+    [
+        (None, {}, None),
+        ('cli', {}, Path('cli')),
+        (None, {'PIPEVAL_PROFILE': 'environment'}, Path('environment')),
+        ('cli', {'PIPEVAL_PROFILE': 'environment'}, Path('cli'))
+    ]
+)
+def test___profile_directory__prefers_option_over_environment(
+    test_profile,
+    test_environment,
+    expected_directory):
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False, profile=test_profile)
+
+    with mock.patch.dict(os.environ, test_environment, clear=True):
+        assert _profile_directory(test_args) == expected_directory
+
+def test__lazy_function_registry__imports_function_on_lookup():
+    test_registry = LazyFunctionRegistry({'file-test': 'json:dumps', 'file-unused': 'missing:f'})
+
+    assert 'file-test' in test_registry
+    assert 'file-unused' in test_registry
+    assert 'file-other' not in test_registry
+    assert test_registry.get('file-other') is None
+    assert test_registry['file-test'] is json.dumps
+    assert list(test_registry) == ['file-test', 'file-unused']
+
+def test__validate__imports_validators_only_for_their_file_types(tmp_path):
+    test_path = tmp_path / 'test.fq.gz'
+    test_path.write_bytes(gzip.compress(VALID_FASTQ_DATA))
+    test_script = (
+        'import sys\n'
+        'from pathlib import Path\n'
+        'from pipeval.validate.validate import _validation_worker\n'
+        'from pipeval.validate.validate_types import ValidateArgs\n'
+        'assert "pysam" not in sys.modules and "magic" not in sys.modules\n'
+        f'_validation_worker(Path({str(test_path)!r}), ValidateArgs(path=[], cram_reference=None, '
+        'unmapped_bam=False, processes=1, test_integrity=False))\n'
+        'assert "pipeval.validate.validators.fastq" in sys.modules\n'
+        'assert "pysam" not in sys.modules\n'
+    )
+
+    subprocess.run([sys.executable, '-c', test_script], check=True, capture_output=True)
+
+def test__verdict_cache__invalidates_changed_inputs(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+    test_cache = VerdictCache(tmp_path / 'cache', test_args)
+
+    test_key = test_cache.key((test_path,))
+    assert not test_cache.is_valid(test_key)
+    test_cache.store_valid(test_key, (test_path,))
+    assert test_cache.is_valid(test_key)
+
+    assert VerdictCache(tmp_path / 'cache', test_args._replace(quick=True)).key(
+        (test_path,)) != test_key
+    test_path.with_suffix('.fq.md5').write_text('0' * 32)
+    assert test_cache.key((test_path,)) != test_key
+    test_path.write_bytes(VALID_FASTQ_DATA * 2)
+    assert not test_cache.is_valid(test_cache.key((test_path,)))
+    assert test_cache.key((tmp_path / 'missing.fq',)) is None
+
+@pytest.mark.parametrize(
+    'test_name, test_index_name',
+    [
+        ('test.bam', 'test.bam.bai'),
+        ('test.bam', 'test.bai'),
+        ('test.bam', 'test.bam.csi'),
+        ('test.cram', 'test.cram.crai'),
+        ('test.vcf.gz', 'test.vcf.gz.tbi'),
+        ('test.vcf.gz', 'test.vcf.gz.csi')
+    ]
+)
+def test__verdict_cache__invalidates_inputs_with_changed_index(tmp_path, test_name,
+    test_index_name):
+    test_path = tmp_path / test_name
+    test_path.write_bytes(b'data')
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+    test_cache = VerdictCache(tmp_path / 'cache', test_args)
+
+    test_key = test_cache.key((test_path,))
+    (tmp_path / test_index_name).write_bytes(b'index')
+    test_index_key = test_cache.key((test_path,))
+    (tmp_path / test_index_name).write_bytes(b'new index')
+
+    assert len({test_key, test_index_key, test_cache.key((test_path,))}) == 3
+
+def test__verdict_cache__keys_only_crams_by_reference(tmp_path):
+    test_cram = tmp_path / 'test.cram'
+    test_bam = tmp_path / 'test.bam'
+    test_reference = tmp_path / 'reference.fa'
+    for test_path in [test_cram, test_bam, test_reference]:
+        test_path.write_bytes(b'data')
+    test_args = ValidateArgs(path=[], cram_reference=str(test_reference), unmapped_bam=False,
+        processes=1, test_integrity=False)
+    test_cache = VerdictCache(tmp_path / 'cache', test_args)
+
+    test_cram_key = test_cache.key((test_cram,))
+    test_bam_key = test_cache.key((test_bam,))
+    test_reference.write_bytes(b'new data')
+    test_reference_key = test_cache.key((test_cram,))
+    (tmp_path / 'reference.fa.fai').write_text('chr1\t8\t6\t8\t9\n')
+
+    assert len({test_cram_key, test_reference_key, test_cache.key((test_cram,))}) == 3
+    assert test_cache.key((test_bam,)) == test_bam_key
+    assert VerdictCache(tmp_path / 'cache', test_args._replace(cram_reference=None)).key(
+        (test_bam,)) == test_bam_key
+
+def test__verdict_cache__does_not_store_input_changed_during_validation(tmp_path):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+    test_cache = VerdictCache(tmp_path / 'cache', test_args)
+
+    test_key = test_cache.key((test_path,))
+    test_path.write_bytes(VALID_FASTQ_DATA * 2)
+    test_cache.store_valid(test_key, (test_path,))
+
+    assert not test_cache.is_valid(test_key)
+
+def test__verdict_cache__evicts_least_recently_used_entries(tmp_path):
+    test_args = ValidateArgs(path=[], cram_reference=None, unmapped_bam=False, processes=1,
+        test_integrity=False)
+    test_cache = VerdictCache(tmp_path / 'cache', test_args)
+    test_keys = []
+    for index in range(3):
+        test_path = tmp_path / f'test{index}.fq'
+        test_path.write_bytes(VALID_FASTQ_DATA)
+        test_keys.append(test_cache.key((test_path,)))
+        test_cache.store_valid(test_keys[-1], (test_path,))
+    assert test_cache.is_valid(test_keys[0])
+
+    test_cache.evict(max_entries=2)
+
+    assert [test_cache.is_valid(test_key) for test_key in test_keys] == [True, False, True]
+    test_cache.evict(max_age_days=0)
+    assert not any(test_cache.is_valid(test_key) for test_key in test_keys)
+
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__skips_cached_valid_files(mock_pool, capsys, tmp_path):
+    test_path = tmp_path / 'test.fq.gz'
+    test_path.write_bytes(gzip.compress(VALID_FASTQ_DATA))
+    test_args = ValidateArgs(path=[str(test_path)], cram_reference=None, unmapped_bam=False,
+        processes=1, test_integrity=False, report='jsonl', cache_dir=str(tmp_path / 'cache'))
+    test_tasks = []
+    # pylint: disable=W0613
+    def test_imap_unordered(worker, tasks, chunksize):
+        test_tasks.extend(tasks)
+        return map(worker, tasks)
+    mock_pool.return_value.__enter__.return_value = Namespace(imap_unordered=test_imap_unordered)
+
+    run_validate(test_args)
+    run_validate(test_args)
+    test_files = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert len(test_tasks) == 1
+    assert [test_file['cached'] for test_file in test_files] == [False, True]
+    assert all(test_file['verdict'] == 'valid' for test_file in test_files)
+
+    run_validate(test_args._replace(cache_refresh=True))
+    assert len(test_tasks) == 2
+
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__fail_fast_stops_at_first_invalid_file(mock_pool, capsys, tmp_path):
+    test_invalid = tmp_path / 'invalid.fq'
+    test_invalid.write_bytes(b'@read\nACGT\n+\n' * 100)
+    test_valid = tmp_path / 'valid.fq'
+    test_valid.write_bytes(VALID_FASTQ_DATA)
+    test_args = ValidateArgs(path=[str(test_valid), str(test_invalid)], cram_reference=None,
+        unmapped_bam=False, processes=2, test_integrity=False, report='jsonl', fail_fast=True)
+    test_tasks = []
+    # pylint: disable=W0613
+    def test_imap_unordered(worker, tasks, chunksize):
+        for task in tasks:
+            test_tasks.append(task)
+            yield worker(task)
+    mock_pool.return_value.__enter__.return_value = Namespace(imap_unordered=test_imap_unordered)
+
+    with pytest.raises(SystemExit):
+        run_validate(test_args)
+    test_output = capsys.readouterr()
+    test_files = {test_file['path']: test_file \
+        for test_file in map(json.loads, test_output.out.splitlines())}
+
+    assert len(test_tasks) == 1
+    assert test_files[str(test_invalid)]['verdict'] == 'invalid'
+    assert test_files[str(test_valid)]['verdict'] == 'skipped'
+    assert f'`{test_valid}` was not validated' in test_output.err
+
+@mock.patch('pipeval.validate.validate.run_validate')
+def test__add_subparser_validate__requires_path_or_paired_fastq(mock_run_validate, capsys):
+    test_parser = ArgumentParser()
+    add_subparser_validate(test_parser.add_subparsers())
+
+    with pytest.raises(SystemExit) as pytest_exit:
+        test_parser.parse_args(['validate'])
+
+    assert pytest_exit.value.code == 2
+    assert 'path or --paired-fastq' in capsys.readouterr().err
+
+    test_args = test_parser.parse_args(['validate', '--paired-fastq', 'r1.fq', 'r2.fq'])
+    test_args.func(test_args)
+    mock_run_validate.assert_called_once_with(test_args)
+    pickle.loads(pickle.dumps(test_args))
+
+@pytest.mark.parametrize(
+    'test_options',
+    [
+        [],
+        ['-p', '2', '--report', 'jsonl']
+    ]
+)
+def test__main__validates_file_in_worker_processes(tmp_path, test_options):
+    test_path = tmp_path / 'test.fq'
+    test_path.write_bytes(VALID_FASTQ_DATA)
+
+    test_process = subprocess.run(
+        [sys.executable, '-m', 'pipeval', 'validate', str(test_path)] + test_options,
+        cwd=Path(__file__).parents[2], capture_output=True, text=True, check=False)
+
+    assert test_process.returncode == 0, test_process.stderr
+    assert f'`{test_path}` is valid file-fastq' in test_process.stderr
+    if test_options:
+        assert json.loads(test_process.stdout)['verdict'] == 'valid'
+
+@pytest.mark.parametrize('test_report_format', ['json', 'jsonl'])
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__report_of_cram_without_reference_is_only_output(
+    mock_pool,
+    test_report_format,
+    capsys,
+    monkeypatch,
+    tmp_path):
+    test_file = tmp_path / 'test.cram'
+    _write_cram(test_file, tmp_path / 'ref.fa')
+    _populate_reference_cache(tmp_path / 'ref.fa', tmp_path / 'cache')
+    monkeypatch.setenv('REF_PATH', str(tmp_path / 'cache' / '%2s/%2s/%s'))
+    test_args = ValidateArgs(path=[str(test_file)], cram_reference=None, unmapped_bam=False,
+        processes=1, test_integrity=False, report=test_report_format)
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: map(worker, tasks))
+
+    run_validate(test_args)
+    test_output = capsys.readouterr()
+
+    assert 'No reference specified' in test_output.err
+    test_documents = [json.loads(test_output.out)] if test_report_format == 'json' \
+        else [json.loads(line) for line in test_output.out.splitlines()]
+    test_files = test_documents[0]['files'] if test_report_format == 'json' else test_documents
+    assert [test_file['verdict'] for test_file in test_files] == ['valid']
+
+@pytest.mark.parametrize('test_num_crams, expected_cached', [(1, False), (2, True)])
+@mock.patch('pipeval.validate.validators.cram._cram_reference_cache')
+@mock.patch('pipeval.validate.validate.multiprocessing.Pool')
+def test__run_validate__caches_reference_only_for_several_crams(
+    mock_pool,
+    mock_cram_reference_cache,
+    test_num_crams,
+    expected_cached,
+    tmp_path):
+    test_paths = [tmp_path / f'test{index}.cram' for index in range(test_num_crams)]
+    for test_path in test_paths:
+        test_path.write_bytes(b'')
+    test_args = ValidateArgs(path=[str(test_path) for test_path in test_paths],
+        cram_reference=str(tmp_path / 'ref.fa'), unmapped_bam=False, processes=1,
+        test_integrity=False)
+    mock_pool.return_value.__enter__.return_value = Namespace(
+        imap_unordered=lambda worker, tasks, chunksize: [])
+
+    run_validate(test_args)
+
+    assert mock_cram_reference_cache.called == expected_cached